@@ -5,7 +5,9 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Count, Q, Avg
 from django.contrib.admin import SimpleListFilter
-from .models import Abattoir, ChambreFroide, HistoriqueChambreFroide, Stabulation
+from .models import (
+    Abattoir, ChambreFroide, DailySlaughterRollup, DocumentSequence, HistoriqueChambreFroide, ReportJob, Stabulation
+)
 
 
 class ChambreFroideInline(admin.TabularInline):
@@ -120,7 +122,7 @@ class AbattoirAdmin(admin.ModelAdmin):
     
     def chambres_froides_count(self, obj):
         """Affiche le nombre de chambres froides"""
-        count = obj.chambrefroide_set.count()
+        count = obj.chambrefroide_count
         if count > 0:
             return format_html(
                 '<span style="color: blue; font-weight: bold;">{}</span>',
@@ -145,7 +147,7 @@ class AbattoirAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('responsable').annotate(
-            chambrefroide_count=Count('chambrefroide')
+            chambrefroide_count=Count('chambres_froides')
         )
 
 
@@ -179,6 +181,9 @@ class ChambreFroideAdmin(admin.ModelAdmin):
         (_('Informations de base'), {
             'fields': ('abattoir', 'numero', 'dimensions_m3')
         }),
+        (_('Seuils d\'alerte'), {
+            'fields': ('temperature_min', 'temperature_max')
+        }),
         (_('Statistiques'), {
             'fields': ('nombre_mesures', 'derniere_temperature'),
             'classes': ('collapse',)
@@ -193,14 +198,20 @@ class ChambreFroideAdmin(admin.ModelAdmin):
     
     def nombre_mesures(self, obj):
         """Retourne le nombre de mesures"""
-        return obj.historique_temperatures.count()
+        return obj.nb_mesures
     nombre_mesures.short_description = _('Nombre de mesures')
+    nombre_mesures.admin_order_field = 'nb_mesures'
     
     def derniere_temperature(self, obj):
         """Retourne la dernière température"""
-        derniere_mesure = obj.historique_temperatures.first()
-        return f"{derniere_mesure.temperature}°C" if derniere_mesure else _('Aucune mesure')
+        if obj.derniere_temperature_mesure is None:
+            return _('Aucune mesure')
+        return f"{obj.derniere_temperature_mesure}°C"
     derniere_temperature.short_description = _('Dernière température')
+    derniere_temperature.admin_order_field = 'date_derniere_mesure'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('abattoir').with_mesures()
 
 
 @admin.register(HistoriqueChambreFroide)
@@ -351,4 +362,46 @@ class StabulationAdmin(admin.ModelAdmin):
         """Associe automatiquement l'utilisateur créateur"""
         if not change:  # Si c'est une création
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(DailySlaughterRollup)
+class DailySlaughterRollupAdmin(admin.ModelAdmin):
+    """Agrégat journalier des abattages (lecture seule, reconstruit par backfill_slaughter_rollup)"""
+    list_display = ['date', 'abattoir', 'espece', 'sexe', 'nombre', 'poids_vif_total', 'poids_a_chaud_total', 'poids_a_froid_total']
+    list_filter = ['abattoir', 'espece', 'sexe']
+    date_hierarchy = 'date'
+    readonly_fields = [
+        'date', 'abattoir', 'espece', 'sexe', 'nombre',
+        'poids_vif_total', 'poids_a_chaud_total', 'poids_a_froid_total', 'updated_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    """Compteurs de numérotation des documents (lecture seule)"""
+    list_display = ['prefixe', 'jour', 'valeur']
+    list_filter = ['prefixe']
+    date_hierarchy = 'jour'
+    readonly_fields = ['prefixe', 'jour', 'valeur']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Rapports générés en arrière-plan (lecture seule, soumis par l'API rapports/)"""
+    list_display = ['type_rapport', 'format_fichier', 'statut', 'cree_par', 'nombre_lignes', 'created_at', 'expire_le']
+    list_filter = ['type_rapport', 'statut', 'format_fichier']
+    date_hierarchy = 'created_at'
+    readonly_fields = [
+        'type_rapport', 'format_fichier', 'parametres', 'statut', 'fichier', 'nombre_lignes', 'erreur',
+        'cree_par', 'created_at', 'date_debut', 'date_fin', 'expire_le'
+    ]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from abattoir.models import DailySlaughterRollup, Stabulation
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit l\'agrégat journalier des abattages à partir des stabulations terminées'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='Premier jour à reconstruire (AAAA-MM-JJ, défaut: première stabulation terminée)',
+        )
+        parser.add_argument(
+            '--end',
+            help='Dernier jour à reconstruire (AAAA-MM-JJ, défaut: aujourd\'hui)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = self._parse_date(options['start'])
+            end_date = self._parse_date(options['end']) or timezone.localdate()
+        except ValueError:
+            raise CommandError('Les dates doivent être au format AAAA-MM-JJ')
+
+        if start_date is None:
+            bornes = Stabulation.objects.filter(statut='TERMINE', date_fin__isnull=False).aggregate(
+                debut=Min('date_fin'), fin=Max('date_fin')
+            )
+            if bornes['debut'] is None:
+                self.stdout.write(self.style.SUCCESS('✅ Aucune stabulation terminée à agréger'))
+                return
+            start_date = timezone.localdate(bornes['debut'])
+
+        if start_date > end_date:
+            raise CommandError('--start doit précéder --end')
+
+        self.stdout.write(f'🔄 Reconstruction de l\'agrégat du {start_date} au {end_date}...')
+        lignes = DailySlaughterRollup.rebuild(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f'✅ {lignes} ligne(s) d\'agrégat créée(s)'))
+
+    @staticmethod
+    def _parse_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
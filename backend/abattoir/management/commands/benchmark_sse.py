@@ -0,0 +1,224 @@
+import asyncio
+import resource
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from abattoir.sse_broker import InMemoryBroker, format_sse_event, get_broker
+from abattoir.sse_views import SSE_PING_INTERVAL, async_event_stream, format_sse_message
+
+
+class Command(BaseCommand):
+    help = 'Mesure le coût des connexions SSE (CPU au repos, capacité du flux asynchrone)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'mode',
+            choices=['idle', 'async', 'broadcast'],
+            help=(
+                'idle : CPU consommé par N connexions inactives ; '
+                'async : mémoire et diffusion de N flux asynchrones dans un seul processus ; '
+                'broadcast : latence de diffusion d\'un événement selon le nombre d\'abonnés'
+            ),
+        )
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=1000,
+            help='Nombre de connexions simulées (défaut: 1000)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10.0,
+            help='Durée de la mesure en secondes (défaut: 10)',
+        )
+        parser.add_argument(
+            '--memory-budget',
+            type=int,
+            default=512,
+            help='Mémoire allouée à un worker ASGI en Mo, pour estimer sa capacité (défaut: 512)',
+        )
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'idle':
+            self.benchmark_idle(options['connections'], options['duration'])
+        elif options['mode'] == 'async':
+            asyncio.run(self.benchmark_async(options['connections'], options['memory_budget']))
+        elif options['mode'] == 'broadcast':
+            self.benchmark_broadcast(options['connections'])
+
+    def benchmark_idle(self, connections, duration):
+        self.stdout.write(f'📊 {connections} connexions inactives pendant {duration:.0f}s')
+
+        polling_cpu = self._measure(connections, duration, self._polling_worker)
+        self.stdout.write(
+            f'  Ancien polling du cache (100 ms) : {polling_cpu:.2f}s CPU '
+            f'({polling_cpu / duration * 100:.1f}% d\'un cœur)'
+        )
+
+        broker = InMemoryBroker()
+        broker_cpu = self._measure(connections, duration, self._broker_worker, broker)
+        self.stdout.write(
+            f'  Broker pub/sub (attente bloquante) : {broker_cpu:.2f}s CPU '
+            f'({broker_cpu / duration * 100:.1f}% d\'un cœur)'
+        )
+
+        per_thousand = 1000 / connections / duration
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ CPU par seconde pour 1000 connexions : '
+            f'{polling_cpu * per_thousand * 1000:.1f} ms (polling) -> '
+            f'{broker_cpu * per_thousand * 1000:.1f} ms (broker)'
+        ))
+
+    def benchmark_broadcast(self, max_subscribers):
+        self.stdout.write('📊 Latence de diffusion d\'un événement (publication + trames de tous les abonnés)')
+        # Ancienne charge utile : StabulationSerializer complet avec betes_info
+        full_payload = {
+            'stabulation': {
+                'id': 1, 'numero_stabulation': 'STAB-2024-0001', 'statut': 'EN_COURS',
+                'betes_info': [
+                    {'id': index, 'num_boucle': f'DZ{index:08d}', 'espece': 'Bovin', 'sexe': 'M',
+                     'poids_vif': '450.00', 'statut': 'EN_STABULATION'}
+                    for index in range(100)
+                ],
+            },
+        }
+        compact_payload = {
+            'stabulation': {'id': 1, 'numero_stabulation': 'STAB-2024-0001', 'abattoir_id': 1,
+                            'type_bete': 'BOVIN', 'statut': 'EN_COURS'},
+        }
+
+        subscribers = 10
+        while subscribers <= max_subscribers:
+            legacy_ms = self._time_broadcast(subscribers, full_payload, legacy=True)
+            shared_ms = self._time_broadcast(subscribers, compact_payload, legacy=False)
+            self.stdout.write(
+                f'  {subscribers:>6} abonnés : {legacy_ms:8.2f} ms (trame par abonné, charge complète) -> '
+                f'{shared_ms:8.2f} ms (trame unique, charge compacte)'
+            )
+            subscribers *= 10
+        self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+    @staticmethod
+    def _time_broadcast(subscribers, payload, legacy, repeat=5):
+        """Durée moyenne (ms) pour publier un événement et produire la trame de chaque abonné"""
+        broker = InMemoryBroker()
+        subscriptions = [broker.subscribe(1) for _ in range(subscribers)]
+        lock = threading.Lock()
+        total = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if legacy:
+                # Ancien comportement : json.dumps et trame construits par abonné sous SSE_LOCK
+                message = {'type': 'STABULATION_UPDATED', 'data': payload, 'timestamp': time.time()}
+                with lock:
+                    for subscription in subscriptions:
+                        subscription.put(format_sse_event(message['type'], message['data'], message['timestamp']))
+                frames = [subscription.get(timeout=0) for subscription in subscriptions]
+            else:
+                broker.publish(1, {'type': 'STABULATION_UPDATED', 'data': payload, 'timestamp': time.time()})
+                frames = [format_sse_message(subscription.get(timeout=0)) for subscription in subscriptions]
+            total += time.perf_counter() - start
+            assert len(frames) == subscribers
+        return total / repeat * 1000
+
+    async def benchmark_async(self, connections, memory_budget):
+        self.stdout.write(f'📊 {connections} flux SSE asynchrones dans un seul processus')
+        broker = get_broker()
+        received = {'count': 0}
+        all_received = asyncio.Event()
+
+        async def consume(index):
+            # Flux identique à celui servi par sse_stabulations_stream_async
+            async for frame in async_event_stream(index, str(index % 10)):
+                if isinstance(frame, bytes) and frame.startswith(b'id: '):
+                    received['count'] += 1
+                    if received['count'] == connections:
+                        all_received.set()
+
+        rss_before = self._rss_mb()
+        cpu_start = time.process_time()
+        tasks = [asyncio.ensure_future(consume(index)) for index in range(connections)]
+        while broker.subscriber_count() < connections:
+            await asyncio.sleep(0.01)
+        open_cpu = time.process_time() - cpu_start
+        per_connection_kb = max(self._rss_mb() - rss_before, 0) * 1024 / connections
+
+        # Un événement par abattoir : chaque flux doit recevoir exactement une trame
+        publish_start = time.perf_counter()
+        for channel in range(10):
+            broker.publish(str(channel), {'type': 'STABULATION_UPDATED', 'data': {}, 'timestamp': time.time()})
+        await asyncio.wait_for(all_received.wait(), timeout=60)
+        fanout_ms = (time.perf_counter() - publish_start) * 1000
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stdout.write(f'  Ouverture des flux : {open_cpu:.2f}s CPU')
+        self.stdout.write(f'  Mémoire par flux : {per_connection_kb:.1f} Ko')
+        self.stdout.write(f'  Diffusion d\'un événement à tous les flux : {fanout_ms:.0f} ms')
+        self.stdout.write(f'  Abonnements restants après fermeture : {broker.subscriber_count()}')
+
+        fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        memory_limit = int(memory_budget * 1024 / per_connection_kb) if per_connection_kb else fd_limit
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Capacité estimée d\'un worker ASGI : {min(memory_limit, fd_limit)} flux '
+            f'(mémoire {memory_budget} Mo : {memory_limit}, descripteurs : {fd_limit}) '
+            f'contre 1 flux par thread de worker WSGI synchrone'
+        ))
+
+    @staticmethod
+    def _rss_mb():
+        """Mémoire résidente du processus en Mo"""
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _measure(self, connections, duration, worker, *args):
+        """Lance N threads simulant des connexions et mesure le CPU du processus"""
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=worker, args=(stop, index) + args, daemon=True)
+            for index in range(connections)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Laisser les connexions s'établir avant de mesurer
+        time.sleep(1)
+        cpu_start = time.process_time()
+        time.sleep(duration)
+        cpu_used = time.process_time() - cpu_start
+
+        stop.set()
+        if args:
+            # Réveiller les connexions abonnées au broker
+            for channel in range(10):
+                args[0].publish(channel, None)
+        for thread in threads:
+            thread.join()
+        return cpu_used
+
+    @staticmethod
+    def _polling_worker(stop, index):
+        """Reproduit l'ancienne boucle : cache.get toutes les 100 ms"""
+        cache_key = f"stabulation_events_{index % 10}"
+        while not stop.is_set():
+            cache.get(cache_key, [])
+            stop.wait(0.1)
+
+    @staticmethod
+    def _broker_worker(stop, index, broker):
+        """Connexion abonnée au broker : bloque sur sa file jusqu'au prochain événement"""
+        subscription = broker.subscribe(index % 10)
+        try:
+            while not stop.is_set():
+                subscription.get(timeout=SSE_PING_INTERVAL)
+        finally:
+            broker.unsubscribe(subscription)
@@ -0,0 +1,222 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from abattoir.models import Abattoir, Stabulation
+from bete.models import Bete, Espece
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Mesure les endpoints de stabulations sur un jeu de données volumineux (annulé en fin de mesure)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'mode',
+            choices=['dashboard', 'list', 'create'],
+            help=(
+                'dashboard : dashboard_statistics avec l\'ancienne synchronisation vs lecture seule ; '
+                'list : page de 50 stabulations, serializer complet (betes_info) vs résumé ; '
+                'create : création d\'une stabulation de --betes bêtes, ajout bête par bête vs en masse'
+            ),
+        )
+        parser.add_argument(
+            '--stabulations',
+            type=int,
+            default=10000,
+            help='Nombre de stabulations générées (défaut: 10000)',
+        )
+        parser.add_argument(
+            '--betes-par-stabulation',
+            type=int,
+            default=2,
+            help='Nombre de bêtes par stabulation (défaut: 2)',
+        )
+        parser.add_argument(
+            '--betes',
+            type=int,
+            default=1000,
+            help='Nombre de bêtes de la stabulation créée en mode create (défaut: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        # Toutes les données de test sont annulées à la fin
+        with transaction.atomic():
+            self.superuser = User.objects.create_superuser(
+                username='benchmark_stabulations', email='benchmark_stabulations@example.com', password='benchmark'
+            )
+            self.abattoir = Abattoir.objects.create(nom='Abattoir benchmark', wilaya='Alger', commune='Alger')
+            self.espece, _ = Espece.objects.get_or_create(nom='Bovin')
+
+            if options['mode'] == 'create':
+                self.benchmark_create(options['betes'])
+            else:
+                self.stdout.write(f"🔧 Génération de {options['stabulations']} stabulations...")
+                self._create_stabulations(options['stabulations'], options['betes_par_stabulation'])
+                if options['mode'] == 'dashboard':
+                    self.benchmark_dashboard()
+                elif options['mode'] == 'list':
+                    self.benchmark_list()
+
+            transaction.set_rollback(True)
+        self.stdout.write('🧹 Données de benchmark annulées')
+
+    def _create_stabulations(self, count, betes_per_stabulation):
+        """Stabulations réparties EN_COURS / TERMINE / ANNULE avec leurs bêtes"""
+        now = timezone.now()
+        statuts = {'EN_COURS': 'EN_STABULATION', 'TERMINE': 'ABATTU', 'ANNULE': 'VIVANT'}
+        stabulations = Stabulation.objects.bulk_create([
+            Stabulation(
+                abattoir=self.abattoir,
+                numero_stabulation=f'BENCH-{index:07d}',
+                type_bete='BOVIN',
+                statut=list(statuts)[index % 3],
+                date_debut=now,
+                # Compteurs dénormalisés (bulk_create du through ne déclenche pas m2m_changed)
+                nombre_betes=betes_per_stabulation,
+                betes_par_espece={self.espece.nom: betes_per_stabulation},
+            )
+            for index in range(count)
+        ], batch_size=1000)
+        betes = Bete.objects.bulk_create([
+            Bete(
+                num_boucle=f'BENCH{index:08d}',
+                espece=self.espece,
+                sexe='M',
+                abattoir=self.abattoir,
+                statut=statuts[stabulations[index // betes_per_stabulation].statut],
+            )
+            for index in range(count * betes_per_stabulation)
+        ], batch_size=1000)
+        Through = Stabulation.betes.through
+        Through.objects.bulk_create([
+            Through(stabulation_id=stabulations[index // betes_per_stabulation].id, bete_id=bete.id)
+            for index, bete in enumerate(betes)
+        ], batch_size=1000)
+
+    def benchmark_dashboard(self):
+        from abattoir.views import dashboard_statistics
+
+        legacy_time, legacy_queries = self._measure(self._legacy_synchronize)
+        self.stdout.write(
+            f'  Ancienne synchronisation à chaque GET : {legacy_time * 1000:.0f} ms, {legacy_queries} requêtes'
+        )
+
+        factory = APIRequestFactory()
+
+        def get_dashboard():
+            request = factory.get('/api/abattoirs/dashboard-statistics/')
+            force_authenticate(request, user=self.superuser)
+            return dashboard_statistics(request)
+
+        dashboard_time, dashboard_queries = self._measure(get_dashboard)
+        self.stdout.write(
+            f'  dashboard_statistics (lecture seule) : {dashboard_time * 1000:.0f} ms, {dashboard_queries} requêtes'
+        )
+
+        from bete.status_manager import BeteStatusManager
+        reconcile_time, reconcile_queries = self._measure(BeteStatusManager.reconcile_stabulation_statuses)
+        self.stdout.write(
+            f'  Réconciliation périodique (UPDATE ensemblistes) : {reconcile_time * 1000:.0f} ms, '
+            f'{reconcile_queries} requêtes'
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+    def benchmark_list(self, page_size=50):
+        from django.db.models import Prefetch
+        from rest_framework.renderers import JSONRenderer
+        from abattoir.serializers import StabulationListSerializer, StabulationSerializer
+
+        def legacy_page():
+            # Ancienne liste : betes_info de chaque stabulation, espèce chargée bête par bête
+            page = Stabulation.objects.select_related('abattoir', 'created_by').prefetch_related('betes')[:page_size]
+            return JSONRenderer().render(StabulationSerializer(page, many=True).data)
+
+        def detail_page():
+            page = Stabulation.objects.select_related(
+                'abattoir', 'created_by', 'annule_par', 'finalise_par'
+            ).prefetch_related(Prefetch('betes', queryset=Bete.objects.select_related('espece')))[:page_size]
+            return JSONRenderer().render(StabulationSerializer(page, many=True).data)
+
+        def summary_page():
+            page = Stabulation.objects.select_related(
+                'abattoir', 'created_by', 'annule_par', 'finalise_par'
+            )[:page_size]
+            return JSONRenderer().render(StabulationListSerializer(page, many=True).data)
+
+        self.stdout.write(f'📊 Page de {page_size} stabulations')
+        for label, function in (
+            ('Ancien serializer complet', legacy_page),
+            ('Serializer complet + Prefetch(espece)', detail_page),
+            ('StabulationListSerializer (résumé)', summary_page),
+        ):
+            size = len(function())
+            elapsed, queries = self._measure(function)
+            self.stdout.write(f'  {label} : {elapsed * 1000:.0f} ms, {queries} requêtes, {size / 1024:.1f} Ko')
+        self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+    def benchmark_create(self, count):
+        from abattoir.views import StabulationListCreateView
+
+        betes_ids = [bete.id for bete in Bete.objects.bulk_create([
+            Bete(num_boucle=f'BENCH{index:08d}', espece=self.espece, sexe='M', abattoir=self.abattoir, statut='VIVANT')
+            for index in range(count)
+        ], batch_size=1000)]
+
+        def legacy_create():
+            # Ancien chemin : get() et espèce par bête (PrimaryKeyRelatedField + validate_betes),
+            # betes.set() par le serializer puis par la vue, UPDATE des statuts
+            betes = [Bete.objects.get(pk=bete_id) for bete_id in betes_ids]
+            for bete in betes:
+                bete.espece.nom
+            stabulation = Stabulation.objects.create(
+                abattoir=self.abattoir, type_bete='BOVIN', date_debut=timezone.now(), created_by=self.superuser
+            )
+            stabulation.betes.set(betes)
+            stabulation.betes.set(betes_ids)
+            Bete.objects.filter(id__in=betes_ids).update_tracked(statut='EN_STABULATION')
+
+        factory = APIRequestFactory()
+        view = StabulationListCreateView.as_view()
+
+        def bulk_create():
+            request = factory.post('/api/abattoirs/stabulations/', {
+                'abattoir': self.abattoir.id, 'type_bete': 'BOVIN',
+                'date_debut': timezone.now().isoformat(), 'betes': betes_ids,
+            }, format='json')
+            force_authenticate(request, user=self.superuser)
+            response = view(request)
+            assert response.status_code == 201, response.data
+
+        self.stdout.write(f'📊 Création d\'une stabulation de {count} bêtes')
+        for label, function in (
+            ('Ancien ajout bête par bête', legacy_create),
+            ('Validation groupée + bulk_create + UPDATE unique', bulk_create),
+        ):
+            # Chaque mesure repart de bêtes VIVANT
+            with transaction.atomic():
+                elapsed, queries = self._measure(function)
+                transaction.set_rollback(True)
+            self.stdout.write(f'  {label} : {elapsed * 1000:.0f} ms, {queries} requêtes')
+        self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+    @staticmethod
+    def _legacy_synchronize():
+        """Reproduit synchronize_bete_statuses() exécuté auparavant à chaque GET du dashboard"""
+        for stab in Stabulation.objects.filter(statut='EN_COURS'):
+            stab.betes.update(statut='EN_STABULATION')
+        for stab in Stabulation.objects.filter(statut='ANNULE'):
+            stab.betes.update(statut='VIVANT')
+
+    @staticmethod
+    def _measure(function):
+        """Durée et nombre de requêtes SQL d'un appel"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries)
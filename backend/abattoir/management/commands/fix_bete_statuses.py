@@ -23,7 +23,7 @@ class Command(BaseCommand):
                 
                 if betes_incorrectes.exists():
                     # Corriger le statut
-                    betes_incorrectes.update(statut='EN_STABULATION')
+                    betes_incorrectes.update_tracked(statut='EN_STABULATION')
                     count = betes_incorrectes.count()
                     total_corrigees += count
                     
@@ -45,7 +45,7 @@ class Command(BaseCommand):
                 if betes_vivant.exists():
                     self.stdout.write(f'  ⚠️  {betes_vivant.count()} bêtes avec statut VIVANT dans stabulation EN_COURS')
                     if not dry_run:
-                        corrected = betes_vivant.update(statut='EN_STABULATION')
+                        corrected = betes_vivant.update_tracked(statut='EN_STABULATION')
                         total_corrected += corrected
                         self.stdout.write(f'  ✅ {corrected} bêtes mises au statut EN_STABULATION')
                     else:
@@ -56,7 +56,7 @@ class Command(BaseCommand):
                 if betes_autres.exists():
                     self.stdout.write(f'  ⚠️  {betes_autres.count()} bêtes avec statut incorrect: {list(betes_autres.values_list("statut", flat=True))}')
                     if not dry_run:
-                        corrected = betes_autres.update(statut='EN_STABULATION')
+                        corrected = betes_autres.update_tracked(statut='EN_STABULATION')
                         total_corrected += corrected
                         self.stdout.write(f'  ✅ {corrected} bêtes mises au statut EN_STABULATION')
             
@@ -66,7 +66,7 @@ class Command(BaseCommand):
                 if betes_non_abattu.exists():
                     self.stdout.write(f'  ⚠️  {betes_non_abattu.count()} bêtes non abattues dans stabulation TERMINE')
                     if not dry_run:
-                        corrected = betes_non_abattu.update(statut='ABATTU')
+                        corrected = betes_non_abattu.update_tracked(statut='ABATTU')
                         total_corrected += corrected
                         self.stdout.write(f'  ✅ {corrected} bêtes mises au statut ABATTU')
             
@@ -76,7 +76,7 @@ class Command(BaseCommand):
                 if betes_non_vivant.exists():
                     self.stdout.write(f'  ⚠️  {betes_non_vivant.count()} bêtes non vivantes dans stabulation ANNULE')
                     if not dry_run:
-                        corrected = betes_non_vivant.update(statut='VIVANT')
+                        corrected = betes_non_vivant.update_tracked(statut='VIVANT')
                         total_corrected += corrected
                         self.stdout.write(f'  ✅ {corrected} bêtes remises au statut VIVANT')
         
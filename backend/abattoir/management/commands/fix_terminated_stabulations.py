@@ -34,7 +34,7 @@ class Command(BaseCommand):
             # Corriger les bêtes qui ne sont pas encore abattues
             betes_a_corriger = stabulation.betes.exclude(statut='ABATTU')
             if betes_a_corriger.exists():
-                betes_a_corriger.update(statut='ABATTU')
+                betes_a_corriger.update_tracked(statut='ABATTU')
                 count = betes_a_corriger.count()
                 total_corrigees += count
                 self.stdout.write(f'  ✅ {count} bêtes corrigées au statut ABATTU')
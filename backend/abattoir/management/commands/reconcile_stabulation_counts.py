@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from abattoir.models import Stabulation
+
+
+class Command(BaseCommand):
+    help = 'Vérifie les compteurs de bêtes dénormalisés des stabulations (nombre_betes, betes_par_espece)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les écarts sans corriger les compteurs',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Mode dry-run activé - aucune modification ne sera effectuée'))
+
+        differences = Stabulation.reconcile_nombre_betes(dry_run=dry_run)
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS('✅ Compteurs des stabulations cohérents'))
+            return
+
+        for stabulation_id, (stored, stored_especes), (actual, actual_especes) in differences:
+            self.stdout.write(
+                f'  ⚠️  Stabulation {stabulation_id} : {stored} bête(s) {stored_especes} '
+                f'-> réel {actual} {actual_especes}'
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'🔍 {len(differences)} stabulation(s) à corriger'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(differences)} stabulation(s) corrigée(s)'))
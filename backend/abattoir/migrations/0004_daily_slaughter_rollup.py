@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-18 00:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bete', '0005_dashboard_counter'),
+        ('abattoir', '0003_historiquestabulation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySlaughterRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name="Date d'abattage")),
+                ('sexe', models.CharField(max_length=1, verbose_name='Sexe')),
+                ('nombre', models.PositiveIntegerField(default=0, verbose_name='Nombre de bêtes abattues')),
+                ('poids_vif_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Poids vif total (kg)')),
+                ('poids_a_chaud_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Poids à chaud total (kg)')),
+                ('poids_a_froid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Poids à froid total (kg)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+                ('abattoir', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slaughter_rollups', to='abattoir.abattoir', verbose_name='Abattoir')),
+                ('espece', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slaughter_rollups', to='bete.espece', verbose_name='Espèce')),
+            ],
+            options={
+                'verbose_name': 'Agrégat journalier des abattages',
+                'verbose_name_plural': 'Agrégats journaliers des abattages',
+                'ordering': ['-date', 'abattoir', 'espece', 'sexe'],
+                'indexes': [models.Index(fields=['abattoir', 'date'], name='abattoir_da_abattoi_abcee8_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyslaughterrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'abattoir', 'espece', 'sexe'), name='unique_daily_slaughter_rollup'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:06
+
+from django.db import migrations, models
+
+
+def count_stabulation_betes(apps, schema_editor):
+    """Initialiser les compteurs à partir des relations existantes"""
+    Stabulation = apps.get_model('abattoir', 'Stabulation')
+    rows = Stabulation.betes.through.objects.order_by().values(
+        'stabulation_id', 'bete__espece__nom'
+    ).annotate(nombre=models.Count('id'))
+    counts = {}
+    for row in rows:
+        counts.setdefault(row['stabulation_id'], {})[row['bete__espece__nom']] = row['nombre']
+    for stabulation_id, par_espece in counts.items():
+        Stabulation.objects.filter(pk=stabulation_id).update(
+            nombre_betes=sum(par_espece.values()), betes_par_espece=par_espece
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0004_daily_slaughter_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stabulation',
+            name='betes_par_espece',
+            field=models.JSONField(blank=True, default=dict, help_text="Nombre de bêtes par nom d'espèce", verbose_name='Bêtes par espèce'),
+        ),
+        migrations.AddField(
+            model_name='stabulation',
+            name='nombre_betes',
+            field=models.PositiveIntegerField(default=0, help_text='Nombre de bêtes actuellement dans la stabulation', verbose_name='Nombre de bêtes'),
+        ),
+        migrations.RunPython(count_stabulation_betes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0005_stabulation_nombre_betes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixe', models.CharField(max_length=10, verbose_name='Préfixe')),
+                ('jour', models.DateField(verbose_name='Jour')),
+                ('valeur', models.PositiveIntegerField(default=0, verbose_name='Dernière valeur allouée')),
+            ],
+            options={
+                'verbose_name': 'Séquence de documents',
+                'verbose_name_plural': 'Séquences de documents',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentsequence',
+            constraint=models.UniqueConstraint(fields=('prefixe', 'jour'), name='unique_document_sequence'),
+        ),
+    ]
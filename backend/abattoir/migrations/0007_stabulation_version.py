@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0006_document_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stabulation',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('abattoir', '0007_stabulation_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_rapport', models.CharField(choices=[('RAPPORT_ABATTAGES', 'Rapport des bêtes abattues'), ('EXPORT_BETES', 'Export des bêtes'), ('EXPORT_STABULATIONS', 'Export des stabulations'), ('EXPORT_TRANSFERTS', 'Export des transferts'), ('EXPORT_BONS', 'Export des bons de commande')], max_length=30, verbose_name='Type de rapport')),
+                ('format_fichier', models.CharField(choices=[('json', 'JSON'), ('csv', 'CSV'), ('xlsx', 'XLSX')], max_length=10, verbose_name='Format')),
+                ('parametres', models.JSONField(blank=True, default=dict, verbose_name='Paramètres (filtres)')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('EN_COURS', 'En cours'), ('TERMINE', 'Terminé'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=20, verbose_name='Statut')),
+                ('fichier', models.FileField(blank=True, upload_to='rapports/%Y/%m/%d/', verbose_name='Fichier')),
+                ('nombre_lignes', models.PositiveIntegerField(blank=True, null=True, verbose_name='Nombre de lignes')),
+                ('erreur', models.TextField(blank=True, verbose_name='Erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_debut', models.DateTimeField(blank=True, null=True, verbose_name='Début de génération')),
+                ('date_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin de génération')),
+                ('expire_le', models.DateTimeField(blank=True, null=True, verbose_name='Expire le')),
+                ('cree_par', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Créé par')),
+            ],
+            options={
+                'verbose_name': 'Rapport en arrière-plan',
+                'verbose_name_plural': 'Rapports en arrière-plan',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['cree_par', '-created_at'], name='abattoir_re_cree_pa_a024f3_idx'), models.Index(fields=['expire_le'], name='abattoir_re_expire__f69f88_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 02:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0008_report_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historiquechambrefroide',
+            name='date_mesure',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de mesure'),
+        ),
+        migrations.AddIndex(
+            model_name='historiquechambrefroide',
+            index=models.Index(fields=['chambre_froide', 'date_mesure'], name='abattoir_hi_chambre_345449_idx'),
+        ),
+    ]
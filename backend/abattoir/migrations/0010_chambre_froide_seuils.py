@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0009_historique_temperature_serie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chambrefroide',
+            name='temperature_max',
+            field=models.DecimalField(blank=True, decimal_places=1, help_text="Seuil haut d'alerte, valeur par défaut de la configuration si vide", max_digits=4, null=True, verbose_name='Température maximale (°C)'),
+        ),
+        migrations.AddField(
+            model_name='chambrefroide',
+            name='temperature_min',
+            field=models.DecimalField(blank=True, decimal_places=1, help_text="Seuil bas d'alerte, valeur par défaut de la configuration si vide", max_digits=4, null=True, verbose_name='Température minimale (°C)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0010_chambre_froide_seuils'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stabulation',
+            name='betes_par_espece',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Nombre de bêtes par nom d'espèce", verbose_name='Bêtes par espèce'),
+        ),
+        migrations.AlterField(
+            model_name='stabulation',
+            name='nombre_betes',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Nombre de bêtes actuellement dans la stabulation', verbose_name='Nombre de bêtes'),
+        ),
+    ]
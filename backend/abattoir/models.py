@@ -1,4 +1,9 @@
-from django.db import models
+from datetime import datetime, time as datetime_time, timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from users.models import User
@@ -77,6 +82,27 @@ class Abattoir(models.Model):
         return f"{self.commune}, {self.wilaya}"
 
 
+class ChambreFroideQuerySet(models.QuerySet):
+    """QuerySet des chambres froides avec le résumé de leurs mesures calculé en SQL"""
+
+    def with_mesures(self):
+        """
+        Annoter nb_mesures, derniere_temperature_mesure et date_derniere_mesure
+        Sous-requêtes corrélées servies par l'index (chambre_froide, date_mesure) :
+        nombre de requêtes constant quel que soit le nombre de chambres
+        """
+        mesures = HistoriqueChambreFroide.objects.filter(chambre_froide=OuterRef('pk'))
+        derniere = mesures.order_by('-date_mesure')[:1]
+        return self.annotate(
+            nb_mesures=Coalesce(
+                Subquery(mesures.order_by().values('chambre_froide').annotate(total=Count('id')).values('total')),
+                0
+            ),
+            derniere_temperature_mesure=Subquery(derniere.values('temperature')),
+            date_derniere_mesure=Subquery(derniere.values('date_mesure')),
+        )
+
+
 class ChambreFroide(models.Model):
     """Modèle pour les chambres froides"""
     
@@ -98,10 +124,30 @@ class ChambreFroide(models.Model):
         help_text=_('Volume en mètres cubes')
     )
     
+    # Seuils d'alerte (settings.TEMPERATURE_ALERTE_SEUIL_MIN/MAX si non renseignés)
+    temperature_min = models.DecimalField(
+        max_digits=4,
+        decimal_places=1,
+        null=True,
+        blank=True,
+        verbose_name=_('Température minimale (°C)'),
+        help_text=_('Seuil bas d\'alerte, valeur par défaut de la configuration si vide')
+    )
+    temperature_max = models.DecimalField(
+        max_digits=4,
+        decimal_places=1,
+        null=True,
+        blank=True,
+        verbose_name=_('Température maximale (°C)'),
+        help_text=_('Seuil haut d\'alerte, valeur par défaut de la configuration si vide')
+    )
+    
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de création'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Date de modification'))
     
+    objects = ChambreFroideQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('Chambre froide')
         verbose_name_plural = _('Chambres froides')
@@ -127,9 +173,10 @@ class HistoriqueChambreFroide(models.Model):
         verbose_name=_('Température (°C)'),
         help_text=_('Température en degrés Celsius')
     )
+    # Horodatage fourni par le capteur lors de l'ingestion par lots, sinon l'instant de l'enregistrement
     date_mesure = models.DateTimeField(
         verbose_name=_('Date de mesure'),
-        auto_now_add=True
+        default=timezone.now
     )
     
     # Utilisateur qui a effectué la mesure
@@ -158,6 +205,10 @@ class HistoriqueChambreFroide(models.Model):
         verbose_name = _('Historique chambre froide')
         verbose_name_plural = _('Historiques chambres froides')
         ordering = ['-date_mesure']
+        indexes = [
+            # Séries temporelles : plage de dates d'une chambre froide
+            models.Index(fields=['chambre_froide', 'date_mesure']),
+        ]
     
     def __str__(self):
         return f"{self.chambre_froide.numero} - {self.temperature}°C - {self.date_mesure.strftime('%d/%m/%Y %H:%M')}"
@@ -217,7 +268,101 @@ class HistoriqueStabulation(models.Model):
         return f"{self.stabulation.numero_stabulation} - {self.champ_modifie} - {self.utilisateur.username}"
 
 
-class Stabulation(models.Model):
+class TransitionConflict(ValueError):
+    """Le statut ou la version de l'objet a changé depuis sa lecture (transition concurrente)"""
+
+
+class ConditionalTransitionMixin:
+    """
+    Transitions de statut par UPDATE conditionnel : WHERE statut IN (attendus) AND version = (lue)
+    Le premier UPDATE l'emporte, les suivants lèvent TransitionConflict sans rien écrire.
+    Toute autre écriture par save() incrémente aussi version et n'est appliquée que sur la version lue :
+    une instance périmée ne peut pas réécrire l'ancien statut par-dessus une transition.
+    Le modèle doit avoir les champs statut, version et updated_at.
+    """
+    
+    MESSAGE_CONFLIT = "Cet élément a été modifié entre-temps par une autre opération, veuillez recharger"
+    
+    def save(self, *args, **kwargs):
+        """Écriture d'une ligne existante conditionnée à la version lue (verrouillage optimiste)"""
+        if self._state.adding or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        self._version_lue = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = self._version_lue
+            raise
+        finally:
+            del self._version_lue
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        version_lue = getattr(self, '_version_lue', None)
+        if version_lue is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        
+        if super()._do_update(
+            base_qs.filter(version=version_lue), using, pk_val, values, update_fields, forced_update
+        ):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            # La ligne existe mais a changé depuis sa lecture
+            raise TransitionConflict(self.MESSAGE_CONFLIT)
+        return False
+    
+    def _transition(self, statuts_attendus, user=None, **champs):
+        """Appliquer champs (dont le nouveau statut) si la ligne n'a pas changé depuis sa lecture"""
+        champs['updated_at'] = timezone.now()
+        modifiees = type(self).objects.filter(
+            pk=self.pk, statut__in=statuts_attendus, version=self.version
+        ).update(version=F('version') + 1, **champs)
+        if not modifiees:
+            raise TransitionConflict(self.MESSAGE_CONFLIT)
+        
+        for champ, valeur in champs.items():
+            setattr(self, champ, valeur)
+        self.version += 1
+        
+        # L'UPDATE ne passe pas par save() : historique simple_history écrit explicitement,
+        # à partir de la ligne relue pour ne pas figer des champs périmés de l'instance
+        history = getattr(type(self), 'history', None)
+        if history is not None:
+            self.refresh_from_db()
+            history.bulk_history_create([self], update=True, default_user=user, default_date=champs['updated_at'])
+
+
+class StabulationQuerySet(models.QuerySet):
+    """QuerySet des stabulations avec le taux d'occupation calculé en SQL"""
+
+    def with_occupation(self):
+        """
+        Annoter nb_betes, capacite et taux (mêmes règles que nombre_betes_actuelles,
+        capacite_maximale et taux_occupation)
+        nb_betes lit le compteur dénormalisé : les annotations restent agrégeables (Avg, Sum)
+        """
+        return self.annotate(
+            nb_betes=F('nombre_betes'),
+            capacite=Case(
+                When(type_bete='BOVIN', then=F('abattoir__capacite_stabulation_bovin')),
+                # Pour les caprins, on utilise la capacité ovine comme référence
+                When(type_bete__in=['OVIN', 'CAPRIN'], then=F('abattoir__capacite_stabulation_ovin')),
+                default=F('abattoir__capacite_stabulation_ovin') + F('abattoir__capacite_stabulation_bovin'),
+            ),
+        ).annotate(
+            taux=Case(
+                When(capacite__gt=0, then=Cast('nb_betes', FloatField()) * 100 / F('capacite')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+
+class Stabulation(ConditionalTransitionMixin, models.Model):
     """Modèle pour gérer les bêtes en stabulation dans les abattoirs"""
     
     STATUT_CHOICES = [
@@ -352,6 +497,28 @@ class Stabulation(models.Model):
         help_text=_('Date et heure de la finalisation de la stabulation')
     )
     
+    # Compteurs dénormalisés des bêtes présentes (maintenus par abattoir.signals sur m2m_changed)
+    # Écrits uniquement par rafraichir_nombre_betes : jamais par le save() d'une instance existante
+    nombre_betes = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Nombre de bêtes'),
+        help_text=_('Nombre de bêtes actuellement dans la stabulation')
+    )
+    
+    betes_par_espece = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_('Bêtes par espèce'),
+        help_text=_('Nombre de bêtes par nom d\'espèce')
+    )
+    
+    # Incrémentée à chaque écriture, transitions de statut comprises (verrouillage optimiste)
+    version = models.PositiveIntegerField(default=0, verbose_name=_('Version'))
+    
+    objects = StabulationQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('Stabulation')
         verbose_name_plural = _('Stabulations')
@@ -366,35 +533,34 @@ class Stabulation(models.Model):
         return f"Stabulation {self.numero_stabulation} - {self.abattoir.nom} ({self.type_bete})"
     
     def generate_numero_stabulation(self):
-        """Génère un numéro de stabulation unique"""
-        from django.utils import timezone
-        from datetime import datetime
-        
-        # Format: STAB-YYYYMMDD-HHMMSS-XXX
-        now = timezone.now()
-        date_str = now.strftime('%Y%m%d')
-        time_str = now.strftime('%H%M%S')
-        
-        # Chercher le prochain numéro séquentiel pour cette date
-        base_numero = f"STAB-{date_str}-{time_str}"
-        counter = 1
-        
-        while True:
-            numero = f"{base_numero}-{counter:03d}"
-            if not Stabulation.objects.filter(numero_stabulation=numero).exists():
-                return numero
-            counter += 1
+        """Génère un numéro de stabulation unique (format STAB-AAAAMMJJ-NNNNN)"""
+        from abattoir.sequences import next_document_number
+        return next_document_number('STAB')
+    
+    COMPTEURS_BETES = ('nombre_betes', 'betes_par_espece')
     
     def save(self, *args, **kwargs):
-        """Override save pour générer automatiquement le numéro de stabulation"""
+        """
+        Override save pour générer automatiquement le numéro de stabulation
+        Hors création, les compteurs de bêtes sont exclus de l'UPDATE : une instance lue avant un
+        ajout ou un retrait de bêtes ne réécrit pas d'anciennes valeurs
+        """
         if not self.numero_stabulation:
             self.numero_stabulation = self.generate_numero_stabulation()
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            update_fields = [field for field in update_fields if field not in self.COMPTEURS_BETES]
+            if not update_fields:
+                return
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
     
     @property
     def nombre_betes_actuelles(self):
-        """Retourne le nombre actuel de bêtes en stabulation"""
-        return self.betes.count()
+        """Retourne le nombre actuel de bêtes en stabulation (compteur dénormalisé)"""
+        return self.nombre_betes
     
     @property
     def capacite_maximale(self):
@@ -493,7 +659,9 @@ class Stabulation(models.Model):
             capacite_type = self.abattoir.capacite_totale_stabulation
         
         # Compter les bêtes actuelles du même type
-        betes_meme_type = self.betes.filter(espece__nom__iexact=type_bete).count()
+        betes_meme_type = sum(
+            nombre for espece, nombre in self.betes_par_espece.items() if espece.lower() == type_bete.lower()
+        )
         places_disponibles_type = max(0, capacite_type - betes_meme_type)
         
         return places_disponibles_type >= nombre and self.statut == 'EN_COURS'
@@ -508,10 +676,31 @@ class Stabulation(models.Model):
         
         # IMPORTANT: Mettre les bêtes au statut EN_STABULATION
         from bete.models import Bete
-        Bete.objects.filter(id__in=[b.id for b in betes_list]).update(statut='EN_STABULATION')
+        Bete.objects.filter(id__in=[b.id for b in betes_list]).update_tracked(statut='EN_STABULATION')
         
         return True
     
+    @transaction.atomic
+    def ajouter_betes_en_masse(self, betes_ids, user=None):
+        """
+        Ajoute des bêtes déjà validées (ids) : relations en bulk_create, statut en un UPDATE
+        Retourne le nombre de bêtes passées EN_STABULATION
+        """
+        from bete.status_manager import BeteStatusManager
+        
+        Through = Stabulation.betes.through
+        # bulk_create ne déclenche pas m2m_changed : compteurs recalculés explicitement
+        Through.objects.bulk_create(
+            [Through(stabulation_id=self.pk, bete_id=bete_id) for bete_id in betes_ids],
+            batch_size=500
+        )
+        self.nombre_betes, self.betes_par_espece = Stabulation.rafraichir_nombre_betes([self.pk])[self.pk]
+        
+        result = BeteStatusManager.bulk_change_status(
+            betes_ids, 'EN_STABULATION', reason=f'Ajout à la stabulation {self.numero_stabulation}', user=user
+        )
+        return result['updated_count']
+    
     def retirer_betes(self, betes_list):
         """Retire des bêtes de la stabulation et les remet au statut VIVANT"""
         # Retirer la relation
@@ -519,38 +708,90 @@ class Stabulation(models.Model):
         
         # IMPORTANT: Remettre les bêtes au statut VIVANT
         from bete.models import Bete
-        Bete.objects.filter(id__in=[b.id for b in betes_list]).update(statut='VIVANT')
+        Bete.objects.filter(id__in=[b.id for b in betes_list]).update_tracked(statut='VIVANT')
     
     def vider_stabulation(self):
         """Vide complètement la stabulation"""
         self.betes.clear()
     
-    def terminer_stabulation(self):
+    @classmethod
+    def compter_betes(cls, stabulation_ids):
+        """Comptage réel des bêtes {stabulation_id: (nombre, {espèce: nombre})} en une requête"""
+        counts = {stabulation_id: (0, {}) for stabulation_id in stabulation_ids}
+        rows = cls.betes.through.objects.filter(stabulation_id__in=list(counts)).order_by().values(
+            'stabulation_id', 'bete__espece__nom'
+        ).annotate(nombre=Count('id'))
+        for row in rows:
+            total, par_espece = counts[row['stabulation_id']]
+            par_espece[row['bete__espece__nom']] = row['nombre']
+            counts[row['stabulation_id']] = (total + row['nombre'], par_espece)
+        return counts
+    
+    @classmethod
+    def rafraichir_nombre_betes(cls, stabulation_ids):
+        """Recalculer les compteurs dénormalisés des stabulations données"""
+        counts = cls.compter_betes(stabulation_ids)
+        for stabulation_id, (nombre, par_espece) in counts.items():
+            cls.objects.filter(pk=stabulation_id).update(nombre_betes=nombre, betes_par_espece=par_espece)
+        return counts
+    
+    @classmethod
+    def reconcile_nombre_betes(cls, dry_run=False):
+        """
+        Comparer les compteurs dénormalisés au comptage réel et corriger les écarts
+        Retourne [(stabulation_id, (nombre, par_espece) stocké, (nombre, par_espece) réel)]
+        """
+        stored = {
+            row[0]: (row[1], row[2])
+            for row in cls.objects.order_by().values_list('id', 'nombre_betes', 'betes_par_espece')
+        }
+        actual = cls.compter_betes(stored)
+        differences = [
+            (stabulation_id, stored[stabulation_id], actual[stabulation_id])
+            for stabulation_id in sorted(stored) if stored[stabulation_id] != actual[stabulation_id]
+        ]
+        if not dry_run:
+            with transaction.atomic():
+                for stabulation_id, _, (nombre, par_espece) in differences:
+                    cls.objects.filter(pk=stabulation_id).update(nombre_betes=nombre, betes_par_espece=par_espece)
+        return differences
+    
+    @transaction.atomic
+    def terminer_stabulation(self, utilisateur=None):
         """Termine la stabulation et met toutes les bêtes au statut ABATTU"""
         if self.statut == 'EN_COURS':
-            from django.utils import timezone
             from bete.status_manager import BeteStatusManager
             
+            # Transition d'abord : un second opérateur échoue ici, avant de toucher aux bêtes
+            self._transition(['EN_COURS'], user=utilisateur, statut='TERMINE', date_fin=timezone.now())
+            
             # CRITIQUE: Utiliser le gestionnaire unifié pour éviter les conflits
             result = BeteStatusManager.finalize_stabulation_betes(
                 stabulation_id=self.id,
-                user=None  # Pas d'utilisateur dans le modèle
+                user=utilisateur
             )
             
             if not result['success']:
                 raise ValueError(f"Erreur lors de la finalisation des bêtes: {result['error']}")
             
-            # Maintenant changer le statut de la stabulation
-            self.statut = 'TERMINE'
-            self.date_fin = timezone.now()
-            self.save()
+            # Alimenter l'agrégat journalier des abattages
+            DailySlaughterRollup.add_stabulation(self)
     
+    @transaction.atomic
     def annuler_stabulation(self, utilisateur=None, raison=None):
         """Annule la stabulation et remet les bêtes au statut VIVANT"""
         if self.statut == 'EN_COURS':
-            from django.utils import timezone
             from bete.status_manager import BeteStatusManager
             
+            # Enregistrer qui a annulé et pourquoi
+            maintenant = timezone.now()
+            champs = {'statut': 'ANNULE', 'date_fin': maintenant, 'date_annulation': maintenant}
+            if utilisateur:
+                champs['annule_par'] = utilisateur
+            if raison:
+                champs['raison_annulation'] = raison
+            self._transition(['EN_COURS'], user=utilisateur, **champs)
+            
             # CRITIQUE: Utiliser le gestionnaire unifié pour éviter les conflits
             result = BeteStatusManager.cancel_stabulation_betes(
                 stabulation_id=self.id,
@@ -559,19 +800,6 @@ class Stabulation(models.Model):
             
             if not result['success']:
                 raise ValueError(f"Erreur lors de l'annulation des bêtes: {result['error']}")
-            
-            # Maintenant changer le statut de la stabulation
-            self.statut = 'ANNULE'
-            self.date_fin = timezone.now()
-            
-            # Enregistrer qui a annulé et pourquoi
-            if utilisateur:
-                self.annule_par = utilisateur
-            if raison:
-                self.raison_annulation = raison
-            self.date_annulation = timezone.now()
-            
-            self.save()
     
     def enregistrer_modification(self, utilisateur, champ, ancienne_valeur, nouvelle_valeur):
         """Enregistre une modification dans l'historique"""
@@ -581,4 +809,218 @@ class Stabulation(models.Model):
             champ_modifie=champ,
             ancienne_valeur=str(ancienne_valeur) if ancienne_valeur is not None else '',
             nouvelle_valeur=str(nouvelle_valeur) if nouvelle_valeur is not None else ''
-        )
\ No newline at end of file
+        )
+
+
+class DailySlaughterRollup(models.Model):
+    """
+    Agrégat journalier des abattages (date × abattoir × espèce × sexe)
+    Alimenté à la finalisation des stabulations, reconstruit par backfill_slaughter_rollup.
+    """
+    
+    ROLLUP_SUMS = ('poids_vif', 'poids_a_chaud', 'poids_a_froid')
+    
+    date = models.DateField(verbose_name=_('Date d\'abattage'))
+    abattoir = models.ForeignKey(
+        Abattoir,
+        on_delete=models.CASCADE,
+        related_name='slaughter_rollups',
+        verbose_name=_('Abattoir')
+    )
+    espece = models.ForeignKey(
+        'bete.Espece',
+        on_delete=models.CASCADE,
+        related_name='slaughter_rollups',
+        verbose_name=_('Espèce')
+    )
+    sexe = models.CharField(max_length=1, verbose_name=_('Sexe'))
+    nombre = models.PositiveIntegerField(default=0, verbose_name=_('Nombre de bêtes abattues'))
+    poids_vif_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name=_('Poids vif total (kg)')
+    )
+    poids_a_chaud_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name=_('Poids à chaud total (kg)')
+    )
+    poids_a_froid_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name=_('Poids à froid total (kg)')
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Date de mise à jour'))
+    
+    class Meta:
+        verbose_name = _('Agrégat journalier des abattages')
+        verbose_name_plural = _('Agrégats journaliers des abattages')
+        ordering = ['-date', 'abattoir', 'espece', 'sexe']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'abattoir', 'espece', 'sexe'], name='unique_daily_slaughter_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['abattoir', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.abattoir_id} - {self.espece_id} ({self.sexe}): {self.nombre}"
+    
+    @classmethod
+    def _aggregate(cls, betes):
+        """Valeurs agrégées (nombre et sommes de poids) d'un QuerySet de bêtes déjà groupé"""
+        sums = {
+            f'{field}_total': Coalesce(Sum(field), Value(0), output_field=models.DecimalField())
+            for field in cls.ROLLUP_SUMS
+        }
+        return betes.annotate(nombre=Count('id', distinct=True), **sums)
+    
+    @classmethod
+    def add_stabulation(cls, stabulation):
+        """Ajouter les bêtes abattues d'une stabulation terminée à l'agrégat du jour"""
+        jour = timezone.localdate(stabulation.date_fin)
+        rows = cls._aggregate(
+            stabulation.betes.filter(statut='ABATTU').order_by().values('espece_id', 'sexe')
+        )
+        for row in rows:
+            key = {'date': jour, 'abattoir_id': stabulation.abattoir_id, 'espece_id': row['espece_id'], 'sexe': row['sexe']}
+            increments = {field: F(field) + row[field] for field in ('nombre',) + tuple(f'{name}_total' for name in cls.ROLLUP_SUMS)}
+            if cls.objects.filter(**key).update(**increments, updated_at=timezone.now()):
+                continue
+            values = {field: row[field] for field in increments}
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**key, **values)
+            except IntegrityError:
+                # Ligne créée entre-temps par une autre finalisation
+                cls.objects.filter(**key).update(**increments, updated_at=timezone.now())
+    
+    @classmethod
+    def rebuild(cls, start_date, end_date):
+        """Reconstruire l'agrégat sur une plage de jours à partir des stabulations terminées"""
+        from bete.models import Bete
+        
+        debut = timezone.make_aware(datetime.combine(start_date, datetime_time.min))
+        fin = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime_time.min))
+        rows = cls._aggregate(
+            Bete.objects.filter(
+                statut='ABATTU',
+                stabulations__statut='TERMINE',
+                stabulations__date_fin__gte=debut,
+                stabulations__date_fin__lt=fin,
+            ).annotate(
+                jour=TruncDate('stabulations__date_fin'),
+                stabulation_abattoir_id=F('stabulations__abattoir_id'),
+            ).order_by().values('jour', 'stabulation_abattoir_id', 'espece_id', 'sexe')
+        )
+        with transaction.atomic():
+            cls.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+            created = cls.objects.bulk_create([
+                cls(
+                    date=row['jour'],
+                    abattoir_id=row['stabulation_abattoir_id'],
+                    espece_id=row['espece_id'],
+                    sexe=row['sexe'],
+                    nombre=row['nombre'],
+                    **{f'{name}_total': row[f'{name}_total'] for name in cls.ROLLUP_SUMS}
+                )
+                for row in rows
+            ], batch_size=1000)
+        return len(created)
+
+
+class DocumentSequence(models.Model):
+    """
+    Compteur de numérotation des documents par préfixe et par jour
+    Incrémenté atomiquement (UPDATE ... SET valeur = valeur + n) : voir abattoir.sequences
+    """
+    
+    prefixe = models.CharField(max_length=10, verbose_name=_('Préfixe'))
+    jour = models.DateField(verbose_name=_('Jour'))
+    valeur = models.PositiveIntegerField(default=0, verbose_name=_('Dernière valeur allouée'))
+    
+    class Meta:
+        verbose_name = _('Séquence de documents')
+        verbose_name_plural = _('Séquences de documents')
+        constraints = [
+            models.UniqueConstraint(fields=['prefixe', 'jour'], name='unique_document_sequence'),
+        ]
+    
+    def __str__(self):
+        return f"{self.prefixe} {self.jour}: {self.valeur}"
+    
+    @classmethod
+    def allocate(cls, prefixe, jour, taille=1):
+        """
+        Réserver `taille` valeurs consécutives et retourner la première
+        L'UPDATE verrouille la ligne jusqu'à la fin de la transaction : aucune valeur n'est distribuée deux fois.
+        """
+        sequence = cls.objects.filter(prefixe=prefixe, jour=jour)
+        with transaction.atomic():
+            if not sequence.update(valeur=F('valeur') + taille):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(prefixe=prefixe, jour=jour, valeur=taille)
+                    return 1
+                except IntegrityError:
+                    # Ligne créée entre-temps par un autre processus
+                    sequence.update(valeur=F('valeur') + taille)
+            return sequence.values_list('valeur', flat=True).get() - taille + 1
+
+
+class ReportJob(models.Model):
+    """
+    Rapport ou export généré en arrière-plan (voir abattoir.reports)
+    Le fichier produit est conservé sous MEDIA_ROOT jusqu'à expire_le.
+    """
+    
+    TYPE_CHOICES = [
+        ('RAPPORT_ABATTAGES', _('Rapport des bêtes abattues')),
+        ('EXPORT_BETES', _('Export des bêtes')),
+        ('EXPORT_STABULATIONS', _('Export des stabulations')),
+        ('EXPORT_TRANSFERTS', _('Export des transferts')),
+        ('EXPORT_BONS', _('Export des bons de commande')),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('json', 'JSON'),
+        ('csv', 'CSV'),
+        ('xlsx', 'XLSX'),
+    ]
+    
+    STATUT_CHOICES = [
+        ('EN_ATTENTE', _('En attente')),
+        ('EN_COURS', _('En cours')),
+        ('TERMINE', _('Terminé')),
+        ('ECHEC', _('Échec')),
+    ]
+    
+    type_rapport = models.CharField(max_length=30, choices=TYPE_CHOICES, verbose_name=_('Type de rapport'))
+    format_fichier = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name=_('Format'))
+    parametres = models.JSONField(default=dict, blank=True, verbose_name=_('Paramètres (filtres)'))
+    statut = models.CharField(
+        max_length=20, choices=STATUT_CHOICES, default='EN_ATTENTE', verbose_name=_('Statut')
+    )
+    fichier = models.FileField(upload_to='rapports/%Y/%m/%d/', blank=True, verbose_name=_('Fichier'))
+    nombre_lignes = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Nombre de lignes'))
+    erreur = models.TextField(blank=True, verbose_name=_('Erreur'))
+    cree_par = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='report_jobs',
+        verbose_name=_('Créé par')
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de création'))
+    date_debut = models.DateTimeField(null=True, blank=True, verbose_name=_('Début de génération'))
+    date_fin = models.DateTimeField(null=True, blank=True, verbose_name=_('Fin de génération'))
+    expire_le = models.DateTimeField(null=True, blank=True, verbose_name=_('Expire le'))
+    
+    class Meta:
+        verbose_name = _('Rapport en arrière-plan')
+        verbose_name_plural = _('Rapports en arrière-plan')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['cree_par', '-created_at']),
+            models.Index(fields=['expire_le']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_rapport_display()} ({self.format_fichier}) - {self.get_statut_display()}"
+    
+    @property
+    def est_expire(self):
+        return self.expire_le is not None and self.expire_le <= timezone.now()
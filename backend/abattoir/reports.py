@@ -0,0 +1,278 @@
+"""
+Rapports et exports générés en arrière-plan (ReportJob)
+
+soumettre() enregistre la demande puis, après commit, la confie à l'exécuteur
+configuré par settings.REPORT_JOBS_EXECUTOR :
+
+- 'celery' : tâche backend.tasks.generate_report (worker Celery)
+- 'thread' : pool de threads local au processus (développement sans worker)
+- 'eager'  : exécution immédiate dans le processus (tests)
+
+executer() fait passer la demande de EN_ATTENTE à EN_COURS par un UPDATE conditionnel :
+une tâche livrée deux fois par le broker n'est générée qu'une fois. Le fichier est
+écrit sous MEDIA_ROOT et supprimé par supprimer_rapports_expires() après
+REPORT_JOBS_RETENTION_HOURS heures.
+"""
+import json
+import logging
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Bêtes détaillées par stabulation terminée dans le rapport des abattages
+BETES_PAR_STABULATION = 20
+
+
+def rapport_abattages():
+    """Rapport des bêtes abattues : nombre de requêtes constant quel que soit le nombre de stabulations"""
+    from bete.models import Bete
+    from .models import Stabulation
+
+    stats_by_status = list(Bete.objects.values('statut').annotate(count=Count('id')).order_by('statut'))
+    total_betes = sum(row['count'] for row in stats_by_status)
+    betes_abattues_count = sum(row['count'] for row in stats_by_status if row['statut'] == 'ABATTU')
+
+    stabulations_terminees = Stabulation.objects.filter(statut='TERMINE').select_related('abattoir').annotate(
+        betes_abattues_count=Count('betes', filter=Q(betes__statut='ABATTU'))
+    )
+
+    # Les BETES_PAR_STABULATION dernières bêtes abattues de chaque stabulation, en une requête
+    betes_par_stabulation = defaultdict(list)
+    betes = Bete.objects.filter(statut='ABATTU', stabulations__statut='TERMINE').annotate(
+        stabulation_id=F('stabulations__id'),
+        rang=Window(RowNumber(), partition_by=F('stabulations__id'), order_by=[F('created_at').desc(), F('id').desc()]),
+    ).filter(rang__lte=BETES_PAR_STABULATION).order_by('stabulation_id', 'rang').values(
+        'stabulation_id', 'id', 'num_boucle', 'num_boucle_post_abattage', 'espece__nom',
+        'poids_vif', 'poids_a_chaud', 'poids_a_froid', 'updated_at'
+    )
+    for bete in betes:
+        betes_par_stabulation[bete['stabulation_id']].append({
+            'id': bete['id'],
+            'num_boucle': bete['num_boucle'],
+            'num_boucle_post_abattage': bete['num_boucle_post_abattage'],
+            'espece': bete['espece__nom'],
+            'poids_vif': float(bete['poids_vif']) if bete['poids_vif'] else None,
+            'poids_a_chaud': float(bete['poids_a_chaud']) if bete['poids_a_chaud'] else None,
+            'poids_a_froid': float(bete['poids_a_froid']) if bete['poids_a_froid'] else None,
+            'date_abattage': bete['updated_at'].isoformat()
+        })
+
+    stabulations_details = [
+        {
+            'stabulation_id': stab.id,
+            'numero_stabulation': stab.numero_stabulation,
+            'abattoir': stab.abattoir.nom,
+            'date_fin': stab.date_fin,
+            'betes_abattues_count': stab.betes_abattues_count,
+            'betes_details': betes_par_stabulation.get(stab.id, [])
+        }
+        for stab in stabulations_terminees
+    ]
+
+    betes_recentes = Bete.objects.filter(statut='ABATTU').select_related('espece', 'abattoir').order_by('-updated_at')[:50]
+
+    return {
+        'summary': {
+            'total_betes': total_betes,
+            'betes_abattues': betes_abattues_count,
+            'stabulations_terminees': len(stabulations_details),
+            'taux_abattage': round((betes_abattues_count / total_betes * 100), 2) if total_betes > 0 else 0
+        },
+        'stats_by_status': stats_by_status,
+        'stabulations_terminees': stabulations_details,
+        'betes_abattues_recentes': [
+            {
+                'id': bete.id,
+                'num_boucle': bete.num_boucle,
+                'espece': bete.espece.nom,
+                'abattoir': bete.abattoir.nom if bete.abattoir else 'N/A',
+                'poids_a_chaud': float(bete.poids_a_chaud) if bete.poids_a_chaud else None,
+                'date_abattage': bete.updated_at.isoformat()
+            } for bete in betes_recentes
+        ]
+    }
+
+
+def _requete(job):
+    """Requête GET reconstituée (utilisateur et filtres de la demande) pour réutiliser les filtres des vues"""
+    from django.http import HttpRequest, QueryDict
+    from rest_framework.request import Request
+
+    parametres = QueryDict(mutable=True)
+    for cle, valeur in job.parametres.items():
+        parametres.setlist(cle, [str(v) for v in valeur] if isinstance(valeur, list) else [str(valeur)])
+
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = parametres
+    requete = Request(http_request)
+    requete.user = job.cree_par
+    return requete
+
+
+def _generer_rapport_abattages(job):
+    fichier = tempfile.TemporaryFile()
+    rapport = rapport_abattages()
+    fichier.write(json.dumps(rapport, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8'))
+    return fichier, rapport['summary']['betes_abattues']
+
+
+def _generer_export(job, queryset, colonnes, titre):
+    from backend.exports import fichier_xlsx, flux_csv, iter_lignes
+
+    compteur = {'lignes': 0}
+
+    def lignes():
+        for ligne in iter_lignes(queryset, colonnes):
+            compteur['lignes'] += 1
+            yield ligne
+
+    if job.format_fichier == 'xlsx':
+        fichier = fichier_xlsx(titre, colonnes, lignes())
+    else:
+        fichier = tempfile.TemporaryFile()
+        for fragment in flux_csv(colonnes, lignes()):
+            fichier.write(fragment.encode('utf-8'))
+    return fichier, compteur['lignes']
+
+
+def _generer_export_betes(job):
+    from bete.views import BETE_EXPORT_COLONNES, _livestock_queryset
+
+    queryset = _livestock_queryset(_requete(job)).order_by('-created_at', '-id')
+    return _generer_export(job, queryset, BETE_EXPORT_COLONNES, 'Bêtes')
+
+
+def _generer_export_stabulations(job):
+    from .views import STABULATION_EXPORT_COLONNES, _stabulations_queryset
+
+    return _generer_export(job, _stabulations_queryset(_requete(job)), STABULATION_EXPORT_COLONNES, 'Stabulations')
+
+
+def _generer_export_transferts(job):
+    from transfert.views import TRANSFERT_EXPORT_COLONNES, TransfertViewSet
+
+    # Mêmes filtres, recherche et tri que la liste du ViewSet
+    vue = TransfertViewSet(request=_requete(job), action='list', format_kwarg=None, args=(), kwargs={})
+    return _generer_export(job, vue.filter_queryset(vue.get_queryset()), TRANSFERT_EXPORT_COLONNES, 'Transferts')
+
+
+def _generer_export_bons(job):
+    from bon_commande.views import BON_EXPORT_COLONNES, _bons_queryset
+
+    return _generer_export(job, _bons_queryset(_requete(job)), BON_EXPORT_COLONNES, 'Bons de commande')
+
+
+# type_rapport -> (générateur, formats acceptés)
+GENERATEURS = {
+    'RAPPORT_ABATTAGES': (_generer_rapport_abattages, ('json',)),
+    'EXPORT_BETES': (_generer_export_betes, ('csv', 'xlsx')),
+    'EXPORT_STABULATIONS': (_generer_export_stabulations, ('csv', 'xlsx')),
+    'EXPORT_TRANSFERTS': (_generer_export_transferts, ('csv', 'xlsx')),
+    'EXPORT_BONS': (_generer_export_bons, ('csv', 'xlsx')),
+}
+
+
+def formats_acceptes(type_rapport):
+    return GENERATEURS[type_rapport][1]
+
+
+def soumettre(type_rapport, format_fichier, parametres, user):
+    """Enregistrer une demande de rapport et la lancer après commit"""
+    from .models import ReportJob
+
+    job = ReportJob.objects.create(
+        type_rapport=type_rapport,
+        format_fichier=format_fichier,
+        parametres=parametres or {},
+        cree_par=user
+    )
+    transaction.on_commit(lambda: _lancer(job.id))
+    return job
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _thread_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'REPORT_JOBS_THREADS', 2), thread_name_prefix='report-job'
+                )
+    return _pool
+
+
+def _executer_dans_thread(job_id):
+    try:
+        executer(job_id)
+    finally:
+        # Connexion propre au thread
+        connection.close()
+
+
+def _lancer(job_id):
+    executeur = getattr(settings, 'REPORT_JOBS_EXECUTOR', 'celery')
+    if executeur == 'celery':
+        from backend.tasks import generate_report
+        generate_report.delay(job_id)
+    elif executeur == 'thread':
+        _thread_pool().submit(_executer_dans_thread, job_id)
+    else:
+        executer(job_id)
+
+
+def executer(job_id):
+    """Générer le fichier d'une demande EN_ATTENTE (None si elle est déjà prise en charge)"""
+    from .models import ReportJob
+
+    if not ReportJob.objects.filter(pk=job_id, statut='EN_ATTENTE').update(
+        statut='EN_COURS', date_debut=timezone.now()
+    ):
+        return None
+
+    job = ReportJob.objects.select_related('cree_par').get(pk=job_id)
+    try:
+        generateur = GENERATEURS[job.type_rapport][0]
+        fichier, job.nombre_lignes = generateur(job)
+        with fichier:
+            fichier.seek(0)
+            # Nom imprévisible : MEDIA_URL peut être servi sans authentification
+            job.fichier.save(f'{job.type_rapport.lower()}_{uuid.uuid4().hex}.{job.format_fichier}', File(fichier), save=False)
+        job.statut = 'TERMINE'
+    except Exception as e:
+        logger.exception(f'Erreur lors de la génération du rapport {job_id}')
+        job.statut = 'ECHEC'
+        job.erreur = str(e)
+
+    job.date_fin = timezone.now()
+    job.expire_le = job.date_fin + timedelta(hours=getattr(settings, 'REPORT_JOBS_RETENTION_HOURS', 24))
+    job.save(update_fields=['statut', 'fichier', 'nombre_lignes', 'erreur', 'date_fin', 'expire_le'])
+    return job
+
+
+def supprimer_rapports_expires():
+    """Supprimer les demandes expirées et leurs fichiers, retourne le nombre de demandes supprimées"""
+    from .models import ReportJob
+
+    expires = ReportJob.objects.filter(expire_le__lte=timezone.now())
+    for job in expires.only('id', 'fichier').iterator():
+        if job.fichier:
+            job.fichier.delete(save=False)
+    return expires.delete()[0]
@@ -0,0 +1,79 @@
+"""
+Numérotation des documents (stabulations, transferts, réceptions, bons de commande)
+
+Format : PREFIXE-AAAAMMJJ-NNNNN, NNNNN étant un compteur quotidien par préfixe
+(DocumentSequence) incrémenté atomiquement en base : ni boucle exists(), ni collision
+entre workers concurrents.
+
+Avec settings.DOCUMENT_SEQUENCE_BLOCK_SIZE > 1, chaque processus réserve des plages
+de numéros et les distribue en mémoire (aucune requête hors changement de plage) ;
+les numéros d'une plage non utilisée avant l'arrêt du processus sont perdus.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+class SequenceAllocator:
+    """Distribue les valeurs des séquences par plages réservées en base"""
+
+    def __init__(self, block_size=1):
+        self.block_size = max(int(block_size), 1)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def next_value(self, prefixe, jour):
+        """Prochaine valeur de la séquence (prefixe, jour)"""
+        from .models import DocumentSequence
+
+        if self.block_size == 1:
+            return DocumentSequence.allocate(prefixe, jour)
+
+        key = (prefixe, jour)
+        with self._lock:
+            suivante, fin = self._blocks.get(key, (1, 0))
+            if suivante <= fin:
+                self._blocks[key] = (suivante + 1, fin)
+                return suivante
+
+        debut = DocumentSequence.allocate(prefixe, jour, self.block_size)
+        # La plage n'est partagée qu'une fois la réservation validée : après un rollback,
+        # le compteur en base revient en arrière et la plage pourrait être redistribuée
+        transaction.on_commit(lambda: self._store(key, debut + 1, debut + self.block_size - 1))
+        return debut
+
+    def _store(self, key, suivante, fin):
+        with self._lock:
+            courante = self._blocks.get(key)
+            if courante is None or courante[0] > courante[1]:
+                # Les plages des jours précédents ne serviront plus
+                self._blocks = {k: v for k, v in self._blocks.items() if k[1] == key[1]}
+                self._blocks[key] = (suivante, fin)
+
+    def reset(self):
+        """Oublier les plages réservées (tests)"""
+        with self._lock:
+            self._blocks.clear()
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    """Allocateur configuré par settings.DOCUMENT_SEQUENCE_BLOCK_SIZE (singleton par processus)"""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = SequenceAllocator(getattr(settings, 'DOCUMENT_SEQUENCE_BLOCK_SIZE', 1))
+    return _allocator
+
+
+def next_document_number(prefixe):
+    """Numéro de document suivant pour un préfixe, ex. STAB-20240131-00042"""
+    jour = timezone.localdate()
+    valeur = get_allocator().next_value(prefixe, jour)
+    return f"{prefixe}-{jour.strftime('%Y%m%d')}-{valeur:05d}"
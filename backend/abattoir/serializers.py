@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Abattoir, ChambreFroide, HistoriqueChambreFroide, Stabulation, HistoriqueStabulation
+from django.urls import reverse
+from .models import Abattoir, ChambreFroide, HistoriqueChambreFroide, ReportJob, Stabulation, HistoriqueStabulation
 
 
 class AbattoirSerializer(serializers.ModelSerializer):
@@ -34,17 +35,21 @@ class ChambreFroideSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChambreFroide
         fields = [
-            'id', 'abattoir', 'abattoir_nom', 'numero', 'dimensions_m3',
+            'id', 'abattoir', 'abattoir_nom', 'numero', 'dimensions_m3', 'temperature_min', 'temperature_max',
             'nombre_mesures', 'derniere_temperature', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'nombre_mesures', 'derniere_temperature']
     
     def get_nombre_mesures(self, obj):
-        """Retourne le nombre de mesures de température"""
+        """Retourne le nombre de mesures de température (annotation de with_mesures() si présente)"""
+        if hasattr(obj, 'nb_mesures'):
+            return obj.nb_mesures
         return obj.historique_temperatures.count()
     
     def get_derniere_temperature(self, obj):
-        """Retourne la dernière température enregistrée"""
+        """Retourne la dernière température enregistrée (annotation de with_mesures() si présente)"""
+        if hasattr(obj, 'derniere_temperature_mesure'):
+            return obj.derniere_temperature_mesure
         derniere_mesure = obj.historique_temperatures.first()
         return derniere_mesure.temperature if derniere_mesure else None
 
@@ -67,6 +72,15 @@ class HistoriqueChambreFroideSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'mesure_par_nom', 'mesure_par_username']
 
 
+class MesureTemperatureLotSerializer(serializers.Serializer):
+    """Serializer pour une mesure d'un lot (chambres froides vérifiées en une requête par enregistrer_mesures)"""
+
+    chambre_froide_id = serializers.IntegerField()
+    temperature = serializers.DecimalField(max_digits=4, decimal_places=1)
+    date_mesure = serializers.DateTimeField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
 class AbattoirStatsSerializer(serializers.Serializer):
     """Serializer pour les statistiques des abattoirs"""
     
@@ -80,8 +94,29 @@ class AbattoirStatsSerializer(serializers.Serializer):
     capacite_totale_chambres_froides = serializers.DecimalField(max_digits=12, decimal_places=2)
 
 
-class StabulationSerializer(serializers.ModelSerializer):
-    """Serializer pour les stabulations"""
+def bete_info_data(bete):
+    """Représentation d'une bête dans une stabulation (espece chargée par select_related)"""
+    return {
+        'id': bete.id,
+        'num_boucle': bete.num_boucle,
+        'nom': f"{bete.num_boucle} - {bete.espece.nom if bete.espece else 'N/A'}",
+        'espece': bete.espece.nom if bete.espece else None,
+        'race': None,  # Pas de champ race dans le modèle Bete
+        'poids': float(bete.poids_vif) if bete.poids_vif else None,
+        'statut': bete.statut,
+        'etat_sante': bete.etat_sante,
+        'sexe': bete.get_sexe_display(),
+        'abattage_urgence': bete.abattage_urgence,
+        'notes': bete.notes,
+        'created_at': bete.created_at.isoformat() if bete.created_at else None,
+    }
+
+
+class StabulationListSerializer(serializers.ModelSerializer):
+    """
+    Serializer résumé pour les listes de stabulations (sans les bêtes)
+    À utiliser avec select_related('abattoir', 'created_by', 'annule_par', 'finalise_par')
+    """
     
     abattoir_nom = serializers.CharField(source='abattoir.nom', read_only=True)
     abattoir_wilaya = serializers.CharField(source='abattoir.wilaya', read_only=True)
@@ -92,7 +127,7 @@ class StabulationSerializer(serializers.ModelSerializer):
     annule_par_nom = serializers.SerializerMethodField()
     finalise_par_nom = serializers.SerializerMethodField()
     
-    # Propriétés calculées
+    # Propriétés calculées (compteurs dénormalisés, sans requête)
     nombre_betes_actuelles = serializers.ReadOnlyField()
     capacite_maximale = serializers.ReadOnlyField()
     taux_occupation = serializers.ReadOnlyField()
@@ -101,27 +136,19 @@ class StabulationSerializer(serializers.ModelSerializer):
     est_pleine = serializers.ReadOnlyField()
     places_disponibles = serializers.ReadOnlyField()
     
-    # Informations sur les bêtes
-    betes_info = serializers.SerializerMethodField()
-    
     class Meta:
         model = Stabulation
         fields = [
             'id', 'numero_stabulation', 'abattoir', 'abattoir_nom', 'abattoir_wilaya', 'abattoir_commune',
             'type_bete', 'statut', 'date_debut', 'date_fin', 'notes',
-            'nombre_betes_actuelles', 'capacite_maximale', 'taux_occupation', 
+            'nombre_betes_actuelles', 'betes_par_espece', 'capacite_maximale', 'taux_occupation',
             'duree_stabulation_heures', 'duree_stabulation_formatee', 'est_pleine', 'places_disponibles',
-            'betes', 'betes_info', 'created_by', 'created_by_nom',
+            'created_by', 'created_by_nom',
             'annule_par', 'annule_par_nom', 'date_annulation', 'raison_annulation',
             'finalise_par', 'finalise_par_nom', 'date_finalisation',
             'created_at', 'updated_at'
         ]
-        read_only_fields = [
-            'id', 'created_at', 'updated_at', 'nombre_betes_actuelles', 
-            'capacite_maximale', 'taux_occupation', 'duree_stabulation_heures', 'duree_stabulation_formatee',
-            'est_pleine', 'places_disponibles', 'betes_info', 'created_by_nom',
-            'annule_par_nom', 'finalise_par_nom'
-        ]
+        read_only_fields = fields
     
     def get_created_by_nom(self, obj):
         """Retourne le nom complet du créateur"""
@@ -140,27 +167,39 @@ class StabulationSerializer(serializers.ModelSerializer):
         if obj.finalise_par:
             return obj.finalise_par.get_full_name() or obj.finalise_par.username
         return None
+
+
+class StabulationSerializer(StabulationListSerializer):
+    """
+    Serializer détaillé pour les stabulations (avec les bêtes)
+    À utiliser avec prefetch_related(Prefetch('betes', queryset=Bete.objects.select_related('espece')))
+    """
+    
+    # Informations sur les bêtes
+    betes_info = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Stabulation
+        fields = [
+            'id', 'numero_stabulation', 'abattoir', 'abattoir_nom', 'abattoir_wilaya', 'abattoir_commune',
+            'type_bete', 'statut', 'date_debut', 'date_fin', 'notes',
+            'nombre_betes_actuelles', 'capacite_maximale', 'taux_occupation', 
+            'duree_stabulation_heures', 'duree_stabulation_formatee', 'est_pleine', 'places_disponibles',
+            'betes', 'betes_info', 'created_by', 'created_by_nom',
+            'annule_par', 'annule_par_nom', 'date_annulation', 'raison_annulation',
+            'finalise_par', 'finalise_par_nom', 'date_finalisation',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'nombre_betes_actuelles', 
+            'capacite_maximale', 'taux_occupation', 'duree_stabulation_heures', 'duree_stabulation_formatee',
+            'est_pleine', 'places_disponibles', 'betes_info', 'created_by_nom',
+            'annule_par_nom', 'finalise_par_nom'
+        ]
     
     def get_betes_info(self, obj):
         """Retourne des informations sur les bêtes en stabulation"""
-        betes = obj.betes.all()
-        return [
-            {
-                'id': bete.id,
-                'num_boucle': bete.num_boucle,
-                'nom': f"{bete.num_boucle} - {bete.espece.nom if bete.espece else 'N/A'}",
-                'espece': bete.espece.nom if bete.espece else None,
-                'race': None,  # Pas de champ race dans le modèle Bete
-                'poids': float(bete.poids_vif) if bete.poids_vif else None,
-                'statut': bete.statut,
-                'etat_sante': bete.etat_sante,
-                'sexe': bete.get_sexe_display(),
-                'abattage_urgence': bete.abattage_urgence,
-                'notes': bete.notes,
-                'created_at': bete.created_at.isoformat() if bete.created_at else None,
-            }
-            for bete in betes
-        ]
+        return [bete_info_data(bete) for bete in obj.betes.all()]
     
     def validate_numero_stabulation(self, value):
         """Valide l'unicité du numéro de stabulation"""
@@ -202,13 +241,18 @@ class StabulationCreateSerializer(serializers.ModelSerializer):
     
     automatic_count = serializers.IntegerField(required=False, min_value=1, allow_null=True, write_only=True)
     type_bete = serializers.CharField()  # Override pour gérer la conversion
+    # Identifiants bruts : validés ensemble en une requête (et non un get() par bête)
+    betes = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, write_only=True)
+    # Accepter les bêtes valides et signaler les autres dans 'rejets' au lieu de tout refuser
+    allow_partial = serializers.BooleanField(required=False, default=False, write_only=True)
     
     class Meta:
         model = Stabulation
         fields = [
-            'abattoir', 'type_bete', 'date_debut', 
-            'notes', 'betes', 'automatic_count'
+            'id', 'numero_stabulation', 'abattoir', 'type_bete', 'date_debut',
+            'notes', 'betes', 'automatic_count', 'allow_partial'
         ]
+        read_only_fields = ['id', 'numero_stabulation']
     
     def validate_date_debut(self, value):
         """Valide que la date de début n'est pas dans le passé"""
@@ -256,23 +300,6 @@ class StabulationCreateSerializer(serializers.ModelSerializer):
         
         return value
     
-    def validate_betes(self, value):
-        """Valide que les bêtes sont du bon type"""
-        if not value:
-            return value
-        
-        type_bete = self.initial_data.get('type_bete')
-        if not type_bete:
-            return value
-        
-        for bete in value:
-            if bete.espece.nom.upper() != type_bete.upper():
-                raise serializers.ValidationError(
-                    f"La bête {bete.num_boucle} n'est pas de type {type_bete}."
-                )
-        
-        return value
-    
     def validate_type_bete(self, value):
         """Normaliser le type de bête en majuscules"""
         if not value:
@@ -319,8 +346,79 @@ class StabulationCreateSerializer(serializers.ModelSerializer):
             # On ignore automatic_count si des bêtes sont sélectionnées
             data['automatic_count'] = None
         
+        if betes:
+            data['betes'], data['rejets'] = self._valider_betes(
+                betes, data['abattoir'], data['type_bete'], data.get('allow_partial', False)
+            )
+        else:
+            data['betes'] = self._selection_automatique(data['abattoir'], data['type_bete'], automatic_count)
+            data['rejets'] = []
+        
         return data
     
+    def _valider_betes(self, betes_ids, abattoir, type_bete, allow_partial):
+        """
+        Valide toutes les bêtes demandées en une requête
+        Retourne (ids acceptés, rejets [{'id', 'num_boucle', 'raison'}])
+        """
+        from bete.models import Bete
+        from bete.status_manager import BeteStatusManager
+        
+        betes = {
+            row[0]: row[1:]
+            for row in Bete.objects.filter(id__in=set(betes_ids)).values_list(
+                'id', 'num_boucle', 'statut', 'abattoir_id', 'espece__nom'
+            )
+        }
+        acceptes, rejets, vus = [], [], set()
+        for bete_id in betes_ids:
+            num_boucle, statut, abattoir_id, espece = betes.get(bete_id, (None, None, None, None))
+            if bete_id in vus:
+                raison = "Bête sélectionnée plusieurs fois"
+            elif num_boucle is None:
+                raison = "Bête introuvable"
+            elif abattoir_id != abattoir.id:
+                raison = f"La bête {num_boucle} n'appartient pas à l'abattoir {abattoir.nom}."
+            elif espece.upper() != type_bete.upper():
+                raison = f"La bête {num_boucle} n'est pas de type {type_bete}."
+            elif not BeteStatusManager.can_transition(statut, 'EN_STABULATION'):
+                raison = f"La bête {num_boucle} n'est pas disponible (statut {statut})."
+            else:
+                acceptes.append(bete_id)
+                vus.add(bete_id)
+                continue
+            rejet = {'id': bete_id, 'raison': raison}
+            if num_boucle is not None:
+                rejet['num_boucle'] = num_boucle
+            rejets.append(rejet)
+        
+        if rejets and not allow_partial:
+            raise serializers.ValidationError({
+                'betes': [rejet['raison'] for rejet in rejets],
+                'rejets': rejets,
+            })
+        if not acceptes:
+            raise serializers.ValidationError({
+                'betes': ["Aucune des bêtes sélectionnées ne peut être mise en stabulation."],
+                'rejets': rejets,
+            })
+        return acceptes, rejets
+    
+    def _selection_automatique(self, abattoir, type_bete, automatic_count):
+        """Identifiants de bêtes VIVANT de l'abattoir et de l'espèce, tirées au hasard"""
+        from bete.models import Bete
+        
+        betes_ids = list(Bete.objects.filter(
+            abattoir=abattoir,
+            espece__nom__iexact=type_bete,
+            statut='VIVANT'
+        ).order_by('?').values_list('id', flat=True)[:automatic_count])
+        if not betes_ids:
+            raise serializers.ValidationError(
+                f"Aucune bête de type {type_bete} disponible dans cet abattoir."
+            )
+        return betes_ids
+    
     def validate_abattoir(self, value):
         """Validation des permissions pour l'abattoir"""
         user = self.context['request'].user
@@ -339,17 +437,25 @@ class StabulationCreateSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        """Override create pour gérer automatic_count"""
-        # Extraire automatic_count des données validées
-        automatic_count = validated_data.pop('automatic_count', None)
+        """Crée la stabulation seule : les bêtes sont ajoutées en masse par la vue"""
+        validated_data.pop('automatic_count', None)
+        validated_data.pop('allow_partial', None)
+        betes_ids = validated_data.pop('betes')
+        rejets = validated_data.pop('rejets')
         
-        # Créer la stabulation sans automatic_count
         stabulation = super().create(validated_data)
         
-        # Stocker automatic_count dans l'instance pour l'utiliser dans la vue
-        stabulation._automatic_count = automatic_count
+        # Stocker la sélection dans l'instance pour l'utiliser dans la vue
+        stabulation._betes_ids = betes_ids
+        stabulation._rejets = rejets
         
         return stabulation
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['betes'] = instance._betes_ids
+        data['rejets'] = instance._rejets
+        return data
 
 
 class StabulationUpdateSerializer(serializers.ModelSerializer):
@@ -428,3 +534,46 @@ class StabulationStatsSerializer(serializers.Serializer):
     stabulations_par_type = serializers.DictField()
     taux_occupation_moyen = serializers.FloatField()
     total_betes_en_stabulation = serializers.IntegerField()
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Serializer pour le suivi des rapports générés en arrière-plan"""
+    
+    type_rapport_display = serializers.CharField(source='get_type_rapport_display', read_only=True)
+    statut_display = serializers.CharField(source='get_statut_display', read_only=True)
+    url_telechargement = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'type_rapport', 'type_rapport_display', 'format_fichier', 'parametres',
+            'statut', 'statut_display', 'nombre_lignes', 'erreur',
+            'created_at', 'date_debut', 'date_fin', 'expire_le', 'url_telechargement'
+        ]
+        read_only_fields = fields
+    
+    def get_url_telechargement(self, obj):
+        if obj.statut != 'TERMINE' or obj.est_expire:
+            return None
+        url = reverse('abattoir:report-job-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """Serializer pour la soumission d'un rapport (format par défaut : le premier accepté)"""
+    
+    type_rapport = serializers.ChoiceField(choices=ReportJob.TYPE_CHOICES)
+    format_fichier = serializers.ChoiceField(choices=ReportJob.FORMAT_CHOICES, required=False)
+    parametres = serializers.DictField(required=False, default=dict)
+    
+    def validate(self, data):
+        from .reports import formats_acceptes
+        
+        formats = formats_acceptes(data['type_rapport'])
+        data.setdefault('format_fichier', formats[0])
+        if data['format_fichier'] not in formats:
+            raise serializers.ValidationError({
+                'format_fichier': f"Formats disponibles pour ce rapport: {', '.join(formats)}"
+            })
+        return data
@@ -1,15 +1,48 @@
-# SIGNAUX DÉSACTIVÉS TEMPORAIREMENT POUR ÉVITER LES CONFLITS
+# SIGNAUX DE STATUT DÉSACTIVÉS POUR ÉVITER LES CONFLITS
 # Les statuts des bêtes sont maintenant gérés UNIQUEMENT par le gestionnaire unifié
 # dans les méthodes terminer_stabulation() et annuler_stabulation() du modèle
 
-# from django.db.models.signals import post_save, m2m_changed
-# from django.dispatch import receiver
-# from .models import Stabulation
-# from bete.status_manager import BeteStatusManager
-# import logging
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
 
-# logger = logging.getLogger(__name__)
+from bete.models import Bete
 
-# NOTE: Les signaux ont été désactivés car ils causaient des conflits
+from .models import Stabulation
+
+
+@receiver(m2m_changed, sender=Stabulation.betes.through)
+def update_nombre_betes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Maintient Stabulation.nombre_betes et betes_par_espece à chaque ajout/retrait de bêtes"""
+    if not reverse:
+        # stabulation.betes.add/remove/clear/set
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            counts = Stabulation.rafraichir_nombre_betes([instance.pk])
+            instance.nombre_betes, instance.betes_par_espece = counts[instance.pk]
+        return
+
+    # bete.stabulations.add/remove/clear : stabulations concernées
+    if action == 'pre_clear':
+        instance._stabulations_cleared = list(instance.stabulations.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        Stabulation.rafraichir_nombre_betes(pk_set)
+    elif action == 'post_clear':
+        Stabulation.rafraichir_nombre_betes(getattr(instance, '_stabulations_cleared', []))
+
+
+
+@receiver(pre_delete, sender=Bete)
+def remember_bete_stabulations(sender, instance, **kwargs):
+    """Stabulations de la bête supprimée (ses relations disparaissent sans m2m_changed)"""
+    instance._stabulations_cleared = list(instance.stabulations.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Bete)
+def update_nombre_betes_on_delete(sender, instance, **kwargs):
+    """Recompter les stabulations qui contenaient la bête supprimée"""
+    if getattr(instance, '_stabulations_cleared', None):
+        Stabulation.rafraichir_nombre_betes(instance._stabulations_cleared)
+
+
+# NOTE: Les signaux de statut ont été désactivés car ils causaient des conflits
 # Les statuts des bêtes sont maintenant gérés directement dans les méthodes du modèle
 # pour garantir la cohérence et éviter les changements de statut inattendus
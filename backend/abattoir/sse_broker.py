@@ -0,0 +1,430 @@
+"""
+Brokers de diffusion pour les Server-Sent Events (SSE) des stabulations
+
+Chaque connexion SSE s'abonne à un canal (l'identifiant de l'abattoir ou 'global')
+et reçoit les événements poussés dans sa propre file, sans interroger le cache.
+
+- InMemoryBroker : diffusion locale au processus (tests, développement mono-worker)
+- RedisBroker    : diffusion Redis pub/sub entre tous les workers gunicorn
+
+Chaque événement publié reçoit un identifiant monotone par canal et est conservé
+dans un journal borné (nombre d'événements et durée) : un client qui se reconnecte
+avec Last-Event-ID reçoit uniquement les événements manqués.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Canal des superusers : reçoit les événements de tous les abattoirs
+GLOBAL_CHANNEL = 'global'
+
+
+def format_sse_event(event_type, data, timestamp=None, event_id=None):
+    """Construit une trame SSE au format standard"""
+    event_data = {
+        'type': event_type,
+        'data': data,
+        'timestamp': timestamp or time.time()
+    }
+    # L'identifiant est renvoyé par le navigateur dans Last-Event-ID à la reconnexion
+    event_id_line = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{event_id_line}event: {event_type}\ndata: {json.dumps(event_data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def encode_sse_message(message):
+    """Trame SSE encodée d'un message du broker (construite une seule fois par événement)"""
+    return format_sse_event(message['type'], message.get('data'), message.get('timestamp'), message.get('id')).encode('utf-8')
+
+
+class SSESubscription:
+    """Abonnement d'une connexion SSE à un canal"""
+
+    def __init__(self, channel, maxsize=1000):
+        self.channel = str(channel)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        """Pousser un message dans la file de la connexion (non bloquant)"""
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Client trop lent : on perd le message plutôt que de bloquer l'émetteur
+            logger.warning(f"SSE subscription queue full on channel {self.channel}, message dropped")
+
+    def get(self, timeout=None):
+        """Attendre le prochain message (None si le délai expire)"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSSESubscription:
+    """Abonnement d'une connexion SSE asynchrone (ASGI) à un canal"""
+
+    def __init__(self, channel, loop=None, maxsize=1000):
+        self.channel = str(channel)
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        """Pousser un message depuis n'importe quel thread vers la boucle de la connexion"""
+        try:
+            self.loop.call_soon_threadsafe(self._put_nowait, message)
+        except RuntimeError:
+            # Boucle fermée : la connexion est terminée
+            pass
+
+    def _put_nowait(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(f"SSE subscription queue full on channel {self.channel}, message dropped")
+
+    async def get(self, timeout=None):
+        """Attendre le prochain message (None si le délai expire)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InMemoryEventLog:
+    """Journal d'événements par canal (ring buffer), local au processus"""
+
+    def __init__(self, retention_count=500, retention_seconds=3600):
+        self.retention_count = retention_count
+        self.retention_seconds = retention_seconds
+        self._events = {}
+        self._sequences = {}
+        self._lock = threading.Lock()
+
+    def append(self, channel, message):
+        """Ajouter un message au journal et retourner le message numéroté"""
+        channel = str(channel)
+        with self._lock:
+            event_id = self._sequences.get(channel, 0) + 1
+            self._sequences[channel] = event_id
+            message = dict(message, id=event_id)
+            events = self._events.get(channel)
+            if events is None:
+                events = self._events[channel] = deque(maxlen=self.retention_count)
+            events.append((time.time(), message))
+            self._expire(events)
+        return message
+
+    def since(self, channel, last_event_id):
+        """Messages du canal postérieurs à last_event_id, dans l'ordre"""
+        with self._lock:
+            events = self._events.get(str(channel))
+            if not events:
+                return []
+            self._expire(events)
+            return [message for _, message in events if message['id'] > last_event_id]
+
+    def last_id(self, channel):
+        """Dernier identifiant attribué sur le canal (0 si aucun)"""
+        with self._lock:
+            return self._sequences.get(str(channel), 0)
+
+    def _expire(self, events):
+        limit = time.time() - self.retention_seconds
+        while events and events[0][0] < limit:
+            events.popleft()
+
+
+class RedisEventLog:
+    """
+    Journal d'événements par canal partagé entre workers
+
+    Identifiant attribué par INCR, événements dans un sorted set (score = identifiant)
+    tronqué aux retention_count derniers : aucune lecture-modification-écriture.
+    """
+
+    def __init__(self, client, prefix='sse:stabulations:', retention_count=500, retention_seconds=3600):
+        self.client = client
+        self.prefix = prefix
+        self.retention_count = retention_count
+        self.retention_seconds = retention_seconds
+
+    def append(self, channel, message):
+        event_id = self.client.incr(f"{self.prefix}seq:{channel}")
+        message = dict(message, id=event_id)
+        log_key = f"{self.prefix}log:{channel}"
+        entry = json.dumps({'stored_at': time.time(), 'message': message}, cls=DjangoJSONEncoder)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(log_key, {entry: event_id})
+            pipe.zremrangebyrank(log_key, 0, -self.retention_count - 1)
+            pipe.expire(log_key, self.retention_seconds)
+            pipe.execute()
+        return message
+
+    def since(self, channel, last_event_id):
+        limit = time.time() - self.retention_seconds
+        entries = self.client.zrangebyscore(f"{self.prefix}log:{channel}", f"({last_event_id}", '+inf')
+        entries = [json.loads(entry) for entry in entries]
+        return [entry['message'] for entry in entries if entry['stored_at'] >= limit]
+
+    def last_id(self, channel):
+        return int(self.client.get(f"{self.prefix}seq:{channel}") or 0)
+
+
+class BaseSSEBroker:
+    """Registre local des abonnements, commun à tous les brokers"""
+
+    subscription_class = SSESubscription
+
+    def __init__(self, retention_count=500, retention_seconds=3600, **options):
+        self.options = options
+        self.retention_count = retention_count
+        self.retention_seconds = retention_seconds
+        self._event_log = None
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def event_log(self):
+        if self._event_log is None:
+            self._event_log = self.create_event_log()
+        return self._event_log
+
+    def create_event_log(self):
+        """Journal des événements rejouables"""
+        return InMemoryEventLog(self.retention_count, self.retention_seconds)
+
+    def subscribe(self, channel, subscription=None):
+        """Abonner une connexion à un canal"""
+        if subscription is None:
+            subscription = self.subscription_class(channel)
+        with self._lock:
+            self._subscribers.setdefault(subscription.channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Désabonner une connexion"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        """Journaliser puis publier un message sur un canal"""
+        if message is not None:
+            message = self.event_log.append(channel, message)
+        return self._publish(channel, message)
+
+    def _publish(self, channel, message):
+        raise NotImplementedError
+
+    def replay(self, channel, last_event_id):
+        """Messages du canal postérieurs à last_event_id (reprise après reconnexion)"""
+        return self.event_log.since(channel, last_event_id)
+
+    def subscriber_count(self, channel=None):
+        """Nombre d'abonnements locaux (pour un canal ou au total)"""
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(str(channel), ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def close(self):
+        """Libérer les ressources du broker"""
+        with self._lock:
+            self._subscribers.clear()
+
+    def _dispatch(self, channel, message):
+        """Distribuer un message aux abonnements locaux d'un canal"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(channel), ()))
+        if message is not None and subscribers:
+            # Trame encodée une fois, partagée par tous les abonnés (envoi hors verrou)
+            message = dict(message, frame=encode_sse_message(message))
+        for subscription in subscribers:
+            subscription.put(message)
+        return len(subscribers)
+
+
+class InMemoryBroker(BaseSSEBroker):
+    """Broker local au processus"""
+
+    def _publish(self, channel, message):
+        return self._dispatch(channel, message)
+
+
+class RedisBroker(BaseSSEBroker):
+    """
+    Broker Redis pub/sub
+
+    Un seul thread d'écoute par processus s'abonne aux canaux 'sse:stabulations:*'
+    et redistribue les messages aux connexions locales.
+    subscribe() attend la confirmation du psubscribe (subscribe_timeout) : un événement
+    publié juste après l'abonnement n'est pas perdu. Après une reconnexion, les événements
+    publiés pendant la coupure sont rejoués depuis le journal pour les canaux abonnés.
+    Une URL 'fakeredis://' utilise fakeredis (si installé) comme substitut local.
+    """
+
+    def __init__(self, url=None, client=None, prefix='sse:stabulations:', reconnect_delay=1.0,
+                 subscribe_timeout=5.0, **options):
+        super().__init__(**options)
+        self.url = url or 'redis://localhost:6379/0'
+        self.prefix = prefix
+        self.reconnect_delay = reconnect_delay
+        self.subscribe_timeout = subscribe_timeout
+        self._client = client
+        self._listener = None
+        self._pubsub = None
+        self._stopped = threading.Event()
+        # Posé à la confirmation du psubscribe, retiré à la perte de la connexion
+        self._ready = threading.Event()
+        # Dernier identifiant distribué par canal, point de reprise après une reconnexion
+        self._last_ids = {}
+        # Identifiants déjà rejoués, ignorés s'ils arrivent ensuite par pub/sub
+        self._replayed_ids = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            if self.url.startswith('fakeredis://'):
+                import fakeredis
+                self._client = fakeredis.FakeStrictRedis()
+            else:
+                import redis
+                self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def subscribe(self, channel, subscription=None):
+        subscription = super().subscribe(channel, subscription)
+        self._ensure_listener()
+        if not self._ready.wait(self.subscribe_timeout):
+            logger.warning(f"SSE Redis psubscribe not confirmed after {self.subscribe_timeout}s")
+        with self._lock:
+            known = subscription.channel in self._last_ids
+        if not known:
+            last_id = self.event_log.last_id(subscription.channel)
+            with self._lock:
+                self._last_ids[subscription.channel] = max(self._last_ids.get(subscription.channel, 0), last_id)
+        return subscription
+
+    def create_event_log(self):
+        return RedisEventLog(self.client, self.prefix, self.retention_count, self.retention_seconds)
+
+    def _publish(self, channel, message):
+        return self.client.publish(f"{self.prefix}{channel}", json.dumps(message, cls=DjangoJSONEncoder))
+
+    def close(self):
+        self._stopped.set()
+        if self._pubsub is not None:
+            try:
+                self._pubsub.close()
+            except Exception:
+                pass
+        super().close()
+
+    def _ensure_listener(self):
+        """Démarrer le thread d'écoute au premier abonnement"""
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._stopped.clear()
+            self._listener = threading.Thread(target=self._listen, name='sse-redis-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """Boucle d'écoute Redis avec reconnexion automatique"""
+        reconnecting = False
+        while not self._stopped.is_set():
+            try:
+                self._pubsub = self.client.pubsub()
+                self._pubsub.psubscribe(f"{self.prefix}*")
+                for raw in self._pubsub.listen():
+                    if self._stopped.is_set():
+                        break
+                    if raw.get('type') == 'psubscribe':
+                        if reconnecting:
+                            self._replay_missed()
+                        reconnecting = True
+                        self._ready.set()
+                        continue
+                    if raw.get('type') != 'pmessage':
+                        continue
+                    channel = raw['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode('utf-8')
+                    self._dispatch(channel[len(self.prefix):], json.loads(raw['data']))
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                logger.error(f"SSE Redis listener error: {e}")
+                time.sleep(self.reconnect_delay)
+            finally:
+                self._ready.clear()
+
+    def _replay_missed(self):
+        """Distribuer les événements publiés pendant la coupure aux canaux abonnés localement"""
+        with self._lock:
+            positions = {channel: self._last_ids.get(channel, 0) for channel in self._subscribers}
+            self._replayed_ids.clear()
+        for channel, last_id in positions.items():
+            try:
+                messages = self.event_log.since(channel, last_id)
+            except Exception as e:
+                logger.error(f"SSE Redis replay error on channel {channel}: {e}")
+                continue
+            with self._lock:
+                self._replayed_ids[channel] = {message['id'] for message in messages}
+            for message in messages:
+                super()._dispatch(channel, message)
+                self._note_dispatched(channel, message)
+
+    def _dispatch(self, channel, message):
+        if message is not None and 'id' in message:
+            with self._lock:
+                replayed = self._replayed_ids.get(channel)
+                if replayed and message['id'] in replayed:
+                    replayed.discard(message['id'])
+                    return 0
+        dispatched = super()._dispatch(channel, message)
+        self._note_dispatched(channel, message)
+        return dispatched
+
+    def _note_dispatched(self, channel, message):
+        if message is not None and 'id' in message:
+            with self._lock:
+                self._last_ids[channel] = max(self._last_ids.get(channel, 0), message['id'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Retourne le broker configuré par settings.SSE_BROKER (singleton par processus)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'SSE_BROKER', {})
+                backend = import_string(config.get('BACKEND', 'abattoir.sse_broker.InMemoryBroker'))
+                _broker = backend(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def reset_broker():
+    """Fermer et oublier le broker courant (tests, changement de configuration)"""
+    global _broker
+    with _broker_lock:
+        if _broker is not None:
+            _broker.close()
+        _broker = None
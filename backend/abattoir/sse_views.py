@@ -2,100 +2,128 @@
 Server-Sent Events (SSE) pour la synchronisation temps réel des stabulations
 Architecture optimisée pour éviter la saturation serveur
 """
-import json
+import asyncio
 import time
 import threading
-from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
 from django.conf import settings
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Stabulation
-from .serializers import StabulationSerializer
+from .sse_broker import GLOBAL_CHANNEL, AsyncSSESubscription, encode_sse_message, format_sse_event, get_broker
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Store des connexions SSE actives
+# Store des connexions SSE actives (abonnements locaux à ce processus)
 SSE_CONNECTIONS = {}
 SSE_LOCK = threading.Lock()
 
+# Intervalle de ping pour maintenir la connexion ouverte
+SSE_PING_INTERVAL = 30
+
+
+# Champs d'une stabulation diffusés par défaut (le client ne fait qu'invalider ses requêtes)
+STABULATION_EVENT_FIELDS = ('id', 'numero_stabulation', 'abattoir_id', 'type_bete', 'statut')
+
+# Champs supplémentaires qu'un déclencheur peut demander via changed_fields
+STABULATION_EVENT_OPTIONAL_FIELDS = ('date_debut', 'date_fin', 'notes', 'updated_at', 'nombre_betes')
+
+
+def format_sse_message(message):
+    """Trame SSE d'un message reçu du broker (pré-encodée lors de la diffusion)"""
+    return message.get('frame') or encode_sse_message(message)
+
+
+def get_last_event_id(request):
+    """Dernier identifiant reçu par le client (en-tête Last-Event-ID ou paramètre last_event_id)"""
+    value = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def get_sse_user(request):
+    """Utilisateur de la requête SSE (session Django ou en-tête 'Token <clé>'), None sinon"""
+    if request.user.is_authenticated:
+        return request.user
+    from rest_framework.authtoken.models import Token
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth_header.startswith('Token '):
+        token = Token.objects.select_related('user').filter(key=auth_header.split(' ')[1]).first()
+        if token is not None:
+            return token.user
+    return None
+
+
 class SSEManager:
     """Gestionnaire professionnel des connexions SSE"""
     
     @staticmethod
-    def add_connection(user_id, abattoir_id, connection):
-        """Ajouter une connexion SSE"""
+    def add_connection(user_id, abattoir_id, subscription=None):
+        """Ajouter une connexion SSE et l'abonner au canal de son abattoir"""
+        subscription = get_broker().subscribe(abattoir_id, subscription)
         with SSE_LOCK:
             if user_id not in SSE_CONNECTIONS:
                 SSE_CONNECTIONS[user_id] = {}
             SSE_CONNECTIONS[user_id][abattoir_id] = {
-                'connection': connection,
+                'connection': subscription,
                 'last_ping': time.time(),
                 'user_id': user_id,
                 'abattoir_id': abattoir_id
             }
-            logger.info(f"SSE connection added for user {user_id}, abattoir {abattoir_id}")
+        logger.info(f"SSE connection added for user {user_id}, abattoir {abattoir_id}")
+        return subscription
     
     @staticmethod
-    def remove_connection(user_id, abattoir_id):
+    def remove_connection(user_id, abattoir_id, subscription=None):
         """Supprimer une connexion SSE"""
         with SSE_LOCK:
-            if user_id in SSE_CONNECTIONS and abattoir_id in SSE_CONNECTIONS[user_id]:
+            conn_data = SSE_CONNECTIONS.get(user_id, {}).get(abattoir_id)
+            if conn_data and (subscription is None or conn_data['connection'] is subscription):
+                subscription = conn_data['connection']
                 del SSE_CONNECTIONS[user_id][abattoir_id]
                 if not SSE_CONNECTIONS[user_id]:
                     del SSE_CONNECTIONS[user_id]
-                logger.info(f"SSE connection removed for user {user_id}, abattoir {abattoir_id}")
+        if subscription is not None:
+            get_broker().unsubscribe(subscription)
+            logger.info(f"SSE connection removed for user {user_id}, abattoir {abattoir_id}")
     
     @staticmethod
-    def broadcast_to_abattoir(abattoir_id, event_type, data):
-        """Diffuser un événement à tous les clients d'un abattoir"""
+    def touch_connection(user_id, abattoir_id):
+        """Mettre à jour la date du dernier ping d'une connexion"""
         with SSE_LOCK:
-            connections_to_notify = []
-            for user_id, user_connections in SSE_CONNECTIONS.items():
-                for conn_abattoir_id, conn_data in user_connections.items():
-                    if conn_abattoir_id == abattoir_id or conn_abattoir_id == 'global':
-                        connections_to_notify.append(conn_data['connection'])
-            
-            # Envoyer l'événement à toutes les connexions concernées
-            for connection in connections_to_notify:
-                try:
-                    SSEManager._send_sse_event(connection, event_type, data)
-                except Exception as e:
-                    logger.error(f"Error sending SSE event: {e}")
+            conn_data = SSE_CONNECTIONS.get(user_id, {}).get(abattoir_id)
+            if conn_data:
+                conn_data['last_ping'] = time.time()
     
     @staticmethod
-    def broadcast_to_superusers(event_type, data):
-        """Diffuser un événement aux superusers uniquement"""
-        with SSE_LOCK:
-            for user_id, user_connections in SSE_CONNECTIONS.items():
-                for conn_abattoir_id, conn_data in user_connections.items():
-                    if conn_abattoir_id == 'global':  # Superusers
-                        try:
-                            SSEManager._send_sse_event(conn_data['connection'], event_type, data)
-                        except Exception as e:
-                            logger.error(f"Error sending SSE to superuser: {e}")
+    def broadcast_to_abattoir(abattoir_id, event_type, data):
+        """Diffuser un événement à tous les clients d'un abattoir (et aux superusers)"""
+        message = {'type': event_type, 'data': data, 'timestamp': time.time()}
+        broker = get_broker()
+        try:
+            broker.publish(str(abattoir_id), message)
+            if str(abattoir_id) != GLOBAL_CHANNEL:
+                broker.publish(GLOBAL_CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Error sending SSE event: {e}")
     
     @staticmethod
-    def _send_sse_event(connection, event_type, data):
-        """Envoyer un événement SSE formaté"""
-        event_data = {
-            'type': event_type,
-            'data': data,
-            'timestamp': time.time()
-        }
-        
-        # Format SSE standard
-        sse_message = f"event: {event_type}\n"
-        sse_message += f"data: {json.dumps(event_data)}\n\n"
-        
-        connection.write(sse_message.encode('utf-8'))
-        connection.flush()
+    def broadcast_to_superusers(event_type, data):
+        """Diffuser un événement aux superusers uniquement"""
+        message = {'type': event_type, 'data': data, 'timestamp': time.time()}
+        try:
+            get_broker().publish(GLOBAL_CHANNEL, message)
+        except Exception as e:
+            logger.error(f"Error sending SSE to superuser: {e}")
     
     @staticmethod
     def cleanup_stale_connections():
@@ -109,9 +137,9 @@ class SSEManager:
                 for abattoir_id, conn_data in user_connections.items():
                     if current_time - conn_data['last_ping'] > stale_timeout:
                         to_remove.append((user_id, abattoir_id))
-            
-            for user_id, abattoir_id in to_remove:
-                SSEManager.remove_connection(user_id, abattoir_id)
+        
+        for user_id, abattoir_id in to_remove:
+            SSEManager.remove_connection(user_id, abattoir_id)
 
 def sse_stabulations_stream(request):
     """
@@ -144,83 +172,50 @@ def sse_stabulations_stream(request):
     print(f"🔌 SSE Abattoir ID: {abattoir_id}")
     print(f"🔌 SSE User is superuser: {user.is_superuser}")
     
+    last_event_id = get_last_event_id(request)
+    
     def event_stream():
-        """Générateur d'événements SSE"""
-        connection = None
+        """Générateur d'événements SSE alimenté par le broker (aucun polling)"""
+        subscription = SSEManager.add_connection(user.id, abattoir_id)
         try:
-            # Créer un objet de connexion pour stocker la référence
-            class SSEConnection:
-                def __init__(self):
-                    self.buffer = []
-                
-                def write(self, data):
-                    self.buffer.append(data)
-                
-                def flush(self):
-                    pass
-            
-            connection = SSEConnection()
-            
-            # Ajouter la connexion
-            SSEManager.add_connection(user.id, abattoir_id, connection)
-            
             # Envoyer un événement de connexion
-            yield f"event: connected\n"
-            yield f"data: {json.dumps({'message': 'Connected to stabulation events', 'abattoir_id': abattoir_id})}\n\n"
+            yield format_sse_event('connected', {
+                'message': 'Connected to stabulation events',
+                'abattoir_id': abattoir_id
+            })
             
-            # Ping périodique pour maintenir la connexion
-            last_ping = time.time()
-            ping_interval = 30  # Ping toutes les 30 secondes
+            # Reprise : événements manqués depuis Last-Event-ID (abonnement pris avant la relecture)
+            last_sent_id = last_event_id
+            if last_event_id is not None:
+                for message in get_broker().replay(abattoir_id, last_event_id):
+                    yield format_sse_message(message)
+                    last_sent_id = message['id']
             
             # Envoyer un ping initial
-            yield f"event: ping\n"
-            yield f"data: {json.dumps({'timestamp': time.time()})}\n\n"
+            yield format_sse_event('ping', {'timestamp': time.time()})
             
-            # Boucle principale avec timeout plus court
+            # Attente bloquante sur la file de la connexion : aucun CPU consommé au repos
             while True:
-                try:
-                    current_time = time.time()
-                    
+                message = subscription.get(timeout=SSE_PING_INTERVAL)
+                
+                if message is None:
                     # Ping de maintien de connexion
-                    if current_time - last_ping >= ping_interval:
-                        yield f"event: ping\n"
-                        yield f"data: {json.dumps({'timestamp': current_time})}\n\n"
-                        last_ping = current_time
-                    
-                    # Vérifier les données en cache Redis
-                    cache_key = f"stabulation_events_{abattoir_id}"
-                    cached_events = cache.get(cache_key, [])
-                    
-                    if cached_events:
-                        # Envoyer les événements en cache
-                        for event in cached_events:
-                            yield f"event: {event['type']}\n"
-                            yield f"data: {json.dumps(event['data'])}\n\n"
-                        
-                        # Nettoyer le cache après envoi
-                        cache.delete(cache_key)
-                    
-                    # Utiliser un timeout plus court pour éviter de bloquer le worker
-                    import select
-                    import sys
-                    if hasattr(select, 'select'):
-                        # Sur Unix, utiliser select pour un timeout non-bloquant
-                        ready, _, _ = select.select([], [], [], 0.1)  # 100ms timeout
-                    else:
-                        # Sur Windows, utiliser un sleep plus court
-                        time.sleep(0.1)
-                        
-                except Exception as e:
-                    logger.error(f"SSE loop error: {e}")
-                    break
+                    SSEManager.touch_connection(user.id, abattoir_id)
+                    yield format_sse_event('ping', {'timestamp': time.time()})
+                    continue
+                
+                if last_sent_id is not None and message.get('id', 0) <= last_sent_id:
+                    continue
+                
+                yield format_sse_message(message)
                 
         except GeneratorExit:
             # Connexion fermée par le client
-            SSEManager.remove_connection(user.id, abattoir_id)
             logger.info(f"SSE connection closed for user {user.id}")
         except Exception as e:
             logger.error(f"SSE stream error: {e}")
-            SSEManager.remove_connection(user.id, abattoir_id)
+        finally:
+            SSEManager.remove_connection(user.id, abattoir_id, subscription)
     
     response = StreamingHttpResponse(
         event_stream(),
@@ -231,7 +226,75 @@ def sse_stabulations_stream(request):
     response['Cache-Control'] = 'no-cache'
     response['Connection'] = 'keep-alive'
     # CORS sera géré par le middleware corsheaders
-    response['Access-Control-Allow-Headers'] = 'Cache-Control'
+    response['Access-Control-Allow-Headers'] = 'Cache-Control, Last-Event-ID'
+    
+    return response
+
+async def async_event_stream(user_id, abattoir_id, last_event_id=None, ping_interval=SSE_PING_INTERVAL):
+    """Générateur asynchrone d'événements SSE : une coroutine en attente par connexion"""
+    broker = get_broker()
+    # Abonnement et relecture du journal font des appels bloquants (Redis) : hors de la boucle,
+    # dans un thread du pool (aucun accès ORM, inutile de les sérialiser sur le thread principal)
+    subscription = await sync_to_async(SSEManager.add_connection, thread_sensitive=False)(
+        user_id, abattoir_id, AsyncSSESubscription(abattoir_id)
+    )
+    try:
+        yield format_sse_event('connected', {
+            'message': 'Connected to stabulation events',
+            'abattoir_id': abattoir_id
+        })
+        
+        # Reprise : renvoyer les événements manqués depuis Last-Event-ID.
+        # L'abonnement est pris avant la relecture, les doublons sont écartés par identifiant.
+        last_sent_id = last_event_id
+        if last_event_id is not None:
+            missed = await sync_to_async(broker.replay, thread_sensitive=False)(abattoir_id, last_event_id)
+            for message in missed:
+                yield format_sse_message(message)
+                last_sent_id = message['id']
+        
+        yield format_sse_event('ping', {'timestamp': time.time()})
+        
+        while True:
+            message = await subscription.get(timeout=ping_interval)
+            
+            if message is None:
+                SSEManager.touch_connection(user_id, abattoir_id)
+                yield format_sse_event('ping', {'timestamp': time.time()})
+                continue
+            
+            if last_sent_id is not None and message.get('id', 0) <= last_sent_id:
+                continue
+            
+            yield format_sse_message(message)
+            
+    except asyncio.CancelledError:
+        # Connexion fermée par le client (voir backend/asgi.py)
+        logger.info(f"Async SSE connection closed for user {user_id}")
+        raise
+    finally:
+        SSEManager.remove_connection(user_id, abattoir_id, subscription)
+
+
+async def sse_stabulations_stream_async(request):
+    """
+    Endpoint SSE asynchrone (ASGI) pour les événements de stabulations
+    Une connexion ouverte n'occupe aucun thread : un worker uvicorn maintient
+    des milliers de flux. Supporte la reprise via Last-Event-ID.
+    """
+    user = await sync_to_async(get_sse_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    abattoir_id = request.GET.get('abattoir_id', GLOBAL_CHANNEL)
+    
+    response = StreamingHttpResponse(
+        async_event_stream(user.id, abattoir_id, get_last_event_id(request)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    response['Access-Control-Allow-Headers'] = 'Cache-Control, Last-Event-ID'
     
     return response
 
@@ -253,15 +316,19 @@ def trigger_stabulation_event(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Récupérer les données de la stabulation
-        try:
-            stabulation = Stabulation.objects.get(id=stabulation_id)
-            stabulation_data = StabulationSerializer(stabulation).data
-        except Stabulation.DoesNotExist:
+        # Charge utile compacte : champs de base + champs modifiés demandés (delta)
+        changed_fields = request.data.get('changed_fields') or []
+        fields = list(STABULATION_EVENT_FIELDS) + [
+            field for field in STABULATION_EVENT_OPTIONAL_FIELDS if field in changed_fields
+        ]
+        stabulation_data = Stabulation.objects.filter(id=stabulation_id).values(*fields).first()
+        if stabulation_data is None:
             return Response(
                 {'error': 'Stabulation not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        if changed_fields:
+            stabulation_data['changed_fields'] = [field for field in changed_fields if field in fields]
         
         # Préparer l'événement
         event_data = {
@@ -270,24 +337,9 @@ def trigger_stabulation_event(request):
             'timestamp': time.time()
         }
         
-        # Mettre en cache Redis pour diffusion
-        cache_key = f"stabulation_events_{abattoir_id}"
-        cached_events = cache.get(cache_key, [])
-        cached_events.append({
-            'type': event_type,
-            'data': event_data
-        })
-        
-        # TTL intelligent : 60 secondes pour les événements
-        cache.set(cache_key, cached_events, 60)
-        
-        # Diffuser immédiatement aux connexions actives
+        # Diffuser aux connexions abonnées de l'abattoir (et au canal global des superusers)
         SSEManager.broadcast_to_abattoir(abattoir_id, event_type, event_data)
         
-        # Si c'est un superuser, diffuser aussi globalement
-        if request.user.is_superuser:
-            SSEManager.broadcast_to_superusers(event_type, event_data)
-        
         logger.info(f"SSE event triggered: {event_type} for stabulation {stabulation_id}")
         
         return Response({
@@ -312,6 +364,8 @@ def sse_connection_status(request):
         total_connections = sum(len(connections) for connections in SSE_CONNECTIONS.values())
         
         return Response({
+            'broker': type(get_broker()).__name__,
+            'local_subscriptions': get_broker().subscriber_count(),
             'active_users': active_connections,
             'total_connections': total_connections,
             'connections': {
@@ -0,0 +1,377 @@
+"""
+Séries temporelles des températures des chambres froides
+
+- Filtres de période sur date_mesure brute (index (chambre_froide, date_mesure)),
+  jamais sur date_mesure__date qui empêche l'usage de l'index
+- Ingestion par lots : validation en mémoire, une requête pour les chambres, bulk_create
+- Sous-échantillonnage côté base : min/moyenne/max par tranche de 5 minutes, d'une heure ou d'un jour
+- Alertes de seuil : état glissant par chambre (dernière valeur, moyenne mobile, début du
+  dépassement) conservé dans le cache, mis à jour en O(1) par mesure sans relire l'historique
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import ExtractMinute, Floor, TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Verrou de l'état d'une chambre : expiration (processus interrompu) et attente maximale, en secondes
+# Au-delà de l'attente, le lot est confié à la tâche Celery evaluate_temperature_readings qui réessaie
+VERROU_EXPIRATION = 30
+VERROU_ATTENTE = 2
+
+# pas -> (troncature, durée de la tranche, période par défaut sans date_debut)
+PAS = {
+    '5min': (TruncHour, timedelta(minutes=5), timedelta(days=1)),
+    'hour': (TruncHour, timedelta(hours=1), timedelta(days=7)),
+    'day': (TruncDay, timedelta(days=1), timedelta(days=90)),
+}
+
+
+def borne_mesure(valeur, fin=False):
+    """
+    Borne de période d'un paramètre date_debut/date_fin : (datetime, incluse)
+    Une date seule (AAAA-MM-JJ) couvre la journée entière, comme l'ancien filtre __date.
+    """
+    jour = parse_date(valeur)
+    if jour is not None:
+        if fin:
+            return timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min)), False
+        return timezone.make_aware(datetime.combine(jour, time.min)), True
+
+    moment = parse_datetime(valeur)
+    if moment is None:
+        raise ValueError(f'date invalide: {valeur}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, True
+
+
+def filtrer_periode(queryset, date_debut=None, date_fin=None):
+    """Filtre de période indexable sur date_mesure (lève ValueError si une date est invalide)"""
+    if date_debut:
+        debut, _ = borne_mesure(date_debut)
+        queryset = queryset.filter(date_mesure__gte=debut)
+    if date_fin:
+        fin, incluse = borne_mesure(date_fin, fin=True)
+        queryset = queryset.filter(**{'date_mesure__lte' if incluse else 'date_mesure__lt': fin})
+    return queryset
+
+
+def enregistrer_mesures(mesures, user):
+    """
+    Enregistrer un lot de mesures validées (chambre_froide_id, temperature, date_mesure, notes)
+    Retourne (mesures créées, erreurs) ; rien n'est créé si une chambre froide est inconnue.
+    """
+    from .models import ChambreFroide, HistoriqueChambreFroide
+
+    chambres_demandees = {mesure['chambre_froide_id'] for mesure in mesures}
+    chambres = {
+        chambre_id: (temperature_min, temperature_max)
+        for chambre_id, temperature_min, temperature_max in ChambreFroide.objects.filter(
+            id__in=chambres_demandees
+        ).values_list('id', 'temperature_min', 'temperature_max')
+    }
+    erreurs = [
+        {'index': index, 'chambre_froide_id': mesure['chambre_froide_id'], 'raison': 'Chambre froide introuvable'}
+        for index, mesure in enumerate(mesures)
+        if mesure['chambre_froide_id'] not in chambres
+    ]
+    if erreurs:
+        return [], erreurs
+
+    maintenant = timezone.now()
+    creees = HistoriqueChambreFroide.objects.bulk_create([
+        HistoriqueChambreFroide(
+            chambre_froide_id=mesure['chambre_froide_id'],
+            temperature=mesure['temperature'],
+            date_mesure=mesure.get('date_mesure') or maintenant,
+            notes=mesure.get('notes') or None,
+            mesure_par=user,
+        )
+        for mesure in mesures
+    ], batch_size=getattr(settings, 'TEMPERATURE_BULK_BATCH_SIZE', 1000))
+    surveiller_mesures(creees, chambres)
+    return creees, []
+
+
+def serie_temperatures(queryset, pas):
+    """
+    Points min/moyenne/max par chambre froide et par tranche, agrégés en une requête GROUP BY
+    Les tranches de 5 minutes sont l'heure tronquée plus floor(minute / 5) * 5.
+    """
+    troncature, duree, _ = PAS[pas]
+    champs = ['chambre_froide_id', 'heure' if pas == '5min' else 'debut']
+    queryset = queryset.order_by().annotate(**{champs[1]: troncature('date_mesure')})
+    if pas == '5min':
+        queryset = queryset.annotate(minute=Floor(ExtractMinute('date_mesure') / 5) * 5)
+        champs.append('minute')
+
+    lignes = queryset.values(*champs).annotate(
+        minimum=Min('temperature'),
+        moyenne=Avg('temperature'),
+        maximum=Max('temperature'),
+        mesures=Count('id'),
+    ).order_by(*champs)
+
+    series = {}
+    for ligne in lignes:
+        debut = ligne['heure'] + timedelta(minutes=int(ligne['minute'])) if pas == '5min' else ligne['debut']
+        series.setdefault(ligne['chambre_froide_id'], []).append({
+            'debut': debut.isoformat(),
+            'fin': (debut + duree).isoformat(),
+            'min': float(ligne['minimum']),
+            'moy': round(float(ligne['moyenne']), 2),
+            'max': float(ligne['maximum']),
+            'mesures': ligne['mesures'],
+        })
+    return [{'chambre_froide_id': chambre_id, 'points': points} for chambre_id, points in series.items()]
+
+
+def _etat_initial():
+    return {'derniere': None, 'date': None, 'moyenne': None, 'depasse_depuis': None, 'sens': None, 'en_alerte': False}
+
+
+def evaluer_mesure(etat, temperature, moment, seuil_min, seuil_max):
+    """
+    Mettre à jour l'état d'une chambre avec une mesure, retourne l'événement déclenché ou None
+
+    - ALERTE : hors seuils sans interruption depuis TEMPERATURE_ALERTE_DUREE_SECONDES
+    - RETOUR_NORMAL : revenue à TEMPERATURE_ALERTE_HYSTERESIS °C à l'intérieur des seuils ;
+      entre-temps les mesures hors seuils ne déclenchent aucune nouvelle alerte
+    Les mesures plus anciennes que la dernière évaluée (lot en retard) sont ignorées.
+    """
+    horodatage = moment.timestamp()
+    if etat['date'] is not None and horodatage < etat['date']:
+        return None
+
+    mesures_moyenne = getattr(settings, 'TEMPERATURE_ALERTE_MOYENNE_MESURES', 10)
+    etat['derniere'], etat['date'] = temperature, horodatage
+    if etat['moyenne'] is None:
+        etat['moyenne'] = temperature
+    else:
+        etat['moyenne'] += 2 / (mesures_moyenne + 1) * (temperature - etat['moyenne'])
+
+    if seuil_max is not None and temperature > seuil_max:
+        sens = 'HAUT'
+    elif seuil_min is not None and temperature < seuil_min:
+        sens = 'BAS'
+    else:
+        sens = None
+
+    def evenement(type_evenement):
+        return {
+            'type': type_evenement,
+            'sens': etat['sens'],
+            'seuil': seuil_max if etat['sens'] == 'HAUT' else seuil_min,
+            'temperature': temperature,
+            'moyenne': round(etat['moyenne'], 2),
+            'duree_depassement': int(horodatage - etat['depasse_depuis']),
+            'date_mesure': moment.isoformat(),
+        }
+
+    if etat['en_alerte']:
+        hysteresis = getattr(settings, 'TEMPERATURE_ALERTE_HYSTERESIS', 0.5)
+        if (seuil_max is None or temperature <= seuil_max - hysteresis) and (
+                seuil_min is None or temperature >= seuil_min + hysteresis):
+            resultat = evenement('RETOUR_NORMAL')
+            etat.update(en_alerte=False, depasse_depuis=None, sens=None)
+            return resultat
+        return None
+
+    if sens is None:
+        etat.update(depasse_depuis=None, sens=None)
+        return None
+    if etat['sens'] != sens:
+        etat.update(depasse_depuis=horodatage, sens=sens)
+    if horodatage - etat['depasse_depuis'] >= getattr(settings, 'TEMPERATURE_ALERTE_DUREE_SECONDES', 600):
+        etat['en_alerte'] = True
+        return evenement('ALERTE')
+    return None
+
+
+def _cle_etat(chambre_id):
+    return f'temperature:etat:{chambre_id}'
+
+
+def etat_chambre(chambre_id):
+    """État glissant d'une chambre froide (None si aucune mesure évaluée)"""
+    return caches[getattr(settings, 'TEMPERATURE_ALERTE_CACHE', 'default')].get(_cle_etat(chambre_id))
+
+
+def surveiller_mesures(mesures, seuils):
+    """
+    Évaluer des mesures enregistrées après le commit de la transaction en cours,
+    dans la requête ou par une tâche Celery selon TEMPERATURE_ALERTE_ASYNC
+    seuils : chambre_froide_id -> (temperature_min, temperature_max), None pour le seuil par défaut
+    """
+    lectures = [(mesure.chambre_froide_id, float(mesure.temperature), mesure.date_mesure) for mesure in mesures]
+    if not lectures:
+        return
+    if getattr(settings, 'TEMPERATURE_ALERTE_ASYNC', False):
+        transaction.on_commit(lambda: _differer(lectures, seuils))
+    else:
+        transaction.on_commit(lambda: _evaluer_apres_commit(lectures, seuils))
+
+
+class VerrouIndisponible(Exception):
+    """L'état d'une chambre est resté verrouillé au-delà de VERROU_ATTENTE secondes"""
+
+
+_verrous_locaux = {}
+_verrous_locaux_acces = threading.Lock()
+
+
+class _VerrouLocal:
+    """Verrou propre au processus, pour les caches non partagés (LocMemCache : état propre au processus)"""
+
+    def __init__(self, cle):
+        with _verrous_locaux_acces:
+            self._verrou = _verrous_locaux.setdefault(cle, threading.Lock())
+
+    def acquire(self):
+        return self._verrou.acquire(timeout=VERROU_ATTENTE)
+
+    def release(self):
+        self._verrou.release()
+
+
+def _verrou(cache, chambre_id):
+    """
+    Verrou de l'état d'une chambre
+    Sous Redis : redis-py Lock, SET NX PX à l'acquisition et libération par script Lua
+    (comparaison du jeton et suppression atomiques), attente bornée à VERROU_ATTENTE
+    """
+    cle = f'temperature:verrou:{chambre_id}'
+    if isinstance(cache, RedisCache):
+        cle = cache.make_key(cle)
+        return cache._cache.get_client(cle, write=True).lock(
+            cle, timeout=VERROU_EXPIRATION, blocking_timeout=VERROU_ATTENTE
+        )
+    return _VerrouLocal(cle)
+
+
+@contextmanager
+def verrous_chambres(cache, chambres):
+    """
+    Verrous exclusifs sur l'état des chambres, pris dans l'ordre des identifiants (pas d'interblocage) :
+    une seule évaluation à la fois lit et réécrit l'état d'une chambre, quel que soit le worker.
+    Lève VerrouIndisponible après VERROU_ATTENTE secondes d'attente sur une chambre.
+    """
+    tenus = []
+    try:
+        for chambre_id in sorted(chambres):
+            verrou = _verrou(cache, chambre_id)
+            if not verrou.acquire():
+                raise VerrouIndisponible(f'État de la chambre froide {chambre_id} verrouillé')
+            tenus.append(verrou)
+        yield
+    finally:
+        for verrou in reversed(tenus):
+            try:
+                verrou.release()
+            except Exception as e:
+                # Verrou expiré (évaluation plus longue que VERROU_EXPIRATION) ou Redis indisponible
+                logger.warning(f'Libération du verrou de température impossible: {e}')
+
+
+def _evaluer(lectures, seuils):
+    """
+    Lecture et écriture de l'état des chambres du lot sous verrou, puis notification des événements
+    Lève VerrouIndisponible sans rien évaluer si une chambre reste verrouillée
+    """
+    cache = caches[getattr(settings, 'TEMPERATURE_ALERTE_CACHE', 'default')]
+    defaut_min = getattr(settings, 'TEMPERATURE_ALERTE_SEUIL_MIN', None)
+    defaut_max = getattr(settings, 'TEMPERATURE_ALERTE_SEUIL_MAX', None)
+
+    chambres = {chambre_id for chambre_id, _, _ in lectures}
+    evenements = []
+    with verrous_chambres(cache, chambres):
+        etats = cache.get_many([_cle_etat(chambre_id) for chambre_id in chambres])
+        for chambre_id, temperature, moment in sorted(lectures, key=lambda lecture: lecture[2]):
+            etat = etats.setdefault(_cle_etat(chambre_id), _etat_initial())
+            seuil_min, seuil_max = seuils.get(chambre_id, (None, None))
+            evenement = evaluer_mesure(
+                etat, temperature, moment,
+                float(seuil_min) if seuil_min is not None else defaut_min,
+                float(seuil_max) if seuil_max is not None else defaut_max,
+            )
+            if evenement:
+                evenements.append((chambre_id, evenement))
+        cache.set_many(etats, timeout=None)
+
+    if evenements:
+        _publier_evenements(evenements)
+
+
+def _evaluer_apres_commit(lectures, seuils):
+    """Évaluation dans la requête ; un lot dont une chambre est verrouillée est confié à Celery"""
+    try:
+        _evaluer(lectures, seuils)
+    except VerrouIndisponible:
+        _differer(lectures, seuils)
+    except Exception:
+        # Les mesures sont déjà enregistrées : une panne du cache ne doit pas faire échouer la requête
+        chambres = sorted({chambre_id for chambre_id, _, _ in lectures})
+        logger.exception(f'Erreur lors de l\'évaluation des seuils de température (chambres {chambres})')
+
+
+def _differer(lectures, seuils):
+    """Confier le lot à la tâche Celery evaluate_temperature_readings (arguments JSON)"""
+    from backend.tasks import evaluate_temperature_readings
+
+    try:
+        evaluate_temperature_readings.delay(*lot_serialisable(lectures, seuils))
+    except Exception:
+        logger.exception('Impossible de confier l\'évaluation des seuils de température à Celery')
+
+
+def lot_serialisable(lectures, seuils):
+    """Lectures et seuils sous forme JSON (clés entières, Decimal et datetime non sérialisables)"""
+    return (
+        [[chambre_id, temperature, moment.isoformat()] for chambre_id, temperature, moment in lectures],
+        [
+            [chambre_id, *(float(seuil) if seuil is not None else None for seuil in bornes)]
+            for chambre_id, bornes in seuils.items()
+        ],
+    )
+
+
+def evaluer_lot(lectures, seuils):
+    """Évaluer un lot reçu sous la forme de lot_serialisable (tâche Celery)"""
+    _evaluer(
+        [(chambre_id, temperature, parse_datetime(moment)) for chambre_id, temperature, moment in lectures],
+        {chambre_id: (seuil_min, seuil_max) for chambre_id, seuil_min, seuil_max in seuils},
+    )
+
+
+def _publier_evenements(evenements):
+    """Notifications (NotificationService) et événement SSE temperature_alert par alerte"""
+    from notification.services import NotificationService
+    from .models import ChambreFroide
+    from .sse_views import SSEManager
+
+    chambres = ChambreFroide.objects.select_related('abattoir').in_bulk({chambre_id for chambre_id, _ in evenements})
+    for chambre_id, evenement in evenements:
+        chambre = chambres.get(chambre_id)
+        if chambre is None:
+            continue
+        try:
+            NotificationService.create_temperature_alert_notification(chambre, evenement)
+        except Exception as e:
+            logger.error(f"Erreur lors de la notification de l'alerte température {chambre_id}: {e}")
+        SSEManager.broadcast_to_abattoir(chambre.abattoir_id, 'temperature_alert', {
+            'chambre_froide_id': chambre.id,
+            'numero': chambre.numero,
+            'abattoir_id': chambre.abattoir_id,
+            **evenement,
+        })
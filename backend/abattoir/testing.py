@@ -0,0 +1,55 @@
+"""Fixtures communes aux tests des applications abattoir, bete et transfert"""
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bete.models import Bete, Espece
+from users.models import User
+
+from .models import Abattoir, Stabulation
+
+
+class AbattoirFixturesMixin:
+    """Superutilisateur authentifié sur self.client, un abattoir, une espèce et fabriques de bêtes/stabulations
+
+    À placer avant TestCase dans les bases de la classe de test.
+    """
+
+    espece_nom = 'Ovin'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.abattoir = Abattoir.objects.create(nom='Abattoir A', wilaya='Alger', commune='Alger')
+        self.espece = Espece.objects.create(nom=self.espece_nom)
+        self.numero = 0
+
+    def _agent(self, username='agent', abattoir=None):
+        """Utilisateur non superutilisateur rattaché à un abattoir"""
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='secret', abattoir=abattoir or self.abattoir
+        )
+
+    def _betes(self, nombre, **fields):
+        """Bêtes numérotées DZ00001, DZ00002… ; abattoir, espèce et sexe par défaut surchargeables"""
+        fields.setdefault('abattoir', self.abattoir)
+        fields.setdefault('espece', self.espece)
+        fields.setdefault('sexe', 'M')
+        betes = []
+        for _ in range(nombre):
+            self.numero += 1
+            betes.append(Bete.objects.create(num_boucle=f'DZ{self.numero:05d}', **fields))
+        return betes
+
+    def _stabulation(self, betes=(), **fields):
+        """Stabulation EN_COURS du type de l'espèce par défaut, dans l'abattoir de ses bêtes"""
+        fields.setdefault('abattoir', betes[0].abattoir if betes else self.abattoir)
+        fields.setdefault('type_bete', self.espece.nom.upper())
+        fields.setdefault('statut', 'EN_COURS')
+        fields.setdefault('date_debut', timezone.now())
+        if fields['statut'] == 'TERMINE':
+            fields.setdefault('date_fin', fields['date_debut'])
+        stabulation = Stabulation.objects.create(**fields)
+        stabulation.betes.add(*betes)
+        return stabulation
@@ -1,3 +1,1509 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+
+from .models import Abattoir, ChambreFroide, DocumentSequence, HistoriqueChambreFroide, ReportJob, Stabulation, TransitionConflict
+from .reports import executer, rapport_abattages, supprimer_rapports_expires
+from .sequences import SequenceAllocator, next_document_number
+from .sse_broker import GLOBAL_CHANNEL, InMemoryBroker, InMemoryEventLog, RedisBroker, get_broker
+from .sse_views import SSEManager, async_event_stream
+from .temperatures import _etat_initial, etat_chambre, evaluer_mesure
+from .testing import AbattoirFixturesMixin
+
+
+class InMemoryBrokerTest(TestCase):
+    """Diffusion des événements SSE par canal d'abattoir"""
+
+    def setUp(self):
+        self.broker = InMemoryBroker()
+
+    def test_publish_reaches_only_channel_subscribers(self):
+        abattoir_1 = self.broker.subscribe(1)
+        abattoir_2 = self.broker.subscribe(2)
+
+        self.broker.publish('1', {'type': 'STABULATION_UPDATED'})
+
+        self.assertEqual(abattoir_1.get(timeout=0)['type'], 'STABULATION_UPDATED')
+        self.assertIsNone(abattoir_2.get(timeout=0))
+
+    def test_every_subscriber_receives_the_event(self):
+        subscriptions = [self.broker.subscribe(1) for _ in range(3)]
+
+        self.assertEqual(self.broker.publish(1, {'type': 'ping'}), 3)
+        for subscription in subscriptions:
+            self.assertEqual(subscription.get(timeout=0)['type'], 'ping')
+
+    def test_event_ids_are_monotonic_per_channel_and_replayable(self):
+        for _ in range(3):
+            self.broker.publish(1, {'type': 'ping'})
+        self.broker.publish(2, {'type': 'ping'})
+
+        self.assertEqual([message['id'] for message in self.broker.replay(1, 1)], [2, 3])
+        self.assertEqual([message['id'] for message in self.broker.replay(2, 0)], [1])
+
+    def test_frame_is_encoded_once_for_all_subscribers(self):
+        subscriptions = [self.broker.subscribe(1) for _ in range(3)]
+
+        self.broker.publish(1, {'type': 'STABULATION_UPDATED', 'data': {'id': 1}})
+
+        frames = [subscription.get(timeout=0)['frame'] for subscription in subscriptions]
+        self.assertTrue(frames[0].startswith(b'id: 1\nevent: STABULATION_UPDATED\n'))
+        self.assertTrue(all(frame is frames[0] for frame in frames))
+
+    def test_unsubscribe_stops_delivery(self):
+        subscription = self.broker.subscribe(1)
+        self.broker.unsubscribe(subscription)
+
+        self.assertEqual(self.broker.publish(1, {'type': 'ping'}), 0)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+
+class InMemoryEventLogTest(TestCase):
+    """Journal rejouable des événements SSE"""
+
+    def test_retention_by_count_keeps_latest_events(self):
+        event_log = InMemoryEventLog(retention_count=3)
+        for _ in range(5):
+            event_log.append(1, {'type': 'ping'})
+
+        self.assertEqual([message['id'] for message in event_log.since(1, 0)], [3, 4, 5])
+
+    def test_retention_by_age_drops_expired_events(self):
+        event_log = InMemoryEventLog(retention_seconds=60)
+        with mock.patch('abattoir.sse_broker.time.time', return_value=1000):
+            event_log.append(1, {'type': 'ping'})
+        with mock.patch('abattoir.sse_broker.time.time', return_value=1050):
+            event_log.append(1, {'type': 'ping'})
+        with mock.patch('abattoir.sse_broker.time.time', return_value=1070):
+            self.assertEqual([message['id'] for message in event_log.since(1, 0)], [2])
+
+    def test_concurrent_appends_get_unique_ids(self):
+        event_log = InMemoryEventLog(retention_count=1000)
+        threads = [
+            threading.Thread(target=lambda: [event_log.append(1, {'type': 'ping'}) for _ in range(50)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([message['id'] for message in event_log.since(1, 0)], list(range(1, 401)))
+
+
+class _PubSubScriptee:
+    """Connexion pub/sub factice : listen() rend les messages poussés dans self.messages"""
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def psubscribe(self, pattern):
+        pass
+
+    def listen(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                return
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    def close(self):
+        self.messages.put(None)
+
+
+class RedisBrokerTest(TestCase):
+    """Abonnement confirmé et reprise après reconnexion du broker Redis"""
+
+    def setUp(self):
+        self.connexions = [_PubSubScriptee(), _PubSubScriptee()]
+        client = mock.Mock()
+        client.pubsub.side_effect = self.connexions
+        self.broker = RedisBroker(client=client, reconnect_delay=0, subscribe_timeout=5)
+        self.broker._event_log = InMemoryEventLog()
+        self.addCleanup(self.broker.close)
+
+    def _pmessage(self, message):
+        return {'type': 'pmessage', 'channel': b'sse:stabulations:1', 'data': json.dumps(message)}
+
+    def test_subscribe_waits_for_psubscribe_confirmation(self):
+        abonnements = []
+        thread = threading.Thread(target=lambda: abonnements.append(self.broker.subscribe(1)))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+
+        self.connexions[0].messages.put({'type': 'psubscribe'})
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(abonnements), 1)
+
+    def test_events_missed_during_reconnection_are_replayed_once(self):
+        event_log = self.broker.event_log
+        event_log.append(1, {'type': 'ping'})
+        self.connexions[0].messages.put({'type': 'psubscribe'})
+        subscription = self.broker.subscribe(1)
+        self.connexions[0].messages.put(self._pmessage(event_log.append(1, {'type': 'ping'})))
+        self.assertEqual(subscription.get(timeout=5)['id'], 2)
+
+        # Événements 3 et 4 publiés pendant la coupure, 4 reçu aussi après la reconnexion
+        event_log.append(1, {'type': 'ping'})
+        quatre = event_log.append(1, {'type': 'ping'})
+        self.connexions[0].messages.put(ConnectionError('connexion perdue'))
+        self.connexions[1].messages.put({'type': 'psubscribe'})
+        self.connexions[1].messages.put(self._pmessage(quatre))
+        self.connexions[1].messages.put(self._pmessage(event_log.append(1, {'type': 'ping'})))
+
+        self.assertEqual([subscription.get(timeout=5)['id'] for _ in range(3)], [3, 4, 5])
+        self.assertIsNone(subscription.get(timeout=0.1))
+
+
+class SSEManagerTest(TestCase):
+    """Abonnement des connexions SSE via le broker configuré"""
+
+    def test_broadcast_to_abattoir_also_reaches_global_channel(self):
+        abattoir_connection = SSEManager.add_connection(1, '5')
+        global_connection = SSEManager.add_connection(2, GLOBAL_CHANNEL)
+        other_connection = SSEManager.add_connection(3, '6')
+        try:
+            SSEManager.broadcast_to_abattoir(5, 'STABULATION_CREATED', {'id': 42})
+
+            self.assertEqual(abattoir_connection.get(timeout=0)['data'], {'id': 42})
+            self.assertEqual(global_connection.get(timeout=0)['type'], 'STABULATION_CREATED')
+            self.assertIsNone(other_connection.get(timeout=0))
+        finally:
+            SSEManager.remove_connection(1, '5')
+            SSEManager.remove_connection(2, GLOBAL_CHANNEL)
+            SSEManager.remove_connection(3, '6')
+
+
+class AsyncEventStreamTest(TestCase):
+    """Flux SSE asynchrone (ASGI)"""
+
+    @staticmethod
+    def _frame_data(frame):
+        if isinstance(frame, bytes):
+            frame = frame.decode('utf-8')
+        return json.loads(frame.split('data: ', 1)[1])
+
+    async def test_stream_delivers_published_events(self):
+        stream = async_event_stream(1, '7', ping_interval=5)
+        self.assertIn('event: connected', await stream.__anext__())
+        self.assertIn('event: ping', await stream.__anext__())
+
+        SSEManager.broadcast_to_abattoir(7, 'STABULATION_UPDATED', {'id': 3})
+        frame = await asyncio.wait_for(stream.__anext__(), timeout=1)
+
+        self.assertIn(b'event: STABULATION_UPDATED', frame)
+        self.assertEqual(self._frame_data(frame)['data'], {'id': 3})
+        await stream.aclose()
+        self.assertEqual(get_broker().subscriber_count('7'), 0)
+
+    async def test_stream_sends_ping_when_idle(self):
+        stream = async_event_stream(1, '8', ping_interval=0.01)
+        await stream.__anext__()
+        await stream.__anext__()
+
+        self.assertIn('event: ping', await asyncio.wait_for(stream.__anext__(), timeout=1))
+        await stream.aclose()
+
+    async def test_stream_resumes_after_last_event_id(self):
+        broker = get_broker()
+        for stabulation_id in range(3):
+            broker.publish('9', {'type': 'STABULATION_UPDATED', 'data': {'id': stabulation_id}})
+        last_event_id = broker.replay('9', 0)[0]['id']
+
+        stream = async_event_stream(1, '9', last_event_id=last_event_id, ping_interval=5)
+        await stream.__anext__()
+        replayed = [self._frame_data(await stream.__anext__())['data']['id'] for _ in range(2)]
+
+        self.assertEqual(replayed, [1, 2])
+        self.assertIn('event: ping', await stream.__anext__())
+        await stream.aclose()
+
+    async def test_subscribe_and_replay_do_not_block_the_event_loop(self):
+        broker = get_broker()
+        broker.publish('10', {'type': 'STABULATION_UPDATED', 'data': {'id': 1}})
+        threads = {}
+
+        def enregistrer(nom, appel):
+            def wrapper(*args, **kwargs):
+                threads[nom] = threading.get_ident()
+                return appel(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(broker, 'subscribe', enregistrer('subscribe', broker.subscribe)), \
+                mock.patch.object(broker, 'replay', enregistrer('replay', broker.replay)):
+            stream = async_event_stream(1, '10', last_event_id=0, ping_interval=5)
+            await stream.__anext__()
+            self.assertEqual(self._frame_data(await stream.__anext__())['data'], {'id': 1})
+            await stream.aclose()
+
+        self.assertNotIn(threading.get_ident(), threads.values())
+        self.assertEqual(set(threads), {'subscribe', 'replay'})
+
+
+class TriggerStabulationEventTest(TestCase):
+    """Charge utile des événements déclenchés par les mutations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sse', email='sse@example.com', password='secret')
+        self.abattoir = Abattoir.objects.create(nom='Abattoir SSE', wilaya='Alger', commune='Alger')
+        self.stabulation = Stabulation.objects.create(
+            abattoir=self.abattoir, type_bete='BOVIN', date_debut=timezone.now()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _trigger(self, **extra):
+        subscription = SSEManager.add_connection(self.user.id, str(self.abattoir.id))
+        try:
+            response = self.client.post('/api/abattoirs/events/trigger/', {
+                'event_type': 'STABULATION_UPDATED',
+                'stabulation_id': self.stabulation.id,
+                'abattoir_id': self.abattoir.id,
+                **extra,
+            }, format='json')
+            self.assertEqual(response.status_code, 200)
+            return subscription.get(timeout=0)['data']['stabulation']
+        finally:
+            SSEManager.remove_connection(self.user.id, str(self.abattoir.id))
+
+    def test_event_carries_compact_summary_without_betes(self):
+        stabulation = self._trigger()
+
+        self.assertEqual(stabulation['numero_stabulation'], self.stabulation.numero_stabulation)
+        self.assertEqual(stabulation['statut'], 'EN_COURS')
+        self.assertNotIn('betes_info', stabulation)
+
+    def test_changed_fields_are_added_to_the_summary(self):
+        stabulation = self._trigger(changed_fields=['nombre_betes', 'password'])
+
+        self.assertEqual(stabulation['nombre_betes'], 0)
+        self.assertEqual(stabulation['changed_fields'], ['nombre_betes'])
+
+
+class DashboardStatisticsTest(AbattoirFixturesMixin, TestCase):
+    """Le dashboard est en lecture seule"""
+
+    def test_dashboard_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/abattoirs/dashboard-statistics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+
+
+class SlaughterDataByPeriodTest(AbattoirFixturesMixin, TestCase):
+    """Agrégation des abattages par abattoir et espèce"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        from bete.models import Espece
+
+        super().setUp()
+        self.especes = [self.espece] + [Espece.objects.create(nom=nom) for nom in ('Ovin', 'Camelin')]
+
+    def _abattoir_with_slaughter(self, nom, betes_par_espece=1):
+        abattoir = Abattoir.objects.create(nom=nom, wilaya='Alger', commune='Alger')
+        betes = [
+            bete for espece in self.especes
+            for bete in self._betes(betes_par_espece, abattoir=abattoir, espece=espece, statut='ABATTU')
+        ]
+        self._stabulation(betes, statut='TERMINE')
+        return abattoir
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/abattoirs/slaughter-data-by-period/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_query_count_is_constant_in_abattoir_count(self):
+        self._abattoir_with_slaughter('Abattoir 1')
+        _, queries_one = self._get()
+
+        for index in range(2, 5):
+            self._abattoir_with_slaughter(f'Abattoir {index}', betes_par_espece=2)
+        data, queries_many = self._get()
+
+        self.assertEqual(queries_one, queries_many)
+        self.assertEqual(len(data['abattoirs_data']), 4)
+        self.assertEqual(data['total_animals'], 3 + 3 * 6)
+        abattoir_2 = next(row for row in data['abattoirs_data'] if row['abattoir_nom'] == 'Abattoir 2')
+        self.assertEqual((abattoir_2['Camelin'], abattoir_2['Caprin']), (2, 0))
+
+    def test_daily_buckets_and_custom_range(self):
+        self._abattoir_with_slaughter('Abattoir 1')
+        today = timezone.localdate().isoformat()
+
+        data, _ = self._get(start_date=today, end_date=today, bucket='day')
+
+        self.assertEqual(data['period'], 'custom')
+        self.assertEqual([(row['date'], row['Bovin']) for row in data['series']], [(today, 1)])
+
+    def test_abattoir_user_buckets_by_finished_stabulation_only(self):
+        from datetime import timedelta
+
+        abattoir = self._abattoir_with_slaughter('Abattoir 1')
+        # Même bête dans une autre stabulation du même abattoir, annulée la veille
+        annulee = Stabulation.objects.create(
+            abattoir=abattoir, type_bete='BOVIN', statut='ANNULE',
+            date_debut=timezone.now() - timedelta(days=1), date_fin=timezone.now() - timedelta(days=1)
+        )
+        annulee.betes.add(abattoir.bete_set.first())
+        agent = User.objects.create_user(username='agent', email='agent@example.com', password='x', abattoir=abattoir)
+        self.client.force_authenticate(agent)
+        today = timezone.localdate().isoformat()
+
+        data, _ = self._get(start_date=today, end_date=today, bucket='day')
+
+        self.assertEqual(data['total_animals'], 3)
+        self.assertEqual([(row['date'], row['Bovin'], row['Ovin']) for row in data['series']], [(today, 1, 1)])
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get('/api/abattoirs/slaughter-data-by-period/', {'start_date': '2024-13-01'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class DailySlaughterRollupTest(AbattoirFixturesMixin, TestCase):
+    """Agrégat journalier alimenté à la finalisation et reconstruit par backfill"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        from bete.models import Espece
+
+        super().setUp()
+        self.bovin = self.espece
+        self.ovin = Espece.objects.create(nom='Ovin')
+
+    def _snapshot(self):
+        from .models import DailySlaughterRollup
+
+        return sorted(DailySlaughterRollup.objects.values_list(
+            'date', 'abattoir_id', 'espece_id', 'sexe', 'nombre', 'poids_vif_total', 'poids_a_chaud_total'
+        ))
+
+    def test_finalization_feeds_rollup_and_matches_backfill(self):
+        from decimal import Decimal
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import DailySlaughterRollup
+
+        premiere = self._stabulation(
+            self._betes(1, poids_vif=400, statut='EN_STABULATION')
+            + self._betes(1, poids_vif=500, statut='EN_STABULATION')
+            + self._betes(1, espece=self.ovin, sexe='F', poids_vif=40, statut='EN_STABULATION')
+        )
+        seconde = self._stabulation(self._betes(1, poids_vif=600, statut='EN_STABULATION'))
+        bete_id = premiere.betes.filter(espece=self.bovin).first().id
+
+        response = self.client.post(
+            f'/api/abattoirs/stabulations/{premiere.id}/terminer/',
+            {'poidsData': [{'bete_id': bete_id, 'poids_a_chaud': '250.50'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        seconde.terminer_stabulation()
+
+        bovins = DailySlaughterRollup.objects.get(espece=self.bovin, sexe='M')
+        self.assertEqual(bovins.date, timezone.localdate())
+        self.assertEqual(bovins.nombre, 3)
+        self.assertEqual(bovins.poids_vif_total, Decimal('1500.00'))
+        self.assertEqual(bovins.poids_a_chaud_total, Decimal('250.50'))
+
+        incremental = self._snapshot()
+        DailySlaughterRollup.objects.all().delete()
+        call_command('backfill_slaughter_rollup', stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_endpoint_groups_by_month(self):
+        from datetime import date
+        from .models import DailySlaughterRollup
+
+        for jour, nombre in ((date(2024, 1, 5), 2), (date(2024, 1, 20), 3), (date(2024, 2, 1), 4)):
+            DailySlaughterRollup.objects.create(
+                date=jour, abattoir=self.abattoir, espece=self.bovin, sexe='M', nombre=nombre, poids_vif_total=100
+            )
+
+        response = self.client.get(
+            '/api/abattoirs/slaughter-rollup/',
+            {'granularity': 'month', 'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['periode'], row['nombre']) for row in response.data['results']],
+            [('2024-01-01', 5), ('2024-02-01', 4)]
+        )
+        self.assertEqual(response.data['total_animals'], 9)
+
+
+class TerminerStabulationTest(AbattoirFixturesMixin, TestCase):
+    """Finalisation d'une stabulation avec saisie des poids en lot"""
+
+    def _terminer(self, nombre):
+        stabulation = self._stabulation(self._betes(nombre, statut='EN_STABULATION'))
+        poids_data = [
+            {'bete_id': bete.id, 'poids_a_chaud': '20.50', 'num_boucle_post_abattage': f'POST-{bete.num_boucle}'}
+            for bete in stabulation.betes.all()
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/abattoirs/stabulations/{stabulation.id}/terminer/', {'poidsData': poids_data}, format='json'
+            )
+        return response, stabulation, len(queries)
+
+    def test_query_count_is_constant_in_lot_size(self):
+        from decimal import Decimal
+
+        # Premier lot : crée les lignes de compteurs et d'agrégat du jour
+        self._terminer(1)
+        _, _, queries_small = self._terminer(5)
+        # 40 bêtes : sous la limite de paramètres de SQLite qui découpe les INSERT en lots
+        response, stabulation, queries_large = self._terminer(40)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries_small, queries_large)
+        bete = stabulation.betes.first()
+        self.assertEqual((bete.statut, bete.poids_a_chaud), ('ABATTU', Decimal('20.50')))
+        self.assertEqual(bete.num_boucle_post_abattage, f'POST-{bete.num_boucle}')
+        self.assertEqual(bete.history.filter(poids_a_chaud=Decimal('20.50')).count(), 1)
+
+    def test_duplicate_post_slaughter_number_is_rejected(self):
+        from bete.models import Bete
+
+        betes = self._betes(2, statut='EN_STABULATION')
+        stabulation = self._stabulation(betes)
+        Bete.objects.filter(id=betes[0].id).update(num_boucle_post_abattage='POST-X')
+
+        response = self.client.post(
+            f'/api/abattoirs/stabulations/{stabulation.id}/terminer/',
+            {'poidsData': [{'bete_id': betes[1].id, 'poids_a_chaud': '20', 'num_boucle_post_abattage': 'POST-X'}]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        stabulation.refresh_from_db()
+        self.assertEqual(stabulation.statut, 'EN_COURS')
+
+    def test_weights_for_foreign_or_invalid_betes_are_rejected(self):
+        from bete.models import Bete
+
+        betes = self._betes(2, statut='EN_STABULATION')
+        stabulation = self._stabulation(betes[:1])
+
+        response = self.client.post(
+            f'/api/abattoirs/stabulations/{stabulation.id}/terminer/',
+            {'poidsData': [
+                {'bete_id': betes[0].id, 'poids_a_chaud': '20'},
+                {'bete_id': betes[1].id, 'poids_a_chaud': '21'},
+                {'bete_id': 'abc', 'poids_a_chaud': '22'},
+            ]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['details'], [
+            f"La bête avec l'ID {betes[1].id} n'appartient pas à cette stabulation",
+            "Identifiant de bête invalide : 'abc'",
+        ])
+        stabulation.refresh_from_db()
+        self.assertEqual(stabulation.statut, 'EN_COURS')
+        self.assertFalse(Bete.objects.filter(poids_a_chaud__isnull=False).exists())
+
+
+class StabulationListsTest(AbattoirFixturesMixin, TestCase):
+    """Listes de stabulations : nombre de requêtes indépendant du nombre de stabulations"""
+
+    def setUp(self):
+        super().setUp()
+        self.abattoirs = [self.abattoir, Abattoir.objects.create(nom='Abattoir B', wilaya='Alger', commune='Alger')]
+
+    def _add_stabulations(self, nombre, betes_par_stabulation=2):
+        for index in range(nombre):
+            self._stabulation(
+                self._betes(betes_par_stabulation, abattoir=self.abattoirs[index % 2]),
+                statut=('EN_COURS', 'TERMINE')[index % 2]
+            )
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_all_stabulations_query_count_is_constant(self):
+        self._add_stabulations(2)
+        _, queries_few = self._get('/api/abattoirs/stabulations/all/')
+        self._add_stabulations(10)
+        data, queries_many = self._get('/api/abattoirs/stabulations/all/')
+
+        self.assertEqual(queries_few, queries_many)
+        self.assertEqual(data['statistics']['total_stabulations'], 12)
+        self.assertEqual(data['statistics']['total_betes_en_stabulation'], 24)
+        self.assertEqual(data['statistics']['stabulations_par_abattoir']['Abattoir A']['en_cours'], 6)
+        self.assertEqual({stab['nombre_betes_actuelles'] for stab in data['stabulations']}, {2})
+
+    def test_stabulations_abattoir_query_count_and_pagination(self):
+        url = f'/api/abattoirs/{self.abattoirs[0].id}/stabulations/'
+        self._add_stabulations(2)
+        _, queries_few = self._get(url)
+        self._add_stabulations(10)
+        _, queries_many = self._get(url)
+        data, _ = self._get(url, page=2, page_size=4)
+
+        self.assertEqual(queries_few, queries_many)
+        self.assertEqual(len(data['stabulations']), 2)
+        self.assertEqual(data['pagination']['total_count'], 6)
+        self.assertFalse(data['pagination']['has_next'])
+        self.assertEqual(data['statistics']['total_betes_en_stabulation'], 12)
+
+    def test_invalid_pagination_is_rejected_and_requires_auth(self):
+        self._add_stabulations(2)
+
+        response = self.client.get('/api/abattoirs/stabulations/all/', {'page': 'abc', 'page_size': 'x'})
+        self.assertEqual(response.status_code, 400)
+        data, _ = self._get('/api/abattoirs/stabulations/all/', page='0', page_size='100000')
+
+        self.assertEqual((data['pagination']['page'], data['pagination']['page_size']), (1, 500))
+        self.assertEqual(len(data['stabulations']), 2)
+        anonyme = APIClient().get('/api/abattoirs/stabulations/all/')
+        self.assertEqual(anonyme.data['detail'].code, 'not_authenticated')
+
+
+class StabulationOccupationTest(AbattoirFixturesMixin, TestCase):
+    """Occupation des stabulations calculée en SQL"""
+
+    def setUp(self):
+        super().setUp()
+        Abattoir.objects.filter(pk=self.abattoir.pk).update(capacite_stabulation_bovin=10, capacite_stabulation_ovin=40)
+        self.abattoir.refresh_from_db()
+
+    def test_stats_match_model_properties_in_constant_queries(self):
+        stabulations = [
+            self._stabulation(self._betes(5), type_bete='BOVIN'),
+            self._stabulation(self._betes(10), statut='TERMINE'),
+        ]
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/api/abattoirs/stabulations/stats/')
+        stabulations += [
+            self._stabulation(self._betes(25), type_bete='AUTRE', statut='ANNULE'),
+            self._stabulation(type_bete='CAPRIN'),
+        ]
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/abattoirs/stabulations/stats/')
+
+        self.assertEqual(len(few), len(many))
+        annotated = {stab.id: round(stab.taux, 1) for stab in Stabulation.objects.with_occupation()}
+        self.assertEqual(annotated, {stab.id: stab.taux_occupation for stab in stabulations})
+        self.assertEqual(response.data['total_betes_en_stabulation'], 40)
+        self.assertEqual(response.data['stabulations_par_type'], {'BOVIN': 1, 'OVIN': 1, 'CAPRIN': 1, 'AUTRE': 1})
+        # (50 + 25 + 50 + 0) / 4
+        self.assertEqual(response.data['taux_occupation_moyen'], 31.2)
+
+    def test_occupation_history_by_day(self):
+        self._stabulation(self._betes(5), type_bete='BOVIN')
+        self._stabulation(self._betes(10), type_bete='BOVIN')
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get('/api/abattoirs/stabulations/occupation-historique/', {'period': 'week'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['series'], [{
+            'periode': today, 'stabulations': 2, 'betes': 15,
+            'taux_occupation_moyen': 75.0, 'taux_occupation_max': 100.0,
+        }])
+
+
+class StabulationNombreBetesTest(TestCase):
+    """Compteur de bêtes dénormalisé maintenu sur m2m_changed"""
+
+    def setUp(self):
+        from bete.models import Bete, Espece
+
+        self.abattoir = Abattoir.objects.create(nom='Abattoir 1', wilaya='Alger', commune='Alger')
+        ovin = Espece.objects.create(nom='Ovin')
+        caprin = Espece.objects.create(nom='Caprin')
+        self.stabulation = Stabulation.objects.create(
+            abattoir=self.abattoir, type_bete='OVIN', statut='EN_COURS', date_debut=timezone.now()
+        )
+        self.betes = [
+            Bete.objects.create(num_boucle=f'DZ{index:05d}', espece=espece, sexe='M', abattoir=self.abattoir)
+            for index, espece in enumerate([ovin, ovin, ovin, caprin])
+        ]
+
+    def _stored(self):
+        self.stabulation.refresh_from_db()
+        return self.stabulation.nombre_betes, self.stabulation.betes_par_espece
+
+    def test_counters_follow_add_remove_clear_and_delete(self):
+        self.stabulation.ajouter_betes(self.betes)
+        self.assertEqual(self._stored(), (4, {'Ovin': 3, 'Caprin': 1}))
+        self.assertTrue(self.stabulation.peut_ajouter_betes_type(0, 'OVIN'))
+
+        self.stabulation.retirer_betes(self.betes[:1])
+        self.assertEqual(self._stored(), (3, {'Ovin': 2, 'Caprin': 1}))
+
+        self.betes[1].stabulations.remove(self.stabulation)
+        self.betes[3].delete()
+        self.assertEqual(self._stored(), (1, {'Ovin': 1}))
+
+        self.stabulation.vider_stabulation()
+        self.assertEqual(self._stored(), (0, {}))
+
+    def test_stale_save_keeps_stored_counters(self):
+        stale = Stabulation.objects.get(pk=self.stabulation.pk)
+        self.stabulation.ajouter_betes(self.betes)
+
+        stale.notes = 'Notes'
+        stale.save()
+
+        self.assertEqual(self._stored(), (4, {'Ovin': 3, 'Caprin': 1}))
+        self.assertEqual(Stabulation.objects.get(pk=self.stabulation.pk).notes, 'Notes')
+
+    def test_listing_reads_counter_without_count_queries(self):
+        self.stabulation.ajouter_betes(self.betes)
+        stabulation = Stabulation.objects.get(pk=self.stabulation.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(stabulation.nombre_betes_actuelles, 4)
+        self.assertEqual(len(queries), 0)
+
+    def test_reconcile_command_fixes_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.stabulation.ajouter_betes(self.betes)
+        Stabulation.objects.filter(pk=self.stabulation.pk).update(nombre_betes=99, betes_par_espece={})
+
+        call_command('reconcile_stabulation_counts', '--dry-run', stdout=StringIO())
+        self.assertEqual(self._stored(), (99, {}))
+        call_command('reconcile_stabulation_counts', stdout=StringIO())
+        self.assertEqual(self._stored(), (4, {'Ovin': 3, 'Caprin': 1}))
+
+
+class StabulationSerializersTest(AbattoirFixturesMixin, TestCase):
+    """Liste résumée, détail préchargé et grille paginée des bêtes"""
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_list_is_summary_in_constant_queries(self):
+        self._stabulation(self._betes(2), created_by=self.user)
+        _, queries_few = self._get('/api/abattoirs/stabulations/')
+        for _ in range(4):
+            self._stabulation(self._betes(5), created_by=self.user)
+        data, queries_many = self._get('/api/abattoirs/stabulations/')
+
+        self.assertEqual(queries_few, queries_many)
+        stabulation = data['results'][0]
+        self.assertNotIn('betes_info', stabulation)
+        self.assertEqual(stabulation['nombre_betes_actuelles'], 5)
+        self.assertEqual(stabulation['betes_par_espece'], {'Ovin': 5})
+        self.assertEqual(stabulation['created_by_nom'], 'admin')
+
+    def test_detail_prefetches_betes_with_espece(self):
+        small = self._stabulation(self._betes(2), created_by=self.user)
+        large = self._stabulation(self._betes(20), created_by=self.user)
+        _, queries_small = self._get(f'/api/abattoirs/stabulations/{small.id}/')
+        data, queries_large = self._get(f'/api/abattoirs/stabulations/{large.id}/')
+
+        self.assertEqual(queries_small, queries_large)
+        self.assertEqual(len(data['betes_info']), 20)
+        self.assertEqual(data['betes_info'][0]['espece'], 'Ovin')
+
+    def test_betes_endpoint_is_paginated(self):
+        stabulation = self._stabulation(self._betes(7), created_by=self.user)
+
+        data, _ = self._get(f'/api/abattoirs/stabulations/{stabulation.id}/betes/', page=2, page_size=5)
+
+        self.assertEqual([bete['num_boucle'] for bete in data['betes']], ['DZ00006', 'DZ00007'])
+        self.assertEqual(data['pagination']['total_count'], 7)
+        self.assertFalse(data['pagination']['has_next'])
+
+
+class DocumentSequenceTest(TestCase):
+    """Numérotation des documents par compteur quotidien"""
+
+    def test_numbers_are_sequential_per_prefix(self):
+        jour = timezone.localdate().strftime('%Y%m%d')
+
+        self.assertEqual(next_document_number('STAB'), f'STAB-{jour}-00001')
+        self.assertEqual(next_document_number('STAB'), f'STAB-{jour}-00002')
+        self.assertEqual(next_document_number('TRF'), f'TRF-{jour}-00001')
+
+    def test_allocation_is_a_single_update(self):
+        jour = timezone.localdate()
+        DocumentSequence.allocate('STAB', jour)
+
+        with CaptureQueriesContext(connection) as queries:
+            valeur = DocumentSequence.allocate('STAB', jour, taille=10)
+
+        self.assertEqual(valeur, 2)
+        self.assertEqual(DocumentSequence.objects.get(prefixe='STAB', jour=jour).valeur, 11)
+        # SAVEPOINT, UPDATE, SELECT, RELEASE
+        self.assertEqual(len([q for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]), 2)
+
+    def test_stabulation_number_uses_sequence(self):
+        abattoir = Abattoir.objects.create(nom='Abattoir 1', wilaya='Alger', commune='Alger')
+        numeros = [
+            Stabulation.objects.create(
+                abattoir=abattoir, type_bete='BOVIN', date_debut=timezone.now()
+            ).numero_stabulation
+            for _ in range(3)
+        ]
+
+        self.assertEqual(len(set(numeros)), 3)
+        self.assertTrue(numeros[2].endswith('-00003'))
+
+    def test_block_allocator_reserves_ranges(self):
+        allocator = SequenceAllocator(block_size=5)
+        jour = timezone.localdate()
+
+        valeurs = []
+        with mock.patch.object(DocumentSequence, 'allocate', wraps=DocumentSequence.allocate) as allocate:
+            for _ in range(12):
+                with self.captureOnCommitCallbacks(execute=True):
+                    valeurs.append(allocator.next_value('BC', jour))
+
+        self.assertEqual(valeurs, list(range(1, 13)))
+        self.assertEqual(allocate.call_count, 3)
+
+    def test_block_is_discarded_on_rollback(self):
+        allocator = SequenceAllocator(block_size=5)
+        jour = timezone.localdate()
+
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertEqual(allocator.next_value('BC', jour), 1)
+        DocumentSequence.objects.filter(prefixe='BC').update(valeur=0)
+
+        # Plage jamais validée : nouvelle réservation au lieu de redistribuer 2..5
+        with mock.patch.object(DocumentSequence, 'allocate', wraps=DocumentSequence.allocate) as allocate:
+            allocator.next_value('BC', jour)
+        self.assertEqual(allocate.call_count, 1)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Verrouillage concurrent non représentatif sous SQLite')
+class DocumentSequenceConcurrencyTest(TransactionTestCase):
+    """1000 numéros demandés en parallèle par plusieurs threads : aucun doublon"""
+
+    def _generate(self, count, workers=8):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connections
+
+        def worker(_):
+            try:
+                return [next_document_number('STAB') for _ in range(count // workers)]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [numero for numeros in executor.map(worker, range(workers)) for numero in numeros]
+
+    def test_unique_numbers_under_concurrency(self):
+        numeros = self._generate(1000)
+
+        self.assertEqual(len(numeros), 1000)
+        self.assertEqual(len(set(numeros)), 1000)
+
+    def test_unique_numbers_with_blocks(self):
+        with mock.patch('abattoir.sequences._allocator', SequenceAllocator(block_size=50)):
+            numeros = self._generate(1000)
+
+        self.assertEqual(len(set(numeros)), 1000)
+
+
+class StabulationBulkCreateTest(AbattoirFixturesMixin, TestCase):
+    """Création d'une stabulation : bêtes validées en une requête, ajoutées en masse"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        from bete.models import Espece
+
+        super().setUp()
+        self.bovin = self.espece
+        self.ovin = Espece.objects.create(nom='Ovin')
+
+    def _post(self, **payload):
+        payload = dict({
+            'abattoir': self.abattoir.id, 'type_bete': 'BOVIN', 'date_debut': timezone.now().isoformat()
+        }, **payload)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/abattoirs/stabulations/', payload, format='json')
+        return response, len(queries)
+
+    def test_create_in_constant_queries(self):
+        from bete.models import Bete
+
+        self._post(betes=[bete.id for bete in self._betes(1)])
+        few, queries_few = self._post(betes=[bete.id for bete in self._betes(5)])
+        betes = self._betes(40)
+        many, queries_many = self._post(betes=[bete.id for bete in betes])
+
+        self.assertEqual(few.status_code, 201)
+        self.assertEqual(many.status_code, 201)
+        self.assertEqual(queries_few, queries_many)
+        stabulation = Stabulation.objects.get(id=many.data['id'])
+        self.assertEqual(stabulation.nombre_betes, 40)
+        self.assertEqual(stabulation.betes_par_espece, {'Bovin': 40})
+        self.assertEqual(Bete.objects.filter(id__in=many.data['betes'], statut='EN_STABULATION').count(), 40)
+        self.assertEqual(many.data['rejets'], [])
+
+    def test_rejections_refuse_whole_request(self):
+        valide = self._betes(1)[0]
+        ovin = self._betes(1, espece=self.ovin)[0]
+        abattue = self._betes(1, statut='ABATTU')[0]
+
+        response, _ = self._post(betes=[valide.id, ovin.id, abattue.id, valide.id, 999999])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(int(rejet['id']), rejet.get('num_boucle')) for rejet in response.data['rejets']],
+            [(ovin.id, ovin.num_boucle), (abattue.id, abattue.num_boucle), (valide.id, valide.num_boucle), (999999, None)]
+        )
+        self.assertFalse(Stabulation.objects.exists())
+        valide.refresh_from_db()
+        self.assertEqual(valide.statut, 'VIVANT')
+
+    def test_allow_partial_keeps_valid_betes(self):
+        valides = self._betes(2)
+        ovin = self._betes(1, espece=self.ovin)[0]
+
+        response, _ = self._post(betes=[valides[0].id, ovin.id, valides[1].id], allow_partial=True)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['betes'], [valides[0].id, valides[1].id])
+        self.assertEqual(response.data['rejets'][0]['raison'], f"La bête {ovin.num_boucle} n'est pas de type BOVIN.")
+        self.assertEqual(Stabulation.objects.get(id=response.data['id']).nombre_betes, 2)
+
+    def test_automatic_count(self):
+        from bete.models import Bete
+
+        self._betes(5)
+        self._betes(2, espece=self.ovin)
+
+        response, _ = self._post(automatic_count=3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['betes']), 3)
+        self.assertEqual(Bete.objects.filter(espece=self.bovin, statut='EN_STABULATION').count(), 3)
+
+    def test_automatic_count_without_available_betes(self):
+        self._betes(2, espece=self.ovin)
+
+        response, _ = self._post(automatic_count=3)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Stabulation.objects.exists())
+
+    def test_concurrent_status_change_rolls_back(self):
+        from bete.models import Bete
+
+        betes = self._betes(3)
+        original = Stabulation.ajouter_betes_en_masse
+
+        def ajouter_apres_concurrent(stabulation, betes_ids, user=None):
+            # Une autre requête a pris une des bêtes entre la validation et l'ajout
+            Bete.objects.filter(id=betes[0].id).update(statut='EN_STABULATION')
+            return original(stabulation, betes_ids, user=user)
+
+        with mock.patch.object(Stabulation, 'ajouter_betes_en_masse', ajouter_apres_concurrent):
+            response, _ = self._post(betes=[bete.id for bete in betes])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Stabulation.objects.exists())
+        self.assertFalse(Stabulation.betes.through.objects.exists())
+        self.assertFalse(Bete.objects.filter(id__in=[betes[1].id, betes[2].id], statut='EN_STABULATION').exists())
+
+
+class StabulationTransitionTest(AbattoirFixturesMixin, TestCase):
+    """Transitions de statut conditionnelles : un seul gagnant entre instances concurrentes"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self.stabulation = self._stabulation(self._betes(3, statut='EN_STABULATION'))
+
+    def _statuts(self):
+        from bete.models import Bete
+
+        return sorted(Bete.objects.values_list('statut', flat=True))
+
+    def test_stale_termination_loses(self):
+        from .models import DailySlaughterRollup
+
+        premier = Stabulation.objects.get(pk=self.stabulation.pk)
+        second = Stabulation.objects.get(pk=self.stabulation.pk)
+
+        premier.terminer_stabulation(utilisateur=self.user)
+        with self.assertRaises(TransitionConflict):
+            second.terminer_stabulation(utilisateur=self.user)
+
+        self.assertEqual(premier.version, 1)
+        self.assertEqual(Stabulation.objects.get(pk=self.stabulation.pk).version, 1)
+        self.assertEqual(self._statuts(), ['ABATTU'] * 3)
+        # L'agrégat n'est alimenté qu'une fois
+        self.assertEqual(DailySlaughterRollup.objects.get().nombre, 3)
+
+    def test_stale_termination_after_cancel_keeps_cancel(self):
+        stale = Stabulation.objects.get(pk=self.stabulation.pk)
+
+        self.stabulation.annuler_stabulation(utilisateur=self.user, raison='Annulation de test')
+        with self.assertRaises(TransitionConflict):
+            stale.terminer_stabulation()
+
+        stabulation = Stabulation.objects.get(pk=self.stabulation.pk)
+        self.assertEqual(stabulation.statut, 'ANNULE')
+        self.assertEqual(stabulation.annule_par, self.user)
+        self.assertEqual(self._statuts(), ['VIVANT'] * 3)
+
+    def test_failed_side_effect_rolls_back_transition(self):
+        from bete.models import Bete
+
+        Bete.objects.filter(num_boucle='DZ00001').update(statut='VENDU')
+
+        with self.assertRaises(ValueError):
+            self.stabulation.terminer_stabulation()
+
+        stabulation = Stabulation.objects.get(pk=self.stabulation.pk)
+        self.assertEqual((stabulation.statut, stabulation.version), ('EN_COURS', 0))
+
+    def test_api_reports_conflict(self):
+        original = Stabulation.terminer_stabulation
+
+        def terminer_apres_concurrent(stabulation, utilisateur=None):
+            # Un autre opérateur termine la stabulation pendant le traitement de la requête
+            Stabulation.objects.filter(pk=stabulation.pk).update(version=F('version') + 1)
+            return original(stabulation, utilisateur=utilisateur)
+
+        with mock.patch.object(Stabulation, 'terminer_stabulation', terminer_apres_concurrent):
+            response = self.client.post(f'/api/abattoirs/stabulations/{self.stabulation.pk}/terminer/', {}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self._statuts(), ['EN_STABULATION'] * 3)
+
+    def test_stale_save_cannot_undo_transition(self):
+        stale = Stabulation.objects.get(pk=self.stabulation.pk)
+        stale.notes = 'Note'
+        stale.save()
+        self.assertEqual(Stabulation.objects.get(pk=self.stabulation.pk).version, 1)
+
+        Stabulation.objects.get(pk=self.stabulation.pk).annuler_stabulation(
+            utilisateur=self.user, raison='Annulation de test'
+        )
+        stale.notes = 'Note périmée'
+        with self.assertRaises(TransitionConflict), transaction.atomic():
+            stale.save()
+
+        stabulation = Stabulation.objects.get(pk=self.stabulation.pk)
+        self.assertEqual((stabulation.statut, stabulation.notes, stabulation.version), ('ANNULE', 'Note', 2))
+
+    def test_patch_racing_a_transition_conflicts(self):
+        from .models import HistoriqueStabulation
+        from .serializers import StabulationUpdateSerializer
+
+        original = StabulationUpdateSerializer.validate
+
+        def valider_puis_concurrent(serializer, data):
+            data = original(serializer, data)
+            # Un autre opérateur modifie la stabulation entre la validation et l'écriture
+            Stabulation.objects.filter(pk=self.stabulation.pk).update(version=F('version') + 1)
+            return data
+
+        with mock.patch.object(StabulationUpdateSerializer, 'validate', valider_puis_concurrent):
+            response = self.client.patch(
+                f'/api/abattoirs/stabulations/{self.stabulation.pk}/', {'notes': 'Modifiée'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIsNone(Stabulation.objects.get(pk=self.stabulation.pk).notes)
+        self.assertFalse(HistoriqueStabulation.objects.exists())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Verrouillage concurrent non représentatif sous SQLite')
+class StabulationTransitionConcurrencyTest(AbattoirFixturesMixin, TransactionTestCase):
+    """Finalisations simultanées d'un même lot depuis plusieurs threads : exactement un gagnant"""
+
+    espece_nom = 'Bovin'
+
+    def test_single_winner(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connections
+        from bete.models import Bete
+        from .models import DailySlaughterRollup
+
+        stabulation = self._stabulation(self._betes(20, statut='EN_STABULATION'))
+        workers = 8
+        barriere = threading.Barrier(workers)
+
+        def terminer(_):
+            try:
+                instance = Stabulation.objects.get(pk=stabulation.pk)
+                barriere.wait()
+                instance.terminer_stabulation()
+                return 'ok'
+            except TransitionConflict:
+                return 'conflit'
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resultats = list(executor.map(terminer, range(workers)))
+
+        self.assertEqual(resultats.count('ok'), 1)
+        self.assertEqual(resultats.count('conflit'), workers - 1)
+        self.assertEqual(Stabulation.objects.get(pk=stabulation.pk).version, 1)
+        self.assertEqual(DailySlaughterRollup.objects.get().nombre, 20)
+        self.assertEqual(Bete.objects.filter(statut='ABATTU').count(), 20)
+
+
+class ReportJobTest(AbattoirFixturesMixin, TestCase):
+    """Rapports en arrière-plan : soumission, suivi, téléchargement et expiration"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media_root, REPORT_JOBS_EXECUTOR='eager')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        super().setUp()
+        self.autre = Abattoir.objects.create(nom='Abattoir B', wilaya='Oran', commune='Oran')
+        self._stabulation(self._betes(25, statut='ABATTU'), statut='TERMINE')
+        self._stabulation(self._betes(3, abattoir=self.autre, statut='ABATTU'), statut='TERMINE')
+        self._betes(2)
+
+    def _submit(self, client=None, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = (client or self.client).post('/api/abattoirs/rapports/', data, format='json')
+        return response
+
+    def test_submit_poll_and_download_slaughter_report(self):
+        response = self._submit(type_rapport='RAPPORT_ABATTAGES')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['statut'], response.data['format_fichier']), ('EN_ATTENTE', 'json'))
+
+        job = self.client.get(f"/api/abattoirs/rapports/{response.data['id']}/").data
+        self.assertEqual(job['statut'], 'TERMINE')
+        self.assertEqual(job['nombre_lignes'], 28)
+        download = self.client.get(job['url_telechargement'])
+
+        self.assertEqual(download.status_code, 200)
+        rapport = json.loads(b''.join(download.streaming_content))
+        synchrone = self.client.get('/api/abattoirs/slaughtered-animals-report/').data
+        self.assertEqual(rapport['summary'], synchrone['summary'])
+        self.assertEqual(rapport['summary']['stabulations_terminees'], 2)
+        self.assertEqual(
+            sorted((stab['betes_abattues_count'], len(stab['betes_details'])) for stab in rapport['stabulations_terminees']),
+            [(3, 3), (25, 20)]
+        )
+
+    def test_slaughter_report_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as queries_few:
+            rapport_abattages()
+        for _ in range(5):
+            self._stabulation(self._betes(4, statut='ABATTU'), statut='TERMINE')
+        with CaptureQueriesContext(connection) as queries_many:
+            rapport = rapport_abattages()
+
+        self.assertEqual(rapport['summary']['stabulations_terminees'], 7)
+        self.assertEqual(len(queries_few), len(queries_many))
+
+    def test_export_job_uses_list_filters_and_user_scope(self):
+        client = APIClient()
+        client.force_authenticate(self._agent())
+
+        self.assertEqual(self._submit(client, type_rapport='RAPPORT_ABATTAGES').status_code, 403)
+        self.assertEqual(self._submit(client, type_rapport='EXPORT_BETES', format_fichier='json').status_code, 400)
+        response = self._submit(client, type_rapport='EXPORT_BETES', parametres={'statut': ['ABATTU']})
+
+        job = ReportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.statut, job.format_fichier, job.nombre_lignes), ('TERMINE', 'csv', 25))
+        self.assertEqual(self.client.get(f'/api/abattoirs/rapports/{job.id}/').status_code, 200)
+        self.assertEqual(client.get('/api/abattoirs/rapports/').data[0]['id'], job.id)
+        autre_client = APIClient()
+        autre_client.force_authenticate(User.objects.create_user(username='autre', email='autre@example.com', password='x'))
+        self.assertEqual(autre_client.get(f'/api/abattoirs/rapports/{job.id}/telecharger/').status_code, 404)
+
+    def test_job_runs_once_then_expires(self):
+        job = self._submit(type_rapport='RAPPORT_ABATTAGES').data
+        self.assertIsNone(executer(job['id']))
+
+        ReportJob.objects.filter(pk=job['id']).update(expire_le=timezone.now())
+        chemin = ReportJob.objects.get(pk=job['id']).fichier.path
+        self.assertTrue(os.path.exists(chemin))
+        self.assertEqual(self.client.get(f"/api/abattoirs/rapports/{job['id']}/telecharger/").status_code, 410)
+
+        self.assertEqual(supprimer_rapports_expires(), 1)
+        self.assertFalse(os.path.exists(chemin))
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_failure_is_recorded(self):
+        with mock.patch('abattoir.reports.rapport_abattages', side_effect=RuntimeError('Base indisponible')):
+            job = self._submit(type_rapport='RAPPORT_ABATTAGES').data
+
+        job = ReportJob.objects.get(pk=job['id'])
+        self.assertEqual((job.statut, job.erreur), ('ECHEC', 'Base indisponible'))
+        self.assertEqual(self.client.get(f'/api/abattoirs/rapports/{job.id}/telecharger/').status_code, 409)
+
+
+class HistoriqueTemperatureTest(AbattoirFixturesMixin, TestCase):
+    """Séries temporelles des chambres froides : période indexable, ingestion par lots, sous-échantillonnage"""
+
+    def setUp(self):
+        from datetime import datetime
+
+        super().setUp()
+        self.chambre = ChambreFroide.objects.create(abattoir=self.abattoir, numero='CF1', dimensions_m3=50)
+        self.autre = ChambreFroide.objects.create(abattoir=self.abattoir, numero='CF2', dimensions_m3=50)
+        self.debut = timezone.make_aware(datetime(2026, 3, 10, 8, 0))
+
+    def _lot(self, mesures):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/abattoirs/historique-temperatures/lot/', {'mesures': mesures}, format='json')
+        return response, len(queries)
+
+    def _mesures(self, chambre, temperatures, pas_minutes=1, depart=None):
+        from datetime import timedelta
+
+        depart = depart or self.debut
+        return [
+            {
+                'chambre_froide_id': chambre.id,
+                'temperature': temperature,
+                'date_mesure': (depart + timedelta(minutes=index * pas_minutes)).isoformat(),
+            }
+            for index, temperature in enumerate(temperatures)
+        ]
+
+    def test_batch_ingestion_keeps_timestamps_in_constant_queries(self):
+        response_few, queries_few = self._lot(self._mesures(self.chambre, [2.0] * 3))
+        response_many, queries_many = self._lot(self._mesures(self.autre, [3.5] * 60))
+
+        self.assertEqual((response_few.status_code, response_many.status_code), (201, 201))
+        self.assertEqual(response_many.data['mesures_creees'], 60)
+        self.assertEqual(queries_few, queries_many)
+        mesure = HistoriqueChambreFroide.objects.filter(chambre_froide=self.autre).order_by('date_mesure').first()
+        self.assertEqual((mesure.date_mesure, mesure.mesure_par_id), (self.debut, self.user.id))
+
+    def test_batch_with_unknown_room_or_invalid_value_is_rejected(self):
+        mesures = self._mesures(self.chambre, [2.0, 2.5])
+        mesures.append({'chambre_froide_id': 999999, 'temperature': 1.0})
+
+        response, _ = self._lot(mesures)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['mesures_refusees'], [
+            {'index': 2, 'chambre_froide_id': 999999, 'raison': 'Chambre froide introuvable'}
+        ])
+        self.assertEqual(self._lot([{'chambre_froide_id': self.chambre.id, 'temperature': 'chaud'}])[0].status_code, 400)
+        self.assertFalse(HistoriqueChambreFroide.objects.exists())
+
+    def test_list_filters_on_raw_datetime(self):
+        from datetime import timedelta
+
+        self._lot(self._mesures(self.chambre, [1.0, 2.0], pas_minutes=24 * 60))
+
+        def compter(**params):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/abattoirs/historique-temperatures/', params)
+            self.assertNotIn('django_datetime_cast_date', queries[-1]['sql'])
+            return response.data['count']
+
+        self.assertEqual(compter(date_debut='2026-03-10', date_fin='2026-03-10'), 1)
+        self.assertEqual(compter(date_debut='2026-03-10', date_fin='2026-03-11'), 2)
+        self.assertEqual(compter(date_debut=(self.debut + timedelta(minutes=1)).isoformat()), 1)
+        response = self.client.get('/api/abattoirs/historique-temperatures/', {'date_debut': '10/03/2026'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_series_are_downsampled_in_database(self):
+        # 08:00 à 08:59 : une mesure par minute, 0.0 puis 6.0 en alternance
+        self._lot(self._mesures(self.chambre, [0.0, 6.0] * 30))
+        self._lot(self._mesures(self.autre, [4.0]))
+
+        def serie(pas):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/abattoirs/historique-temperatures/serie/', {
+                    'pas': pas, 'chambre_froide_id': self.chambre.id,
+                    'date_debut': '2026-03-10', 'date_fin': '2026-03-10',
+                })
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 1)
+            return response.data['series']
+
+        points = serie('5min')[0]['points']
+        self.assertEqual(len(points), 12)
+        self.assertEqual(points[1]['debut'], '2026-03-10T08:05:00+01:00')
+        self.assertEqual(
+            (points[1]['min'], points[1]['moy'], points[1]['max'], points[1]['mesures']), (0.0, 3.6, 6.0, 5)
+        )
+        self.assertEqual(
+            [(point['debut'], point['moy'], point['mesures']) for point in serie('hour')[0]['points']],
+            [('2026-03-10T08:00:00+01:00', 3.0, 60)]
+        )
+        self.assertEqual(serie('day')[0]['points'][0]['fin'], '2026-03-11T00:00:00+01:00')
+        self.assertEqual(self.client.get('/api/abattoirs/historique-temperatures/serie/', {'pas': 'week'}).status_code, 400)
+
+
+class TemperatureAlerteTest(AbattoirFixturesMixin, TestCase):
+    """Alertes de seuil évaluées en O(1) par mesure, avec durée de dépassement et hystérésis"""
+
+    def setUp(self):
+        from datetime import datetime
+        from django.core.cache import cache
+
+        cache.clear()
+        override = self.settings(
+            TEMPERATURE_ALERTE_SEUIL_MIN=-2, TEMPERATURE_ALERTE_SEUIL_MAX=4,
+            TEMPERATURE_ALERTE_DUREE_SECONDES=300, TEMPERATURE_ALERTE_HYSTERESIS=0.5,
+            # Pas de Redis pendant les tests : cache local au processus
+            TEMPERATURE_ALERTE_CACHE='default', NOTIFICATIONS_ASYNC=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        super().setUp()
+        self._agent()
+        self.chambre = ChambreFroide.objects.create(
+            abattoir=self.abattoir, numero='CF1', dimensions_m3=50, temperature_max=5
+        )
+        self.debut = timezone.make_aware(datetime(2026, 3, 10, 8, 0))
+
+    def _lot(self, temperatures, depart_minute=0):
+        from datetime import timedelta
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/abattoirs/historique-temperatures/lot/', {'mesures': [
+                {
+                    'chambre_froide_id': self.chambre.id,
+                    'temperature': temperature,
+                    'date_mesure': (self.debut + timedelta(minutes=depart_minute + index)).isoformat(),
+                }
+                for index, temperature in enumerate(temperatures)
+            ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_sustained_excursion_alerts_once_then_recovers_with_hysteresis(self):
+        from notification.models import Notification
+
+        connexion = SSEManager.add_connection(1, str(self.abattoir.id))
+        self.addCleanup(SSEManager.remove_connection, 1, str(self.abattoir.id))
+
+        # Pic bref au-dessus du seuil de la chambre (5°C) : pas d'alerte
+        self._lot([3.0, 6.0, 6.5, 3.0])
+        self.assertFalse(Notification.objects.exists())
+
+        # Dépassement continu de 5 minutes puis oscillation autour du seuil : une seule alerte
+        self._lot([6.0] * 6 + [4.8, 5.2, 4.9, 6.1], depart_minute=10)
+        alertes = Notification.objects.filter(type_notification='TEMPERATURE_ALERT')
+        self.assertEqual(alertes.count(), 2)
+        self.assertEqual(alertes.first().priority, 'URGENT')
+        self.assertEqual(alertes.first().data['duree_depassement'], 300)
+        evenement = connexion.get(timeout=0)
+        self.assertEqual((evenement['type'], evenement['data']['type'], evenement['data']['seuil']), (
+            'temperature_alert', 'ALERTE', 5.0
+        ))
+        self.assertIsNone(connexion.get(timeout=0))
+
+        # Retour sous seuil - hystérésis (4.5°C)
+        self._lot([4.5], depart_minute=20)
+        self.assertEqual(Notification.objects.filter(type_notification='TEMPERATURE_NORMAL').count(), 2)
+        self.assertEqual(connexion.get(timeout=0)['data']['type'], 'RETOUR_NORMAL')
+        self.assertFalse(etat_chambre(self.chambre.id)['en_alerte'])
+
+    def test_single_reading_is_evaluated_without_history_queries(self):
+        from datetime import timedelta
+
+        def post(minute, temperature):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post('/api/abattoirs/historique-temperatures/', {
+                        'chambre_froide': self.chambre.id, 'temperature': temperature,
+                        'date_mesure': (self.debut + timedelta(minutes=minute)).isoformat(),
+                    }, format='json')
+            return queries
+
+        post(0, 3.0)
+        queries = post(1, 3.4)
+
+        self.assertFalse(any('abattoir_historiquechambrefroide' in query['sql'] and query['sql'].startswith('SELECT')
+                             for query in queries))
+        etat = etat_chambre(self.chambre.id)
+        self.assertEqual((etat['derniere'], etat['en_alerte']), (3.4, False))
+        self.assertAlmostEqual(etat['moyenne'], 3.0 + 2 / 11 * 0.4)
+
+    def test_concurrent_evaluations_of_a_room_are_serialized(self):
+        from datetime import timedelta
+        from . import temperatures
+
+        actives, maximum = [0], [0]
+        verrou = threading.Lock()
+        evaluer = temperatures.evaluer_mesure
+
+        def evaluer_lentement(*args):
+            with verrou:
+                actives[0] += 1
+                maximum[0] = max(maximum[0], actives[0])
+            time.sleep(0.01)
+            with verrou:
+                actives[0] -= 1
+            return evaluer(*args)
+
+        lectures = [
+            [(self.chambre.id, 3.0, self.debut + timedelta(minutes=index))]
+            for index in range(8)
+        ]
+        with mock.patch.object(temperatures, 'evaluer_mesure', side_effect=evaluer_lentement):
+            threads = [
+                threading.Thread(target=temperatures._evaluer, args=(lecture, {}))
+                for lecture in lectures
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(maximum[0], 1)
+        self.assertEqual(etat_chambre(self.chambre.id)['derniere'], 3.0)
+        self.assertFalse(temperatures._verrous_locaux[f'temperature:verrou:{self.chambre.id}'].locked())
+
+    def test_locked_room_defers_batch_to_celery_instead_of_dropping_it(self):
+        from . import temperatures
+
+        lectures = [(self.chambre.id, 9.0, self.debut)]
+        seuils = {self.chambre.id: (None, self.chambre.temperature_max)}
+        cache = caches['default']
+        with temperatures.verrous_chambres(cache, [self.chambre.id]), \
+                mock.patch.object(temperatures, 'VERROU_ATTENTE', 0.01), \
+                mock.patch('backend.tasks.evaluate_temperature_readings.delay') as delay:
+            temperatures._evaluer_apres_commit(lectures, seuils)
+
+        self.assertIsNone(etat_chambre(self.chambre.id))
+        delay.assert_called_once_with([[self.chambre.id, 9.0, self.debut.isoformat()]], [[self.chambre.id, None, 5.0]])
+        temperatures.evaluer_lot(*delay.call_args.args)
+        self.assertEqual(etat_chambre(self.chambre.id)['depasse_depuis'], self.debut.timestamp())
+
+    def test_async_evaluation_runs_in_celery_task_after_commit(self):
+        from backend.tasks import evaluate_temperature_readings
+
+        app = evaluate_temperature_readings.app
+        eager = app.conf.task_always_eager
+        app.conf.update(task_always_eager=True)
+        self.addCleanup(app.conf.update, task_always_eager=eager)
+
+        with self.settings(TEMPERATURE_ALERTE_ASYNC=True):
+            self._lot([5.0, 5.0])
+
+        self.assertEqual(etat_chambre(self.chambre.id)['derniere'], 5.0)
+
+    def test_redis_cache_uses_redis_py_lock(self):
+        from django.core.cache.backends.redis import RedisCache
+        from redis.lock import Lock
+        from . import temperatures
+
+        cache = RedisCache('redis://localhost:6379/0', {'KEY_PREFIX': 'temperatures'})
+        verrou = temperatures._verrou(cache, 7)
+
+        self.assertIsInstance(verrou, Lock)
+        self.assertEqual(verrou.name, cache.make_key('temperature:verrou:7'))
+        self.assertEqual((verrou.timeout, verrou.blocking_timeout), (30, 2))
+
+    def test_late_and_low_readings(self):
+        from datetime import timedelta
+
+        etat = _etat_initial()
+        for minute in range(6):
+            evenement = evaluer_mesure(etat, -3.0, self.debut + timedelta(minutes=minute), -2, 4)
+        self.assertEqual((evenement['type'], evenement['sens'], evenement['seuil']), ('ALERTE', 'BAS', -2))
+
+        # Une mesure en retard ne modifie pas l'état ; -1.6 reste dans la bande d'hystérésis
+        self.assertIsNone(evaluer_mesure(etat, 0.0, self.debut, -2, 4))
+        self.assertIsNone(evaluer_mesure(etat, -1.6, self.debut + timedelta(minutes=7), -2, 4))
+        self.assertEqual(evaluer_mesure(etat, -1.5, self.debut + timedelta(minutes=8), -2, 4)['type'], 'RETOUR_NORMAL')
+
+
+class ChambreFroideListTest(AbattoirFixturesMixin, TestCase):
+    """Nombre de mesures et dernière température des chambres froides annotés en SQL"""
+
+    def _chambres(self, nombre, mesures=3):
+        from datetime import timedelta
+
+        chambres = []
+        for _ in range(nombre):
+            self.numero += 1
+            chambre = ChambreFroide.objects.create(abattoir=self.abattoir, numero=f'CF{self.numero}', dimensions_m3=50)
+            HistoriqueChambreFroide.objects.bulk_create([
+                HistoriqueChambreFroide(
+                    chambre_froide=chambre, temperature=index, date_mesure=timezone.now() - timedelta(minutes=10 - index)
+                )
+                for index in range(mesures)
+            ])
+            chambres.append(chambre)
+        return chambres
+
+    def _get(self, url, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_listings_query_count_is_constant_in_room_count(self):
+        vide = ChambreFroide.objects.create(abattoir=self.abattoir, numero='CF0', dimensions_m3=20)
+        self._chambres(1)
+        urls = [
+            '/api/abattoirs/chambres-froides/',
+            f'/api/abattoirs/{self.abattoir.id}/detail-with-facilities/',
+        ]
+        avant = [self._get(url)[1] for url in urls]
+        self._chambres(5, mesures=4)
+        apres = [self._get(url)[1] for url in urls]
+
+        self.assertEqual(avant, apres)
+        chambres = {
+            chambre['numero']: (chambre['nombre_mesures'], chambre['derniere_temperature'])
+            for chambre in self._get(urls[0])[0].data['results']
+        }
+        self.assertEqual((chambres['CF0'], chambres['CF1'], chambres['CF6']), ((0, None), (3, 2), (4, 3)))
+        detail = self._get(f'/api/abattoirs/chambres-froides/{vide.id}/')[0].data
+        self.assertEqual((detail['nombre_mesures'], detail['derniere_temperature']), (0, None))
+
+    def test_admin_changelists_query_count_is_constant(self):
+        from django.test import Client
+
+        client = Client()
+        client.force_login(self.user)
+        urls = ['/admin/abattoir/chambrefroide/', '/admin/abattoir/abattoir/']
+        self._chambres(1)
+        avant = [self._get(url, client)[1] for url in urls]
+        self._chambres(5)
+        apres = [self._get(url, client)[1] for url in urls]
+
+        self.assertEqual(avant, apres)
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from . import sse_views
 
 app_name = 'abattoir'
 
@@ -14,18 +15,23 @@ urlpatterns = [
     
     # Historique des températures
     path('historique-temperatures/', views.HistoriqueChambreFroideListCreateView.as_view(), name='historique-list-create'),
+    path('historique-temperatures/lot/', views.historique_temperatures_lot, name='historique-temperatures-lot'),
+    path('historique-temperatures/serie/', views.historique_temperatures_serie, name='historique-temperatures-serie'),
     path('historique-temperatures/<int:pk>/', views.HistoriqueChambreFroideDetailView.as_view(), name='historique-detail'),
     
         # Stabulations
         path('stabulations/', views.StabulationListCreateView.as_view(), name='stabulation-list-create'),
         path('stabulations/all/', views.all_stabulations, name='all-stabulations'),
+        path('stabulations/export/', views.export_stabulations, name='export-stabulations'),
         path('stabulations/<int:pk>/', views.StabulationDetailView.as_view(), name='stabulation-detail'),
         path('stabulations/stats/', views.stabulation_stats, name='stabulation-stats'),
+        path('stabulations/occupation-historique/', views.stabulation_occupation_history, name='stabulation-occupation-history'),
         path('stabulations/<int:pk>/terminer/', views.terminer_stabulation, name='terminer-stabulation'),
         path('stabulations/<int:pk>/annuler/', views.annuler_stabulation, name='annuler-stabulation'),
         path('stabulations/<int:pk>/ajouter-betes/', views.ajouter_betes_stabulation, name='ajouter-betes-stabulation'),
         path('stabulations/<int:pk>/retirer-betes/', views.retirer_betes_stabulation, name='retirer-betes-stabulation'),
         path('stabulations/<int:pk>/historique/', views.historique_stabulation, name='historique-stabulation'),
+        path('stabulations/<int:pk>/betes/', views.betes_stabulation, name='betes-stabulation'),
         path('<int:abattoir_id>/stabulations/', views.stabulations_abattoir, name='stabulations-abattoir'),
     
     # Bêtes disponibles pour stabulation
@@ -38,10 +44,23 @@ urlpatterns = [
     path('dashboard-stats/', views.dashboard_stats, name='dashboard-stats'),
     path('dashboard-statistics/', views.dashboard_statistics, name='dashboard-statistics'),
     path('slaughter-data-by-period/', views.slaughter_data_by_period, name='slaughter-data-by-period'),
+    path('slaughter-rollup/', views.slaughter_rollup, name='slaughter-rollup'),
     path('diagnostic-data-consistency/', views.diagnostic_data_consistency, name='diagnostic-data-consistency'),
     path('slaughtered-animals-report/', views.slaughtered_animals_report, name='slaughtered-animals-report'),
+    
+    # Rapports en arrière-plan
+    path('rapports/', views.report_jobs, name='report-jobs'),
+    path('rapports/<int:pk>/', views.report_job_detail, name='report-job-detail'),
+    path('rapports/<int:pk>/telecharger/', views.report_job_download, name='report-job-download'),
+    
     path('abattoirs-for-charts/', views.abattoirs_for_charts, name='abattoirs-for-charts'),
     path('abattoirs-for-management/', views.abattoirs_for_management, name='abattoirs-for-management'),
     path('<int:pk>/detail-with-facilities/', views.abattoir_detail_with_facilities, name='abattoir-detail-with-facilities'),
+    
+    # Server-Sent Events
+    path('events/stabulations/', sse_views.sse_stabulations_stream, name='sse-stabulations-stream'),
+    path('events/stabulations/async/', sse_views.sse_stabulations_stream_async, name='sse-stabulations-stream-async'),
+    path('events/trigger/', sse_views.trigger_stabulation_event, name='sse-trigger-event'),
+    path('events/status/', sse_views.sse_connection_status, name='sse-connection-status'),
 ]
 
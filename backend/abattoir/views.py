@@ -1,13 +1,16 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q, Count, Sum
+from django.db import transaction
+from django.db.models import Q, Count, F, Sum
 from django.utils import timezone
-from .models import Abattoir, ChambreFroide, HistoriqueChambreFroide, Stabulation
+from backend.exports import export_response, libelle_choix
+from .models import Abattoir, ChambreFroide, HistoriqueChambreFroide, Stabulation, TransitionConflict
+from .temperatures import PAS, borne_mesure, enregistrer_mesures, filtrer_periode, serie_temperatures, surveiller_mesures
 from .views_additional import ajouter_betes_stabulation, retirer_betes_stabulation
 from .serializers import (
     AbattoirSerializer, ChambreFroideSerializer, HistoriqueChambreFroideSerializer,
-    AbattoirStatsSerializer, StabulationSerializer, StabulationCreateSerializer,
+    AbattoirStatsSerializer, StabulationSerializer, StabulationListSerializer, StabulationCreateSerializer,
     StabulationUpdateSerializer, StabulationStatsSerializer
 )
 
@@ -126,7 +129,7 @@ class ChambreFroideListCreateView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         """Filtrage des chambres froides"""
-        queryset = ChambreFroide.objects.select_related('abattoir')
+        queryset = ChambreFroide.objects.select_related('abattoir').with_mesures()
         
         # Filtrage par abattoir
         abattoir_id = self.request.query_params.get('abattoir_id', None)
@@ -149,7 +152,7 @@ class ChambreFroideListCreateView(generics.ListCreateAPIView):
 class ChambreFroideDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Vue pour récupérer, mettre à jour et supprimer une chambre froide"""
     
-    queryset = ChambreFroide.objects.all()
+    queryset = ChambreFroide.objects.select_related('abattoir').with_mesures()
     serializer_class = ChambreFroideSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -177,19 +180,24 @@ class HistoriqueChambreFroideListCreateView(generics.ListCreateAPIView):
         if abattoir_id:
             queryset = queryset.filter(chambre_froide__abattoir_id=abattoir_id)
         
-        # Filtrage par date
-        date_debut = self.request.query_params.get('date_debut', None)
-        date_fin = self.request.query_params.get('date_fin', None)
-        if date_debut:
-            queryset = queryset.filter(date_mesure__date__gte=date_debut)
-        if date_fin:
-            queryset = queryset.filter(date_mesure__date__lte=date_fin)
+        # Filtrage par période sur date_mesure brute (index chambre_froide, date_mesure)
+        try:
+            queryset = filtrer_periode(
+                queryset,
+                self.request.query_params.get('date_debut'),
+                self.request.query_params.get('date_fin')
+            )
+        except ValueError as e:
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError({'error': f'Période invalide: {str(e)}'})
         
         return queryset.order_by('-date_mesure')
     
     def perform_create(self, serializer):
-        """Associe automatiquement l'utilisateur connecté à la mesure"""
-        serializer.save(mesure_par=self.request.user)
+        """Associe automatiquement l'utilisateur connecté à la mesure et l'évalue contre les seuils"""
+        mesure = serializer.save(mesure_par=self.request.user)
+        chambre = mesure.chambre_froide
+        surveiller_mesures([mesure], {chambre.id: (chambre.temperature_min, chambre.temperature_max)})
 
 
 class HistoriqueChambreFroideDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -200,6 +208,82 @@ class HistoriqueChambreFroideDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def historique_temperatures_lot(request):
+    """
+    Ingestion d'un lot de mesures de température (capteurs, imports)
+    
+    Corps : {"mesures": [{"chambre_froide_id", "temperature", "date_mesure", "notes"}, ...]}
+    Le lot est refusé en entier si une mesure est invalide ; sinon un seul bulk_create.
+    """
+    from django.conf import settings
+    from .serializers import MesureTemperatureLotSerializer
+    
+    mesures = request.data.get('mesures') if isinstance(request.data, dict) else None
+    if not isinstance(mesures, list) or not mesures:
+        return Response({'error': 'mesures doit être une liste non vide'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    maximum = getattr(settings, 'TEMPERATURE_BULK_MAX_MESURES', 5000)
+    if len(mesures) > maximum:
+        return Response(
+            {'error': f'Un lot ne peut pas dépasser {maximum} mesures'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    serializer = MesureTemperatureLotSerializer(data=mesures, many=True)
+    if not serializer.is_valid():
+        return Response({'error': 'Mesures invalides', 'details': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    with transaction.atomic():
+        creees, erreurs = enregistrer_mesures(serializer.validated_data, request.user)
+    if erreurs:
+        return Response({'error': 'Mesures refusées', 'mesures_refusees': erreurs}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'mesures_creees': len(creees)}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def historique_temperatures_serie(request):
+    """
+    Série sous-échantillonnée des températures : min/moyenne/max par tranche (pas=5min, hour ou day)
+    
+    Mêmes filtres que la liste (chambre_froide_id, abattoir_id, date_debut, date_fin) ;
+    sans date_debut, la période couvre la durée par défaut du pas jusqu'à date_fin (ou maintenant).
+    """
+    pas = request.query_params.get('pas', 'hour')
+    if pas not in PAS:
+        return Response(
+            {'error': f"pas doit valoir {', '.join(PAS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    date_debut = request.query_params.get('date_debut')
+    date_fin = request.query_params.get('date_fin')
+    try:
+        if not date_debut:
+            fin = borne_mesure(date_fin, fin=True)[0] if date_fin else timezone.now()
+            date_debut = (fin - PAS[pas][2]).isoformat()
+        queryset = filtrer_periode(HistoriqueChambreFroide.objects.all(), date_debut, date_fin)
+    except ValueError as e:
+        return Response({'error': f'Période invalide: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    chambre_froide_id = request.query_params.get('chambre_froide_id')
+    if chambre_froide_id:
+        queryset = queryset.filter(chambre_froide_id=chambre_froide_id)
+    abattoir_id = request.query_params.get('abattoir_id')
+    if abattoir_id:
+        queryset = queryset.filter(chambre_froide__abattoir_id=abattoir_id)
+    
+    return Response({
+        'pas': pas,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'series': serie_temperatures(queryset, pas)
+    })
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def my_abattoir_stats(request):
@@ -227,9 +311,9 @@ def my_abattoir_stats(request):
     # Pour les utilisateurs non-superviseurs, afficher 0
     total_clients = 0
     
-    # Compter les bêtes de cet abattoir (si vous avez une relation)
-    from bete.models import Bete
-    total_betes = Bete.objects.filter(abattoir=abattoir).count()
+    # Compter les bêtes de cet abattoir (compteurs matérialisés)
+    from bete.models import DashboardCounter
+    total_betes = DashboardCounter.totals(abattoir)['total']
     
     return Response({
         'total_users': total_users,
@@ -259,12 +343,12 @@ def global_stats(request):
     # Compter tous les utilisateurs, clients et bêtes
     from users.models import User
     from client.models import Client
-    from bete.models import Bete
+    from bete.models import DashboardCounter
     
     total_users = User.objects.count()
     total_superusers = User.objects.filter(user_type='SUPERVISEUR').count()
     total_clients = Client.objects.count()
-    total_betes = Bete.objects.count()
+    total_betes = DashboardCounter.totals()['total']
     
     return Response({
         'total_users': total_users,
@@ -325,12 +409,12 @@ def dashboard_stats(request):
         # Pour les superusers Django, afficher les statistiques globales
         from users.models import User
         from client.models import Client
-        from bete.models import Bete
+        from bete.models import DashboardCounter
         
         users_count = User.objects.count()
         clients_count = Client.objects.count()
         superusers_count = User.objects.filter(user_type='SUPERVISEUR').count()
-        betes_count = Bete.objects.count()
+        betes_count = DashboardCounter.totals()['total']
         
         return Response({
             'users_count': users_count,
@@ -356,13 +440,12 @@ def dashboard_stats(request):
         abattoir = user.abattoir
         
         from users.models import User
-        from client.models import Client
-        from bete.models import Bete
+        from bete.models import DashboardCounter
         
         users_count = User.objects.filter(abattoir=abattoir).count()
         clients_count = 0  # Les clients ne sont pas assignés à un abattoir spécifique
         superusers_count = User.objects.filter(abattoir=abattoir, user_type='SUPERVISEUR').count()
-        betes_count = Bete.objects.filter(abattoir=abattoir).count()
+        betes_count = DashboardCounter.totals(abattoir)['total']
         
         return Response({
             'users_count': users_count,
@@ -381,7 +464,7 @@ def abattoirs_for_management(request):
     user = request.user
     
     # Base queryset avec annotation du nombre de bêtes
-    queryset = Abattoir.objects.select_related('responsable').prefetch_related('chambres_froides').annotate(
+    queryset = Abattoir.objects.select_related('responsable').annotate(
         betes_count=Count('bete', distinct=True)
     )
     
@@ -424,8 +507,11 @@ def abattoirs_for_management(request):
         )
     
     # Pagination
-    page_size = int(request.query_params.get('page_size', 20))
-    page = int(request.query_params.get('page', 1))
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE, lire_pagination
+    try:
+        page, page_size = lire_pagination(request.query_params)
+    except ValueError:
+        return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
     
     start = (page - 1) * page_size
     end = start + page_size
@@ -473,9 +559,7 @@ def abattoir_detail_with_facilities(request, pk):
     
     try:
         # Récupérer l'abattoir
-        abattoir = Abattoir.objects.select_related('responsable').annotate(
-            betes_count=Count('bete', distinct=True)
-        ).get(pk=pk)
+        abattoir = Abattoir.objects.select_related('responsable').get(pk=pk)
         
         # Vérifier les permissions
         if not user.is_superuser:
@@ -485,26 +569,30 @@ def abattoir_detail_with_facilities(request, pk):
                     status=status.HTTP_403_FORBIDDEN
                 )
         
-        # Récupérer les chambres froides avec leur historique récent
-        chambres_froides = ChambreFroide.objects.filter(abattoir=abattoir).prefetch_related(
-            'historique_temperatures'
-        ).order_by('numero')
+        # Récupérer les chambres froides avec le nombre de mesures et la dernière température
+        chambres_froides = ChambreFroide.objects.filter(abattoir=abattoir).select_related(
+            'abattoir'
+        ).with_mesures().order_by('numero')
+        
+        # Compteurs matérialisés des bêtes de l'abattoir
+        from bete.models import DashboardCounter
+        from users.models import User
+        
+        counters = DashboardCounter.totals(abattoir)
+        abattoir.betes_count = counters['total']
         
         # Sérialiser les données
         abattoir_serializer = AbattoirSerializer(abattoir)
         chambres_serializer = ChambreFroideSerializer(chambres_froides, many=True)
         
         # Statistiques supplémentaires
-        from bete.models import Bete
-        from users.models import User
-        
         stats = {
             'betes_count': abattoir.betes_count,
-            'betes_vivantes': Bete.objects.filter(abattoir=abattoir, statut='VIVANT').count(),
-            'betes_abattues': Bete.objects.filter(abattoir=abattoir, statut='ABATTU').count(),
-            'betes_mortes': Bete.objects.filter(abattoir=abattoir, statut='MORT').count(),
+            'betes_vivantes': counters['par_statut'].get('VIVANT', 0),
+            'betes_abattues': counters['par_statut'].get('ABATTU', 0),
+            'betes_mortes': counters['par_statut'].get('MORT', 0),
             'utilisateurs_count': User.objects.filter(abattoir=abattoir).count(),
-            'chambres_froides_count': chambres_froides.count(),
+            'chambres_froides_count': len(chambres_serializer.data),
             'capacite_utilisee': round((abattoir.betes_count / abattoir.capacite_totale_reception * 100), 2) if abattoir.capacite_totale_reception > 0 else 0
         }
         
@@ -531,6 +619,61 @@ def abattoir_detail_with_facilities(request, pk):
 # VUES POUR LES STABULATIONS
 # ============================================================================
 
+def _stabulation_detail_queryset():
+    """Stabulations avec créateur/acteurs et bêtes (espèce jointe) préchargés pour StabulationSerializer"""
+    from django.db.models import Prefetch
+    from bete.models import Bete
+    
+    return Stabulation.objects.select_related(
+        'abattoir', 'created_by', 'annule_par', 'finalise_par'
+    ).prefetch_related(
+        Prefetch('betes', queryset=Bete.objects.select_related('espece'))
+    )
+
+
+def _stabulations_queryset(request):
+    """Stabulations filtrées selon les paramètres de la requête (liste et export)"""
+    queryset = Stabulation.objects.select_related('abattoir', 'created_by', 'annule_par', 'finalise_par')
+    
+    # Filtrage par abattoir
+    abattoir_id = request.query_params.get('abattoir_id', None)
+    if abattoir_id:
+        queryset = queryset.filter(abattoir_id=abattoir_id)
+    
+    # Filtrage par type de bête
+    type_bete = request.query_params.get('type_bete', None)
+    if type_bete:
+        queryset = queryset.filter(type_bete=type_bete)
+    
+    # Filtrage par statut
+    statut = request.query_params.get('statut', None)
+    if statut:
+        queryset = queryset.filter(statut=statut)
+    
+    # Filtrage par date de début
+    date_debut = request.query_params.get('date_debut', None)
+    if date_debut:
+        queryset = queryset.filter(date_debut__date__gte=date_debut)
+    
+    # Filtrage par date de fin
+    date_fin = request.query_params.get('date_fin', None)
+    if date_fin:
+        queryset = queryset.filter(date_debut__date__lte=date_fin)
+    
+    # Filtrage par recherche
+    search = request.query_params.get('search', None)
+    if search:
+        queryset = queryset.filter(
+            Q(numero_stabulation__icontains=search) |
+            Q(abattoir__nom__icontains=search) |
+            Q(abattoir__wilaya__icontains=search) |
+            Q(abattoir__commune__icontains=search) |
+            Q(notes__icontains=search)
+        )
+    
+    return queryset.order_by('-date_debut', 'abattoir', 'numero_stabulation')
+
+
 class StabulationListCreateView(generics.ListCreateAPIView):
     """Vue pour lister et créer des stabulations"""
     
@@ -540,107 +683,78 @@ class StabulationListCreateView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return StabulationCreateSerializer
-        return StabulationSerializer
+        # Liste : représentation résumée, les bêtes sont servies par stabulations/<id>/betes/
+        return StabulationListSerializer
     
     def get_queryset(self):
         """Filtrage des stabulations"""
-        queryset = Stabulation.objects.select_related('abattoir', 'created_by').prefetch_related('betes')
-        
-        # Filtrage par abattoir
-        abattoir_id = self.request.query_params.get('abattoir_id', None)
-        if abattoir_id:
-            queryset = queryset.filter(abattoir_id=abattoir_id)
-        
-        # Filtrage par type de bête
-        type_bete = self.request.query_params.get('type_bete', None)
-        if type_bete:
-            queryset = queryset.filter(type_bete=type_bete)
-        
-        # Filtrage par statut
-        statut = self.request.query_params.get('statut', None)
-        if statut:
-            queryset = queryset.filter(statut=statut)
-        
-        # Filtrage par date de début
-        date_debut = self.request.query_params.get('date_debut', None)
-        if date_debut:
-            queryset = queryset.filter(date_debut__date__gte=date_debut)
-        
-        # Filtrage par date de fin
-        date_fin = self.request.query_params.get('date_fin', None)
-        if date_fin:
-            queryset = queryset.filter(date_debut__date__lte=date_fin)
-        
-        # Filtrage par recherche
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(numero_stabulation__icontains=search) |
-                Q(abattoir__nom__icontains=search) |
-                Q(abattoir__wilaya__icontains=search) |
-                Q(abattoir__commune__icontains=search) |
-                Q(notes__icontains=search)
-            )
-        
-        return queryset.order_by('-date_debut', 'abattoir', 'numero_stabulation')
+        return _stabulations_queryset(self.request)
     
     def perform_create(self, serializer):
         """Associe automatiquement l'utilisateur connecté à la stabulation et met à jour le statut des bêtes"""
-        # Créer la stabulation
-        stabulation = serializer.save(created_by=self.request.user)
-        
-        # Gérer la sélection des bêtes
-        betes_ids = self.request.data.get('betes', [])
-        automatic_count = getattr(stabulation, '_automatic_count', None)
-        
-        if betes_ids:
-            # Sélection manuelle : ajouter les bêtes sélectionnées
-            stabulation.betes.set(betes_ids)
-            # CRITIQUE: Mettre à jour le statut des bêtes
-            from bete.models import Bete
-            Bete.objects.filter(id__in=betes_ids).update(statut='EN_STABULATION')
-            print(f"✅ {len(betes_ids)} bêtes mises au statut EN_STABULATION (sélection manuelle)")
-            
-        elif automatic_count:
-            # Sélection automatique : sélectionner aléatoirement des bêtes
-            from bete.models import Bete
-            
-            # Récupérer les bêtes disponibles pour l'abattoir et l'espèce
-            available_betes = Bete.objects.filter(
-                abattoir=stabulation.abattoir,
-                espece__nom__iexact=stabulation.type_bete,
-                statut='VIVANT'
-            ).order_by('?')[:automatic_count]  # Sélection aléatoire
+        from rest_framework import serializers
+        
+        with transaction.atomic():
+            # Créer la stabulation (bêtes validées en une requête par le serializer)
+            stabulation = serializer.save(created_by=self.request.user)
             
-            if available_betes.exists():
-                # Ajouter les bêtes à la stabulation
-                bete_ids = list(available_betes.values_list('id', flat=True))
-                stabulation.betes.set(bete_ids)
-                # CRITIQUE: Mettre à jour le statut des bêtes
-                Bete.objects.filter(id__in=bete_ids).update(statut='EN_STABULATION')
-                print(f"✅ {len(bete_ids)} bêtes mises au statut EN_STABULATION (sélection automatique)")
-            else:
-                # Aucune bête disponible, annuler la stabulation
-                stabulation.statut = 'ANNULE'
-                stabulation.save()
-                from rest_framework import serializers
+            # Relations insérées en masse, statut EN_STABULATION en un seul UPDATE
+            betes_ids = stabulation._betes_ids
+            if stabulation.ajouter_betes_en_masse(betes_ids, user=self.request.user) != len(betes_ids):
+                # Une bête a changé de statut entre la validation et l'ajout : tout annuler
                 raise serializers.ValidationError(
-                    f"Aucune bête de type {stabulation.type_bete} disponible dans cet abattoir."
+                    "Certaines bêtes ne sont plus disponibles, veuillez réessayer."
                 )
         
         return stabulation
 
 
+STABULATION_EXPORT_COLONNES = [
+    ('N° stabulation', 'numero_stabulation'),
+    ('Abattoir', 'abattoir__nom'),
+    ('Type de bête', 'type_bete', libelle_choix(Stabulation.TYPE_BETE_CHOICES)),
+    ('Statut', 'statut', libelle_choix(Stabulation.STATUT_CHOICES)),
+    ('Nombre de bêtes', 'nombre_betes'),
+    ('Date de début', 'date_debut'),
+    ('Date de fin', 'date_fin'),
+    ('Créé par', 'created_by__username'),
+    ('Date d\'annulation', 'date_annulation'),
+    ('Raison d\'annulation', 'raison_annulation'),
+    ('Notes', 'notes'),
+]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_stabulations(request):
+    """Export CSV (par défaut) ou XLSX (?fichier=xlsx) des stabulations, mêmes filtres que la liste"""
+    return export_response(
+        request, _stabulations_queryset(request), STABULATION_EXPORT_COLONNES, 'stabulations', 'Stabulations'
+    )
+
+
 class StabulationDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Vue pour récupérer, mettre à jour et supprimer une stabulation"""
     
     queryset = Stabulation.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        return _stabulation_detail_queryset()
+    
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return StabulationUpdateSerializer
         return StabulationSerializer
+    
+    def update(self, request, *args, **kwargs):
+        try:
+            # Historique des modifications et écriture annulés ensemble en cas de conflit
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except TransitionConflict as e:
+            # Stabulation terminée, annulée ou modifiée par un autre opérateur depuis sa lecture
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
 
 @api_view(['GET'])
@@ -648,6 +762,8 @@ class StabulationDetailView(generics.RetrieveUpdateDestroyAPIView):
 def stabulation_stats(request):
     """Statistiques des stabulations"""
     
+    from django.db.models import Avg
+    
     # Filtrage par abattoir si spécifié
     abattoir_id = request.query_params.get('abattoir_id', None)
     queryset = Stabulation.objects.all()
@@ -655,42 +771,105 @@ def stabulation_stats(request):
     if abattoir_id:
         queryset = queryset.filter(abattoir_id=abattoir_id)
     
-    # Statistiques générales
-    total_stabulations = queryset.count()
-    stabulations_en_cours = queryset.filter(statut='EN_COURS').count()
-    stabulations_terminees = queryset.filter(statut='TERMINE').count()
-    stabulations_annulees = queryset.filter(statut='ANNULE').count()
+    # Une seule agrégation : compteurs par statut et par type, occupation et bêtes calculées en SQL
+    types_bete = ['BOVIN', 'OVIN', 'CAPRIN', 'AUTRE']
+    aggregats = queryset.with_occupation().aggregate(
+        total_stabulations=Count('id'),
+        stabulations_en_cours=Count('id', filter=Q(statut='EN_COURS')),
+        stabulations_terminees=Count('id', filter=Q(statut='TERMINE')),
+        stabulations_annulees=Count('id', filter=Q(statut='ANNULE')),
+        taux_occupation_moyen=Avg('taux'),
+        total_betes_en_stabulation=Sum('nb_betes'),
+        **{f'type_{type_bete}': Count('id', filter=Q(type_bete=type_bete)) for type_bete in types_bete}
+    )
     
     # Statistiques par type
-    stabulations_par_type = {}
-    for type_bete in ['BOVIN', 'OVIN', 'CAPRIN', 'AUTRE']:
-        count = queryset.filter(type_bete=type_bete).count()
-        if count > 0:
-            stabulations_par_type[type_bete] = count
-    
-    # Taux d'occupation moyen
-    taux_occupation_moyen = 0
-    if total_stabulations > 0:
-        total_taux = sum(stab.taux_occupation for stab in queryset)
-        taux_occupation_moyen = round(total_taux / total_stabulations, 1)
-    
-    # Total des bêtes en stabulation
-    total_betes_en_stabulation = sum(stab.nombre_betes_actuelles for stab in queryset)
+    stabulations_par_type = {
+        type_bete: aggregats[f'type_{type_bete}'] for type_bete in types_bete if aggregats[f'type_{type_bete}'] > 0
+    }
     
     stats = {
-        'total_stabulations': total_stabulations,
-        'stabulations_en_cours': stabulations_en_cours,
-        'stabulations_terminees': stabulations_terminees,
-        'stabulations_annulees': stabulations_annulees,
+        'total_stabulations': aggregats['total_stabulations'],
+        'stabulations_en_cours': aggregats['stabulations_en_cours'],
+        'stabulations_terminees': aggregats['stabulations_terminees'],
+        'stabulations_annulees': aggregats['stabulations_annulees'],
         'stabulations_par_type': stabulations_par_type,
-        'taux_occupation_moyen': taux_occupation_moyen,
-        'total_betes_en_stabulation': total_betes_en_stabulation
+        'taux_occupation_moyen': round(aggregats['taux_occupation_moyen'] or 0, 1),
+        'total_betes_en_stabulation': aggregats['total_betes_en_stabulation'] or 0
     }
     
     serializer = StabulationStatsSerializer(stats)
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def stabulation_occupation_history(request):
+    """
+    Historique de l'occupation des stabulations par période de début (day, week, month)
+    
+    Une seule agrégation GROUP BY période : stabulations ouvertes, bêtes placées,
+    taux d'occupation moyen et maximal.
+    """
+    from django.db.models import Avg, Max
+    from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+    
+    user = request.user
+    
+    bucket = request.query_params.get('bucket', 'day')
+    truncs = {'day': TruncDate, 'week': TruncWeek, 'month': TruncMonth}
+    if bucket not in truncs:
+        return Response({'error': 'bucket doit valoir day, week ou month'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        start_date, end_date, period = _resolve_date_range(request)
+    except ValueError as e:
+        return Response({'error': f'Période invalide: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    debut, fin = _aware_day_bounds(start_date, end_date)
+    queryset = Stabulation.objects.filter(date_debut__gte=debut, date_debut__lt=fin)
+    if user.is_superuser:
+        abattoir_id = request.query_params.get('abattoir_id')
+        if abattoir_id:
+            queryset = queryset.filter(abattoir_id=abattoir_id)
+    elif hasattr(user, 'abattoir') and user.abattoir:
+        queryset = queryset.filter(abattoir=user.abattoir)
+    else:
+        queryset = Stabulation.objects.none()
+    
+    type_bete = request.query_params.get('type_bete')
+    if type_bete:
+        queryset = queryset.filter(type_bete=type_bete)
+    
+    rows = queryset.with_occupation().annotate(
+        periode=truncs[bucket]('date_debut')
+    ).order_by('periode').values('periode').annotate(
+        stabulations=Count('id'),
+        betes=Sum('nb_betes'),
+        taux_occupation_moyen=Avg('taux'),
+        taux_occupation_max=Max('taux'),
+    )
+    
+    series = [
+        {
+            'periode': (row['periode'].date() if hasattr(row['periode'], 'date') else row['periode']).isoformat(),
+            'stabulations': row['stabulations'],
+            'betes': row['betes'] or 0,
+            'taux_occupation_moyen': round(row['taux_occupation_moyen'] or 0, 1),
+            'taux_occupation_max': round(row['taux_occupation_max'] or 0, 1),
+        }
+        for row in rows
+    ]
+    
+    return Response({
+        'bucket': bucket,
+        'period': period,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'series': series
+    })
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def terminer_stabulation(request, pk):
@@ -727,32 +906,45 @@ def terminer_stabulation(request, pk):
         poids_data = request.data.get('poidsData', [])
         
         # 5. VÉRIFIER D'ABORD LES NUMÉROS DE POSTE AVANT DE TERMINER
+        # Validation ensembliste : nombre de requêtes constant quel que soit le lot
         from bete.models import Bete
-        betes_ids = list(stabulation.betes.values_list('id', flat=True))
+        from simple_history.utils import bulk_update_with_history
+        betes_ids = set(stabulation.betes.values_list('id', flat=True))
         errors = []
         
+        # Seules les bêtes de cette stabulation peuvent recevoir un poids
+        poids_par_bete = {}
         for poids_info in poids_data:
             bete_id = poids_info.get('bete_id')
             poids_a_chaud = poids_info.get('poids_a_chaud')
-            num_boucle_post_abattage = poids_info.get('num_boucle_post_abattage', '')
-            
             if bete_id and poids_a_chaud:
                 try:
-                    bete = Bete.objects.get(id=bete_id)
-                    
-                    # Vérifier l'unicité du numéro de boucle post-abattage AVANT de terminer
-                    if num_boucle_post_abattage:
-                        existing_bete = Bete.objects.filter(
-                            num_boucle_post_abattage=num_boucle_post_abattage
-                        ).exclude(id=bete_id).first()
-                        
-                        if existing_bete:
-                            errors.append(f"Le numéro de boucle post-abattage '{num_boucle_post_abattage}' existe déjà pour la bête {existing_bete.num_boucle}")
-                            continue
-                    
-                except Bete.DoesNotExist:
-                    errors.append(f"Bête avec l'ID {bete_id} non trouvée")
+                    bete_id = int(bete_id)
+                except (TypeError, ValueError):
+                    errors.append(f"Identifiant de bête invalide : '{bete_id}'")
+                    continue
+                if bete_id not in betes_ids:
+                    errors.append(f"La bête avec l'ID {bete_id} n'appartient pas à cette stabulation")
                     continue
+                poids_par_bete[bete_id] = (poids_a_chaud, poids_info.get('num_boucle_post_abattage', ''))
+        
+        betes = Bete.objects.in_bulk(list(poids_par_bete))
+        numeros = {}
+        for bete_id, (_, num_boucle_post_abattage) in poids_par_bete.items():
+            if bete_id not in betes:
+                errors.append(f"Bête avec l'ID {bete_id} non trouvée")
+            elif num_boucle_post_abattage:
+                if num_boucle_post_abattage in numeros:
+                    errors.append(f"Le numéro de boucle post-abattage '{num_boucle_post_abattage}' est saisi pour plusieurs bêtes")
+                numeros[num_boucle_post_abattage] = bete_id
+        
+        # Vérifier l'unicité des numéros de boucle post-abattage AVANT de terminer
+        existants = Bete.objects.filter(num_boucle_post_abattage__in=list(numeros)).values_list(
+            'id', 'num_boucle_post_abattage', 'num_boucle'
+        ) if numeros else []
+        for existing_id, num_boucle_post_abattage, num_boucle in existants:
+            if numeros[num_boucle_post_abattage] != existing_id:
+                errors.append(f"Le numéro de boucle post-abattage '{num_boucle_post_abattage}' existe déjà pour la bête {num_boucle}")
         
         # Si il y a des erreurs, retourner les erreurs SANS terminer la stabulation
         if errors:
@@ -761,25 +953,25 @@ def terminer_stabulation(request, pk):
                 'details': errors
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 6. MAINTENANT TERMINER LA STABULATION (seulement si pas d'erreurs)
-        # La méthode terminer_stabulation() met automatiquement les bêtes au statut ABATTU
-        stabulation.terminer_stabulation()
-        
-        # 8. Mettre à jour les poids et numéros de boucle post-abattage
-        for poids_info in poids_data:
-            bete_id = poids_info.get('bete_id')
-            poids_a_chaud = poids_info.get('poids_a_chaud')
-            num_boucle_post_abattage = poids_info.get('num_boucle_post_abattage', '')
+        with transaction.atomic():
+            # 6. Mettre à jour les poids et numéros de boucle post-abattage en un seul UPDATE
+            # (avant la finalisation, pour que l'agrégat journalier les inclue)
+            maintenant = timezone.now()
+            for bete_id, (poids_a_chaud, num_boucle_post_abattage) in poids_par_bete.items():
+                bete = betes[bete_id]
+                bete.poids_a_chaud = poids_a_chaud
+                if num_boucle_post_abattage:
+                    bete.num_boucle_post_abattage = num_boucle_post_abattage
+                bete.updated_at = maintenant
+            if betes:
+                bulk_update_with_history(
+                    list(betes.values()), Bete, ['poids_a_chaud', 'num_boucle_post_abattage', 'updated_at'],
+                    default_user=request.user, default_date=maintenant
+                )
             
-            if bete_id and poids_a_chaud:
-                try:
-                    bete = Bete.objects.get(id=bete_id)
-                    bete.poids_a_chaud = poids_a_chaud
-                    if num_boucle_post_abattage:
-                        bete.num_boucle_post_abattage = num_boucle_post_abattage
-                    bete.save()
-                except Bete.DoesNotExist:
-                    pass  # Déjà vérifié plus haut
+            # 7. MAINTENANT TERMINER LA STABULATION (seulement si pas d'erreurs)
+            # La méthode terminer_stabulation() met automatiquement les bêtes au statut ABATTU
+            stabulation.terminer_stabulation(utilisateur=request.user)
         
         # 9. Retourner le résultat
         return Response({
@@ -797,6 +989,9 @@ def terminer_stabulation(request, pk):
             {'error': 'Stabulation non trouvée'}, 
             status=status.HTTP_404_NOT_FOUND
         )
+    except TransitionConflict as e:
+        # Un autre opérateur a terminé ou annulé la stabulation entre-temps
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         return Response(
             {'error': f'Erreur lors de la finalisation: {str(e)}'}, 
@@ -839,7 +1034,7 @@ def ajouter_betes_stabulation(request, pk):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        serializer = StabulationSerializer(stabulation)
+        serializer = StabulationSerializer(_stabulation_detail_queryset().get(pk=stabulation.pk))
         return Response(serializer.data)
         
     except Stabulation.DoesNotExist:
@@ -876,7 +1071,7 @@ def retirer_betes_stabulation(request, pk):
         # Retirer les bêtes
         stabulation.retirer_betes(list(betes))
         
-        serializer = StabulationSerializer(stabulation)
+        serializer = StabulationSerializer(_stabulation_detail_queryset().get(pk=stabulation.pk))
         return Response(serializer.data)
         
     except Stabulation.DoesNotExist:
@@ -886,16 +1081,70 @@ def retirer_betes_stabulation(request, pk):
         )
 
 
+def _stabulations_statistics(stabulations):
+    """
+    Statistiques d'une liste de stabulations en une seule agrégation GROUP BY abattoir, statut
+    Retourne (totaux, totaux par nom d'abattoir)
+    """
+    rows = stabulations.order_by().values('abattoir__nom', 'statut').annotate(
+        total=Count('id'),
+        betes=Sum('nombre_betes')
+    )
+    cles = {'EN_COURS': 'en_cours', 'TERMINE': 'terminees', 'ANNULE': 'annulees'}
+    totaux = {'total': 0, 'en_cours': 0, 'terminees': 0, 'annulees': 0, 'betes': 0}
+    par_abattoir = {}
+    for row in rows:
+        abattoir_stats = par_abattoir.setdefault(row['abattoir__nom'], dict.fromkeys(totaux, 0))
+        for stats in (totaux, abattoir_stats):
+            stats['total'] += row['total']
+            stats['betes'] += row['betes'] or 0
+            if row['statut'] in cles:
+                stats[cles[row['statut']]] += row['total']
+    return totaux, par_abattoir
+
+
+def _paginate_stabulations(request, stabulations, total_count):
+    """
+    Pagination optionnelle (page, page_size) d'une liste de stabulations
+    Sans ces paramètres, toute la liste est renvoyée comme auparavant
+    ValueError si page ou page_size n'est pas un entier
+    """
+    from backend.pagination import lire_pagination
+
+    if 'page' not in request.query_params and 'page_size' not in request.query_params:
+        return stabulations, {
+            'page': 1,
+            'page_size': total_count,
+            'total_count': total_count,
+            'total_pages': 1,
+            'has_next': False,
+            'has_previous': False
+        }
+    
+    page, page_size = lire_pagination(request.query_params)
+    start = (page - 1) * page_size
+    end = start + page_size
+    return stabulations[start:end], {
+        'page': page,
+        'page_size': page_size,
+        'total_count': total_count,
+        'total_pages': (total_count + page_size - 1) // page_size,
+        'has_next': end < total_count,
+        'has_previous': page > 1
+    }
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def stabulations_abattoir(request, abattoir_id):
     """Récupérer toutes les stabulations d'un abattoir"""
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE
     try:
         # Vérifier que l'abattoir existe
         abattoir = Abattoir.objects.get(pk=abattoir_id)
         
         # Récupérer les stabulations (version simplifiée)
-        stabulations = Stabulation.objects.filter(abattoir=abattoir).order_by('-date_debut')
+        stabulations = Stabulation.objects.filter(abattoir=abattoir)
         
         # Filtrage par statut si spécifié
         statut = request.query_params.get('statut', None)
@@ -907,9 +1156,30 @@ def stabulations_abattoir(request, abattoir_id):
         if type_bete:
             stabulations = stabulations.filter(type_bete=type_bete)
         
+        # Statistiques simplifiées (une seule agrégation)
+        totaux, _ = _stabulations_statistics(stabulations)
+        stats = {
+            'total_stabulations': totaux['total'],
+            'stabulations_en_cours': totaux['en_cours'],
+            'stabulations_terminees': totaux['terminees'],
+            'stabulations_annulees': totaux['annulees'],
+            'total_betes_en_stabulation': totaux['betes'],
+            'capacite_stabulation_ovin': abattoir.capacite_stabulation_ovin,
+            'capacite_stabulation_bovin': abattoir.capacite_stabulation_bovin,
+        }
+        
+        try:
+            page, pagination = _paginate_stabulations(
+                request,
+                stabulations.order_by('-date_debut', '-id'),
+                totaux['total']
+            )
+        except ValueError:
+            return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Version simplifiée du serializer
         stabulations_data = []
-        for stab in stabulations:
+        for stab in page:
             stabulations_data.append({
                 'id': stab.id,
                 'numero_stabulation': stab.numero_stabulation,
@@ -918,25 +1188,15 @@ def stabulations_abattoir(request, abattoir_id):
                 'date_debut': stab.date_debut,
                 'date_fin': stab.date_fin,
                 'notes': stab.notes,
-                'nombre_betes_actuelles': stab.betes.count(),
-                'abattoir_nom': stab.abattoir.nom,
-                'abattoir_id': stab.abattoir.id,
+                'nombre_betes_actuelles': stab.nombre_betes,
+                'abattoir_nom': abattoir.nom,
+                'abattoir_id': abattoir.id,
             })
         
-        # Statistiques simplifiées
-        stats = {
-            'total_stabulations': stabulations.count(),
-            'stabulations_en_cours': stabulations.filter(statut='EN_COURS').count(),
-            'stabulations_terminees': stabulations.filter(statut='TERMINE').count(),
-            'stabulations_annulees': stabulations.filter(statut='ANNULE').count(),
-            'total_betes_en_stabulation': sum(stab.betes.count() for stab in stabulations),
-            'capacite_stabulation_ovin': abattoir.capacite_stabulation_ovin,
-            'capacite_stabulation_bovin': abattoir.capacite_stabulation_bovin,
-        }
-        
         return Response({
             'stabulations': stabulations_data,
             'statistics': stats,
+            'pagination': pagination,
             'abattoir': {
                 'id': abattoir.id,
                 'nom': abattoir.nom,
@@ -956,6 +1216,7 @@ def stabulations_abattoir(request, abattoir_id):
 @permission_classes([permissions.IsAuthenticated])
 def all_stabulations(request):
     """Récupérer toutes les stabulations (pour les superusers)"""
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE
     # Vérifier que l'utilisateur est superuser
     if not request.user.is_superuser:
         return Response(
@@ -964,7 +1225,7 @@ def all_stabulations(request):
         )
     
     # Récupérer toutes les stabulations
-    stabulations = Stabulation.objects.select_related('abattoir').order_by('-date_debut')
+    stabulations = Stabulation.objects.all()
     
     # Filtrage par statut si spécifié
     statut = request.query_params.get('statut', None)
@@ -981,9 +1242,29 @@ def all_stabulations(request):
     if abattoir_id:
         stabulations = stabulations.filter(abattoir_id=abattoir_id)
     
+    # Statistiques globales et par abattoir (une seule agrégation)
+    totaux, par_abattoir = _stabulations_statistics(stabulations)
+    stats = {
+        'total_stabulations': totaux['total'],
+        'stabulations_en_cours': totaux['en_cours'],
+        'stabulations_terminees': totaux['terminees'],
+        'stabulations_annulees': totaux['annulees'],
+        'total_betes_en_stabulation': totaux['betes'],
+        'stabulations_par_abattoir': par_abattoir,
+    }
+    
+    try:
+        page, pagination = _paginate_stabulations(
+            request,
+            stabulations.select_related('abattoir').order_by('-date_debut', '-id'),
+            totaux['total']
+        )
+    except ValueError:
+        return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
+    
     # Version simplifiée du serializer
     stabulations_data = []
-    for stab in stabulations:
+    for stab in page:
         stabulations_data.append({
             'id': stab.id,
             'numero_stabulation': stab.numero_stabulation,
@@ -992,48 +1273,17 @@ def all_stabulations(request):
             'date_debut': stab.date_debut,
             'date_fin': stab.date_fin,
             'notes': stab.notes,
-            'nombre_betes_actuelles': stab.betes.count(),
+            'nombre_betes_actuelles': stab.nombre_betes,
             'abattoir_nom': stab.abattoir.nom,
             'abattoir_id': stab.abattoir.id,
             'abattoir_wilaya': stab.abattoir.wilaya,
             'abattoir_commune': stab.abattoir.commune,
         })
     
-    # Statistiques globales
-    stats = {
-        'total_stabulations': stabulations.count(),
-        'stabulations_en_cours': stabulations.filter(statut='EN_COURS').count(),
-        'stabulations_terminees': stabulations.filter(statut='TERMINE').count(),
-        'stabulations_annulees': stabulations.filter(statut='ANNULE').count(),
-        'total_betes_en_stabulation': sum(stab.betes.count() for stab in stabulations),
-        'stabulations_par_abattoir': {},
-    }
-    
-    # Statistiques par abattoir
-    for stab in stabulations:
-        abattoir_nom = stab.abattoir.nom
-        if abattoir_nom not in stats['stabulations_par_abattoir']:
-            stats['stabulations_par_abattoir'][abattoir_nom] = {
-                'total': 0,
-                'en_cours': 0,
-                'terminees': 0,
-                'annulees': 0,
-                'betes': 0
-            }
-        
-        stats['stabulations_par_abattoir'][abattoir_nom]['total'] += 1
-        stats['stabulations_par_abattoir'][abattoir_nom]['betes'] += stab.betes.count()
-        
-        if stab.statut == 'EN_COURS':
-            stats['stabulations_par_abattoir'][abattoir_nom]['en_cours'] += 1
-        elif stab.statut == 'TERMINE':
-            stats['stabulations_par_abattoir'][abattoir_nom]['terminees'] += 1
-        elif stab.statut == 'ANNULE':
-            stats['stabulations_par_abattoir'][abattoir_nom]['annulees'] += 1
-    
     return Response({
         'stabulations': stabulations_data,
         'statistics': stats,
+        'pagination': pagination,
         'is_superuser_view': True
     })
 
@@ -1083,7 +1333,11 @@ def annuler_stabulation(request, pk):
             )
         
         # Annuler la stabulation avec le motif
-        stabulation.annuler_stabulation(utilisateur=request.user, raison=raison)
+        try:
+            stabulation.annuler_stabulation(utilisateur=request.user, raison=raison)
+        except TransitionConflict as e:
+            # Un autre opérateur a terminé ou annulé la stabulation entre-temps
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Stabulation annulée avec succès',
@@ -1185,39 +1439,71 @@ def historique_stabulation(request, pk):
         )
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def betes_stabulation(request, pk):
+    """Bêtes d'une stabulation, paginées (page, page_size), pour la grille du détail"""
+    from .serializers import bete_info_data
+    
+    try:
+        stabulation = Stabulation.objects.get(pk=pk)
+    except Stabulation.DoesNotExist:
+        return Response(
+            {'error': 'Stabulation non trouvée'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # Vérifier les permissions
+    user = request.user
+    if not user.is_superuser:
+        if not user.abattoir or stabulation.abattoir_id != user.abattoir.id:
+            return Response(
+                {'error': 'Vous n\'avez pas accès à cette stabulation'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+    
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE, lire_pagination
+    try:
+        page, page_size = lire_pagination(request.query_params, page_size_defaut=50)
+    except ValueError:
+        return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
+    
+    start = (page - 1) * page_size
+    end = start + page_size
+    betes = stabulation.betes.select_related('espece').order_by('num_boucle', 'id')[start:end]
+    total_count = stabulation.nombre_betes
+    
+    return Response({
+        'stabulation_id': stabulation.id,
+        'betes': [bete_info_data(bete) for bete in betes],
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total_count': total_count,
+            'total_pages': (total_count + page_size - 1) // page_size,
+            'has_next': end < total_count,
+            'has_previous': page > 1
+        }
+    })
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_statistics(request):
     """Récupérer les statistiques du dashboard principal"""
     from django.db.models import Count, Q
     from django.utils import timezone
-    from bete.models import Bete
+    from bete.models import Bete, DashboardCounter
     from transfert.models import Transfert
-    from datetime import date, timedelta
-    
-    def synchronize_bete_statuses():
-        """Synchronise les statuts des bêtes avec les stabulations pour assurer la cohérence"""
-        from abattoir.models import Stabulation
-        
-        # Mettre à jour les bêtes dans les stabulations EN_COURS
-        stabulations_en_cours = Stabulation.objects.filter(statut='EN_COURS')
-        for stab in stabulations_en_cours:
-            stab.betes.update(statut='EN_STABULATION')
-        
-        # CORRECTION CRITIQUE: Ne pas toucher aux bêtes des stabulations terminées
-        # Les bêtes des stabulations TERMINE restent ABATTU (c'est le comportement attendu)
-        # Seules les bêtes des stabulations ANNULE peuvent être remises VIVANT
-        stabulations_annulees = Stabulation.objects.filter(statut='ANNULE')
-        for stab in stabulations_annulees:
-            stab.betes.update(statut='VIVANT')
-        
-        # Les stabulations TERMINE ne sont PAS touchées - les bêtes restent ABATTU
+    from datetime import date, datetime, time, timedelta
     
-    # Synchroniser les statuts pour assurer la cohérence
-    synchronize_bete_statuses()
+    # Lecture seule : la cohérence statuts/stabulations est assurée par la tâche périodique
+    # sync_bete_statuses (BeteStatusManager.reconcile_stabulation_statuses)
     
     user = request.user
     today = timezone.now().date()
+    # Bornes en datetime (utilisent les index, contrairement à __date)
+    debut_aujourdhui = timezone.make_aware(datetime.combine(today, time.min))
     
     # Base querysets selon le type d'utilisateur
     if user.is_superuser:
@@ -1235,41 +1521,42 @@ def dashboard_statistics(request):
             betes_queryset = Bete.objects.none()
             transferts_queryset = Transfert.objects.none()
     
+    # Compteurs matérialisés par statut et espèce (lecture O(1), voir DashboardCounter)
+    if user.is_superuser:
+        counters = DashboardCounter.totals()
+    elif hasattr(user, 'abattoir') and user.abattoir:
+        counters = DashboardCounter.totals(user.abattoir)
+    else:
+        counters = {'total': 0, 'par_statut': {}, 'par_espece': {}}
+    
     # 1. Nombre de bêtes vivantes
-    nombre_betes = betes_queryset.filter(statut='VIVANT').count()
+    nombre_betes = counters['par_statut'].get('VIVANT', 0)
     
     # 2. Nombre de carcasses (bêtes abattues)
-    nombre_carcasses = betes_queryset.filter(statut='ABATTU').count()
+    nombre_carcasses = counters['par_statut'].get('ABATTU', 0)
     
     # 3. Nombre de transferts aujourd'hui
     transferts_aujourdhui = transferts_queryset.filter(
-        date_creation__date=today
+        date_creation__gte=debut_aujourdhui
     ).count()
     
-    # 4. Nombre d'animaux en stabulation (seulement dans les stabulations EN_COURS)
-    from abattoir.models import Stabulation
-    stabulations_en_cours = Stabulation.objects.filter(statut='EN_COURS')
-    if user.is_superuser:
-        # Superuser voit toutes les stabulations
-        animaux_stabulation = sum(stab.betes.count() for stab in stabulations_en_cours)
-    else:
-        # Utilisateur normal - seulement son abattoir
-        if hasattr(user, 'abattoir') and user.abattoir:
-            stabulations_en_cours = stabulations_en_cours.filter(abattoir=user.abattoir)
-            animaux_stabulation = sum(stab.betes.count() for stab in stabulations_en_cours)
-        else:
-            animaux_stabulation = 0
+    # 4. Nombre d'animaux en stabulation (bêtes au statut EN_STABULATION)
+    animaux_stabulation = counters['par_statut'].get('EN_STABULATION', 0)
     
     # Statistiques supplémentaires pour enrichir le dashboard
     stats_supplementaires = {
-        'betes_par_statut': list(betes_queryset.values('statut').annotate(count=Count('id'))),
+        'betes_par_statut': [
+            {'statut': statut, 'count': count} for statut, count in counters['par_statut'].items()
+        ],
         'transferts_par_statut': list(transferts_queryset.values('statut').annotate(count=Count('id'))),
-        'betes_par_espece': list(betes_queryset.values('espece__nom').annotate(count=Count('id'))),
+        'betes_par_espece': [
+            {'espece__nom': espece, 'count': count} for espece, count in counters['par_espece'].items()
+        ],
         'transferts_7_derniers_jours': transferts_queryset.filter(
-            date_creation__date__gte=today - timedelta(days=7)
+            date_creation__gte=debut_aujourdhui - timedelta(days=7)
         ).count(),
         'betes_ajoutees_aujourdhui': betes_queryset.filter(
-            created_at__date=today
+            created_at__gte=debut_aujourdhui
         ).count(),
     }
     
@@ -1285,104 +1572,205 @@ def dashboard_statistics(request):
     })
 
 
+# Espèces affichées par RealSpeciesSlaughterChart (frontend)
+SLAUGHTER_CHART_ESPECES = ('Bovin', 'Ovin', 'Caprin', 'Autre')
+
+
+def _resolve_date_range(request):
+    """
+    Période demandée : start_date/end_date (AAAA-MM-JJ) ou period (today, week, month)
+    Retourne (start_date, end_date, période) ou lève ValueError
+    """
+    from datetime import datetime, timedelta
+    
+    today = timezone.localdate()
+    start_param = request.query_params.get('start_date')
+    end_param = request.query_params.get('end_date')
+    
+    if start_param or end_param:
+        start_date = datetime.strptime(start_param, '%Y-%m-%d').date() if start_param else today
+        end_date = datetime.strptime(end_param, '%Y-%m-%d').date() if end_param else today
+        if start_date > end_date:
+            raise ValueError('start_date doit précéder end_date')
+        return start_date, end_date, 'custom'
+    
+    period = request.query_params.get('period', 'today')  # today, week, month
+    if period == 'week':
+        return today - timedelta(days=7), today, period
+    if period == 'month':
+        return today - timedelta(days=30), today, period
+    return today, today, period
+
+
+def _aware_day_bounds(start_date, end_date):
+    """Bornes datetime [début, fin[ d'une plage de jours (filtrage indexable)"""
+    from datetime import datetime, time, timedelta
+    
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min)),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+    )
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def slaughter_data_by_period(request):
-    """Récupérer les données d'abattage filtrées par période selon les stabulations terminées"""
-    from django.db.models import Count, Q
-    from django.utils import timezone
-    from bete.models import Bete
-    from abattoir.models import Stabulation
-    from datetime import date, timedelta
+    """
+    Récupérer les données d'abattage filtrées par période selon les stabulations terminées
+    
+    Une seule agrégation GROUP BY abattoir, espèce (et jour/semaine si bucket=day|week),
+    quel que soit le nombre d'abattoirs.
+    """
+    from django.db.models.functions import TruncDate, TruncWeek
+    from bete.models import Bete, Espece
     
     user = request.user
-    period = request.query_params.get('period', 'today')  # today, week, month
     
-    # Calculer les dates selon la période
-    today = timezone.now().date()
+    try:
+        start_date, end_date, period = _resolve_date_range(request)
+    except ValueError as e:
+        return Response({'error': f'Période invalide: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    bucket = request.query_params.get('bucket')  # day, week
+    if bucket not in (None, '', 'day', 'week'):
+        return Response({'error': 'bucket doit valoir day ou week'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Espèces dynamiques (toutes les espèces connues, même sans abattage)
+    especes = list(Espece.objects.order_by('nom').values_list('nom', flat=True))
+    # Clés attendues par le graphique actuel du frontend, toujours présentes (0 par défaut)
+    colonnes = especes + [espece for espece in SLAUGHTER_CHART_ESPECES if espece not in especes]
+    
+    # Bêtes abattues des stabulations terminées dans la période : toutes les conditions sur
+    # stabulations dans un seul filter() pour une seule jointure (celle qui sert au bucket)
+    debut, fin = _aware_day_bounds(start_date, end_date)
+    conditions = {
+        'statut': 'ABATTU',
+        'stabulations__statut': 'TERMINE',
+        'stabulations__date_fin__gte': debut,
+        'stabulations__date_fin__lt': fin,
+    }
+    if not user.is_superuser and hasattr(user, 'abattoir') and user.abattoir:
+        conditions['stabulations__abattoir'] = user.abattoir
+    if user.is_superuser or (hasattr(user, 'abattoir') and user.abattoir):
+        betes_filtrees = Bete.objects.filter(**conditions)
+    else:
+        betes_filtrees = Bete.objects.none()
+    
+    group_fields = ['abattoir__nom', 'espece__nom']
+    if bucket:
+        trunc = TruncDate if bucket == 'day' else TruncWeek
+        betes_filtrees = betes_filtrees.annotate(bucket=trunc('stabulations__date_fin'))
+        group_fields.append('bucket')
+    rows = betes_filtrees.order_by().values(*group_fields).annotate(count=Count('id', distinct=True))
+    
+    def empty_row(abattoir_nom):
+        row = {'abattoir_nom': abattoir_nom}
+        row.update({espece: 0 for espece in colonnes})
+        return row
+    
+    abattoirs = {}
+    series = {}
+    for row in rows:
+        abattoir_nom = row['abattoir__nom'] or 'Abattoir inconnu'
+        espece = row['espece__nom']
+        abattoirs.setdefault(abattoir_nom, empty_row(abattoir_nom))
+        abattoirs[abattoir_nom][espece] = abattoirs[abattoir_nom].get(espece, 0) + row['count']
+        if bucket:
+            bucket_date = row['bucket'].date() if hasattr(row['bucket'], 'date') else row['bucket']
+            key = (bucket_date, abattoir_nom)
+            series.setdefault(key, dict(empty_row(abattoir_nom), date=bucket_date.isoformat()))
+            series[key][espece] = series[key].get(espece, 0) + row['count']
+    
+    # Un utilisateur d'abattoir voit toujours la ligne de son abattoir
+    if not user.is_superuser and hasattr(user, 'abattoir') and user.abattoir and not abattoirs:
+        abattoirs[user.abattoir.nom] = empty_row(user.abattoir.nom)
+    
+    abattoirs_data = list(abattoirs.values())
+    response_data = {
+        'period': period,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'especes': especes,
+        'abattoirs_data': abattoirs_data,
+        'total_animals': sum(row['count'] for row in rows)
+    }
+    if bucket:
+        response_data['bucket'] = bucket
+        response_data['series'] = [series[key] for key in sorted(series)]
     
-    if period == 'today':
-        start_date = today
-        end_date = today
-    elif period == 'week':
-        start_date = today - timedelta(days=7)
-        end_date = today
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-        end_date = today
+    return Response(response_data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def slaughter_rollup(request):
+    """
+    Historique des abattages à partir de l'agrégat journalier (DailySlaughterRollup)
+    
+    granularity=day|month|year, start_date/end_date (défaut : année en cours),
+    abattoir_id (superusers uniquement). Ne lit jamais les bêtes.
+    """
+    from django.db.models.functions import TruncMonth, TruncYear
+    from .models import DailySlaughterRollup
+    
+    user = request.user
+    
+    granularity = request.query_params.get('granularity', 'month')
+    if granularity not in ('day', 'month', 'year'):
+        return Response({'error': 'granularity doit valoir day, month ou year'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if request.query_params.get('start_date') or request.query_params.get('end_date'):
+        try:
+            start_date, end_date, _ = _resolve_date_range(request)
+        except ValueError as e:
+            return Response({'error': f'Période invalide: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     else:
-        start_date = today
-        end_date = today
+        end_date = timezone.localdate()
+        start_date = end_date.replace(month=1, day=1)
     
-    # CORRECTION: Filtrer selon les stabulations terminées dans la période
+    rollups = DailySlaughterRollup.objects.filter(date__gte=start_date, date__lte=end_date)
     if user.is_superuser:
-        stabulations_queryset = Stabulation.objects.filter(statut='TERMINE')
+        abattoir_id = request.query_params.get('abattoir_id')
+        if abattoir_id:
+            rollups = rollups.filter(abattoir_id=abattoir_id)
+    elif hasattr(user, 'abattoir') and user.abattoir:
+        rollups = rollups.filter(abattoir=user.abattoir)
     else:
-        if hasattr(user, 'abattoir') and user.abattoir:
-            stabulations_queryset = Stabulation.objects.filter(statut='TERMINE', abattoir=user.abattoir)
-        else:
-            stabulations_queryset = Stabulation.objects.none()
+        rollups = DailySlaughterRollup.objects.none()
     
-    # Filtrer les stabulations terminées dans la période
-    # Utiliser une approche plus simple avec les dates
-    stabulations_terminees = stabulations_queryset.filter(
-        date_fin__date__gte=start_date,
-        date_fin__date__lte=end_date
-    )
+    if granularity == 'month':
+        rollups = rollups.annotate(periode=TruncMonth('date'))
+    elif granularity == 'year':
+        rollups = rollups.annotate(periode=TruncYear('date'))
+    else:
+        rollups = rollups.annotate(periode=F('date'))
     
-    # Récupérer toutes les bêtes de ces stabulations terminées
-    betes_filtrees = Bete.objects.filter(
-        stabulations__in=stabulations_terminees,
-        statut='ABATTU'
+    rows = rollups.order_by('periode', 'espece__nom', 'sexe').values('periode', 'espece__nom', 'sexe').annotate(
+        nombre=Sum('nombre'),
+        poids_vif=Sum('poids_vif_total'),
+        poids_a_chaud=Sum('poids_a_chaud_total'),
+        poids_a_froid=Sum('poids_a_froid_total'),
     )
     
-    # Grouper par abattoir et espèce
-    from django.db.models import Sum
-    
-    # Si superuser, grouper par abattoir
-    if user.is_superuser:
-        abattoirs_data = []
-        abattoirs = betes_filtrees.values('abattoir__nom').distinct()
-        
-        for abattoir in abattoirs:
-            abattoir_nom = abattoir['abattoir__nom'] or 'Abattoir inconnu'
-            abattoir_betes = betes_filtrees.filter(abattoir__nom=abattoir_nom)
-            
-            # Compter par espèce
-            especes_count = {}
-            for espece in ['Bovin', 'Ovin', 'Caprin', 'Autre']:
-                especes_count[espece] = abattoir_betes.filter(espece__nom=espece).count()
-            
-            abattoirs_data.append({
-                'abattoir_nom': abattoir_nom,
-                'Bovin': especes_count['Bovin'],
-                'Ovin': especes_count['Ovin'],
-                'Caprin': especes_count['Caprin'],
-                'Autre': especes_count['Autre']
-            })
-    else:
-        # Utilisateur normal - seulement son abattoir
-        if hasattr(user, 'abattoir') and user.abattoir:
-            especes_count = {}
-            for espece in ['Bovin', 'Ovin', 'Caprin', 'Autre']:
-                especes_count[espece] = betes_filtrees.filter(espece__nom=espece).count()
-            
-            abattoirs_data = [{
-                'abattoir_nom': user.abattoir.nom,
-                'Bovin': especes_count['Bovin'],
-                'Ovin': especes_count['Ovin'],
-                'Caprin': especes_count['Caprin'],
-                'Autre': especes_count['Autre']
-            }]
-        else:
-            abattoirs_data = []
+    results = [
+        {
+            'periode': row['periode'].isoformat(),
+            'espece': row['espece__nom'],
+            'sexe': row['sexe'],
+            'nombre': row['nombre'],
+            'poids_vif': row['poids_vif'],
+            'poids_a_chaud': row['poids_a_chaud'],
+            'poids_a_froid': row['poids_a_froid'],
+        }
+        for row in rows
+    ]
     
     return Response({
-        'period': period,
+        'granularity': granularity,
         'start_date': start_date.isoformat(),
         'end_date': end_date.isoformat(),
-        'abattoirs_data': abattoirs_data,
-        'total_animals': sum(sum(abattoir[espece] for espece in ['Bovin', 'Ovin', 'Caprin', 'Autre']) for abattoir in abattoirs_data)
+        'results': results,
+        'total_animals': sum(row['nombre'] for row in results)
     })
 
 
@@ -1425,7 +1813,12 @@ def diagnostic_data_consistency(request):
         stabulations__statut='EN_COURS'
     )
     
+    # 5. Corrections que la tâche sync_bete_statuses appliquerait (dry-run)
+    from bete.status_manager import BeteStatusManager
+    reconciliation_diff = BeteStatusManager.reconcile_stabulation_statuses(dry_run=True)
+    
     return Response({
+        'reconciliation_diff': reconciliation_diff,
         'dashboard_method': betes_en_stabulation,
         'stabulation_page_method': betes_dans_stabulations,
         'difference': betes_en_stabulation - betes_dans_stabulations,
@@ -1452,64 +1845,85 @@ def slaughtered_animals_report(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    from bete.models import Bete
-    from abattoir.models import Stabulation
-    from django.db.models import Count, Q
+    from .reports import rapport_abattages
     
-    # 1. Statistiques par statut
-    stats_by_status = Bete.objects.values('statut').annotate(count=Count('id')).order_by('statut')
+    # Version synchrone conservée ; les gros volumes passent par rapports/ (type RAPPORT_ABATTAGES)
+    return Response(rapport_abattages())
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def report_jobs(request):
+    """
+    GET : rapports en arrière-plan de l'utilisateur (50 derniers)
+    POST : soumettre un rapport (type_rapport, format_fichier, parametres), réponse 202 à suivre par son id
+    """
+    from .models import ReportJob
+    from .reports import soumettre
+    from .serializers import ReportJobCreateSerializer, ReportJobSerializer
     
-    # 2. Bêtes abattues détaillées
-    betes_abattues = Bete.objects.filter(statut='ABATTU').select_related('espece', 'abattoir')
+    if request.method == 'GET':
+        jobs = ReportJob.objects.filter(cree_par=request.user)[:50]
+        return Response(ReportJobSerializer(jobs, many=True, context={'request': request}).data)
     
-    # 3. Stabulations terminées avec leurs bêtes
-    stabulations_terminees = Stabulation.objects.filter(statut='TERMINE').select_related('abattoir')
+    serializer = ReportJobCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    stabulations_details = []
-    for stab in stabulations_terminees:
-        betes_in_stab = stab.betes.filter(statut='ABATTU')
-        stabulations_details.append({
-            'stabulation_id': stab.id,
-            'numero_stabulation': stab.numero_stabulation,
-            'abattoir': stab.abattoir.nom,
-            'date_fin': stab.date_fin,
-            'betes_abattues_count': betes_in_stab.count(),
-            'betes_details': [
-                {
-                    'id': bete.id,
-                    'num_boucle': bete.num_boucle,
-                    'num_boucle_post_abattage': bete.num_boucle_post_abattage,
-                    'espece': bete.espece.nom,
-                    'poids_vif': float(bete.poids_vif) if bete.poids_vif else None,
-                    'poids_a_chaud': float(bete.poids_a_chaud) if bete.poids_a_chaud else None,
-                    'poids_a_froid': float(bete.poids_a_froid) if bete.poids_a_froid else None,
-                    'date_abattage': bete.updated_at.isoformat()
-                } for bete in betes_in_stab[:20]  # Limiter à 20 par stabulation
-            ]
-        })
+    if serializer.validated_data['type_rapport'] == 'RAPPORT_ABATTAGES' and not request.user.is_superuser:
+        return Response(
+            {'error': 'Accès non autorisé. Seuls les superusers peuvent accéder à ce rapport.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
     
-    # 4. Statistiques globales
-    total_betes = Bete.objects.count()
-    betes_abattues_count = betes_abattues.count()
-    stabulations_terminees_count = stabulations_terminees.count()
+    job = soumettre(user=request.user, **serializer.validated_data)
+    return Response(ReportJobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+
+def _get_report_job(request, pk):
+    """Rapport visible par l'utilisateur (le sien, ou tous pour un superuser)"""
+    from .models import ReportJob
     
-    return Response({
-        'summary': {
-            'total_betes': total_betes,
-            'betes_abattues': betes_abattues_count,
-            'stabulations_terminees': stabulations_terminees_count,
-            'taux_abattage': round((betes_abattues_count / total_betes * 100), 2) if total_betes > 0 else 0
-        },
-        'stats_by_status': list(stats_by_status),
-        'stabulations_terminees': stabulations_details,
-        'betes_abattues_recentes': [
-            {
-                'id': bete.id,
-                'num_boucle': bete.num_boucle,
-                'espece': bete.espece.nom,
-                'abattoir': bete.abattoir.nom if bete.abattoir else 'N/A',
-                'poids_a_chaud': float(bete.poids_a_chaud) if bete.poids_a_chaud else None,
-                'date_abattage': bete.updated_at.isoformat()
-            } for bete in betes_abattues.order_by('-updated_at')[:50]  # 50 plus récentes
-        ]
-    })
+    jobs = ReportJob.objects.all() if request.user.is_superuser else ReportJob.objects.filter(cree_par=request.user)
+    return jobs.filter(pk=pk).first()
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_job_detail(request, pk):
+    """État d'un rapport en arrière-plan (à interroger jusqu'à TERMINE ou ECHEC)"""
+    from .serializers import ReportJobSerializer
+    
+    job = _get_report_job(request, pk)
+    if job is None:
+        return Response({'error': 'Rapport non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ReportJobSerializer(job, context={'request': request}).data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def report_job_download(request, pk):
+    """Télécharger le fichier d'un rapport terminé"""
+    from django.http import FileResponse
+    from backend.exports import XLSX_CONTENT_TYPE
+    
+    job = _get_report_job(request, pk)
+    if job is None:
+        return Response({'error': 'Rapport non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+    if job.statut != 'TERMINE':
+        return Response(
+            {'error': f"Le rapport n'est pas disponible (statut: {job.get_statut_display()})"},
+            status=status.HTTP_409_CONFLICT
+        )
+    if job.est_expire or not job.fichier:
+        return Response({'error': 'Le rapport a expiré, veuillez le générer à nouveau'}, status=status.HTTP_410_GONE)
+    
+    content_types = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8', 'xlsx': XLSX_CONTENT_TYPE}
+    return FileResponse(
+        job.fichier.open('rb'),
+        as_attachment=True,
+        filename=f'{job.type_rapport.lower()}_{timezone.localtime(job.created_at):%Y%m%d_%H%M}.{job.format_fichier}',
+        content_type=content_types[job.format_fichier]
+    )
+
+
@@ -39,13 +39,13 @@ def ajouter_betes_stabulation(request, pk):
         stabulation.betes.add(*betes)
         
         # Mettre à jour le statut des bêtes
-        betes.update(statut='EN_STABULATION')
+        betes.update_tracked(statut='EN_STABULATION')
         
         return Response({
             'message': f'{len(betes_ids)} bêtes ajoutées avec succès',
             'stabulation': {
                 'id': stabulation.id,
-                'nombre_betes_actuelles': stabulation.betes.count()
+                'nombre_betes_actuelles': stabulation.nombre_betes
             }
         })
         
@@ -91,13 +91,13 @@ def retirer_betes_stabulation(request, pk):
         
         # Remettre les bêtes au statut VIVANT
         from bete.models import Bete
-        Bete.objects.filter(id__in=betes_ids).update(statut='VIVANT')
+        Bete.objects.filter(id__in=betes_ids).update_tracked(statut='VIVANT')
         
         return Response({
             'message': f'{len(betes_ids)} bêtes retirées avec succès',
             'stabulation': {
                 'id': stabulation.id,
-                'nombre_betes_actuelles': stabulation.betes.count()
+                'nombre_betes_actuelles': stabulation.nombre_betes
             }
         })
         
@@ -3,14 +3,75 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Le flux SSE asynchrone des stabulations (abattoir.sse_views.sse_stabulations_stream_async)
+est servi par ce point d'entrée, par exemple :
+
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker --workers 1
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# Flux longue durée à annuler dès que le client se déconnecte
+SSE_PATH_PREFIX = '/api/abattoirs/events/stabulations/'
+
+
+class SSEDisconnectMiddleware:
+    """
+    Annule la requête SSE quand le client ferme la connexion
+
+    Django 4.2 n'écoute pas 'http.disconnect' pendant une réponse en streaming :
+    sans cette annulation, le générateur du flux resterait en vie (et abonné au broker).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(SSE_PATH_PREFIX):
+            return await self.app(scope, receive, send)
+
+        # Lire le corps de la requête avant de confier 'receive' à l'écoute de la déconnexion
+        body_messages = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body_messages.append(message)
+            if not message.get('more_body'):
+                break
+
+        disconnected = asyncio.Event()
+
+        async def app_receive():
+            if body_messages:
+                return body_messages.pop(0)
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        app_task = asyncio.ensure_future(self.app(scope, app_receive, send))
+        disconnect_task = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await asyncio.wait({app_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (app_task, disconnect_task):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(app_task, disconnect_task, return_exceptions=True)
+        if not app_task.cancelled() and app_task.exception() is not None:
+            raise app_task.exception()
+
+
+application = SSEDisconnectMiddleware(get_asgi_application())
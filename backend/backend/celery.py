@@ -26,6 +26,22 @@ app.conf.beat_schedule = {
         'task': 'backend.tasks.send_daily_reports',
         'schedule': 3600.0,  # Toutes les heures
     },
+    'sync-bete-statuses': {
+        'task': 'backend.tasks.sync_bete_statuses',
+        'schedule': 300.0,  # Toutes les 5 minutes
+    },
+    'reconcile-dashboard-counters': {
+        'task': 'backend.tasks.reconcile_dashboard_counters',
+        'schedule': 3600.0,  # Toutes les heures
+    },
+    'refresh-slaughter-rollup': {
+        'task': 'backend.tasks.refresh_slaughter_rollup',
+        'schedule': 86400.0,  # Tous les jours
+    },
+    'cleanup-expired-reports': {
+        'task': 'backend.tasks.cleanup_expired_reports',
+        'schedule': 3600.0,  # Toutes les heures
+    },
 }
 
 app.conf.timezone = 'Africa/Algiers'
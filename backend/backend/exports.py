@@ -0,0 +1,153 @@
+"""
+Exports tabulaires (CSV, XLSX) en flux
+
+Les lignes sont lues par values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE) :
+curseur côté serveur sous PostgreSQL, mémoire constante quel que soit le nombre de lignes.
+
+- CSV  : StreamingHttpResponse, les lignes partent au fil de la lecture du curseur
+- XLSX : classeur openpyxl en écriture seule écrit dans un fichier temporaire, puis
+         envoyé par blocs (un XLSX est une archive zip, complète seulement à la fin)
+
+Chaque colonne est décrite par (en-tête, champ) ou (en-tête, champ, conversion) ;
+la conversion n'est appliquée qu'aux valeurs non nulles.
+"""
+import csv
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import Promise
+from rest_framework import status
+from rest_framework.response import Response
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Limite de lignes d'une feuille Excel (en-tête comprise)
+XLSX_MAX_ROWS = 1048576
+
+# Lignes CSV regroupées par bloc envoyé au client
+CSV_LIGNES_PAR_BLOC = 500
+
+
+def libelle_choix(choices):
+    """Conversion code -> libellé d'un champ à choix"""
+    libelles = dict(choices)
+    return lambda code: libelles.get(code, code)
+
+
+def oui_non(valeur):
+    return 'Oui' if valeur else 'Non'
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : retourne la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+
+def _cellule(valeur, fuseau):
+    """Valeur exportable : libellés traduits en str, dates locales sans fuseau ni microsecondes"""
+    if isinstance(valeur, Promise):
+        return str(valeur)
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = valeur.astimezone(fuseau)
+        # openpyxl refuse les dates avec fuseau
+        return valeur.replace(tzinfo=None, microsecond=0)
+    return valeur
+
+
+def iter_lignes(queryset, colonnes, chunk_size=None):
+    """Lignes converties du queryset, lues par blocs depuis le curseur"""
+    champs = [colonne[1] for colonne in colonnes]
+    conversions = [colonne[2] if len(colonne) > 2 else None for colonne in colonnes]
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    fuseau = timezone.get_current_timezone()
+    # Conversions (libellés traduits, Oui/Non) calculées une fois par valeur distincte
+    caches = [{} for _ in colonnes]
+
+    def convertir(index, valeur):
+        conversion = conversions[index]
+        if conversion is None or valeur is None:
+            return _cellule(valeur, fuseau)
+        cache = caches[index]
+        if valeur not in cache:
+            cache[valeur] = _cellule(conversion(valeur), fuseau)
+        return cache[valeur]
+
+    # Les relations préchargées des vues de liste ne servent pas à un values_list
+    lignes = queryset.prefetch_related(None).values_list(*champs).iterator(chunk_size=chunk_size)
+    for ligne in lignes:
+        yield [convertir(index, valeur) for index, valeur in enumerate(ligne)]
+
+
+def flux_csv(colonnes, lignes):
+    """Fragments CSV (séparateur ';' et BOM UTF-8 pour Excel en français)"""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow([colonne[0] for colonne in colonnes])
+
+    bloc = []
+    for ligne in lignes:
+        bloc.append(writer.writerow(ligne))
+        if len(bloc) >= CSV_LIGNES_PAR_BLOC:
+            yield ''.join(bloc)
+            bloc = []
+    if bloc:
+        yield ''.join(bloc)
+
+
+def fichier_xlsx(titre, colonnes, lignes):
+    """Fichier temporaire contenant le classeur (une feuille de suite au-delà de la limite Excel)"""
+    from openpyxl import Workbook
+
+    classeur = Workbook(write_only=True)
+    entetes = [colonne[0] for colonne in colonnes]
+    feuille, numero_feuille, lignes_feuille = None, 0, XLSX_MAX_ROWS
+    for ligne in lignes:
+        if lignes_feuille >= XLSX_MAX_ROWS:
+            numero_feuille += 1
+            suffixe = f' ({numero_feuille})' if numero_feuille > 1 else ''
+            feuille = classeur.create_sheet(title=f'{titre[:31 - len(suffixe)]}{suffixe}')
+            feuille.append(entetes)
+            lignes_feuille = 1
+        feuille.append(ligne)
+        lignes_feuille += 1
+    if feuille is None:
+        classeur.create_sheet(title=titre[:31]).append(entetes)
+
+    fichier = tempfile.TemporaryFile()
+    classeur.save(fichier)
+    fichier.seek(0)
+    return fichier
+
+
+def export_response(request, queryset, colonnes, nom_fichier, titre):
+    """
+    Réponse d'export du queryset au format demandé par le paramètre fichier (csv par défaut, xlsx)
+    """
+    format_export = request.GET.get('fichier', 'csv').lower()
+    if format_export not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"Format d'export invalide. Formats disponibles: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    nom_fichier = f'{nom_fichier}_{timezone.localdate():%Y%m%d}.{format_export}'
+    lignes = iter_lignes(queryset, colonnes)
+
+    if format_export == 'xlsx':
+        return FileResponse(
+            fichier_xlsx(titre, colonnes, lignes),
+            as_attachment=True,
+            filename=nom_fichier,
+            content_type=XLSX_CONTENT_TYPE
+        )
+
+    response = StreamingHttpResponse(flux_csv(colonnes, lignes), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
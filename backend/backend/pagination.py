@@ -0,0 +1,17 @@
+"""
+Paramètres de pagination (page, page_size) des vues liste
+
+Une seule convention pour toutes les vues paginées :
+- page et page_size doivent être des entiers, sinon 400 (MESSAGE_PAGINATION_INVALIDE)
+- page >= 1, page_size entre 1 et PAGE_SIZE_MAX
+"""
+PAGE_SIZE_MAX = 500
+
+MESSAGE_PAGINATION_INVALIDE = 'page et page_size doivent être des entiers'
+
+
+def lire_pagination(query_params, page_size_defaut=20):
+    """(page, page_size) bornés ; ValueError si l'un des deux n'est pas un entier"""
+    page_size = min(max(int(query_params.get('page_size', page_size_defaut)), 1), PAGE_SIZE_MAX)
+    page = max(int(query_params.get('page', 1)), 1)
+    return page, page_size
@@ -224,6 +224,70 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Exécution des tâches dans le processus appelant, sans worker ni broker (tests, développement)
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+
+# Cache : 'default' local au processus ; 'temperatures' (état glissant des alertes de température,
+# qui doit voir toutes les mesures d'une chambre) partagé via Redis entre les workers si REDIS_URL
+# est défini, sinon local au processus comme SSE_BROKER (développement sans Redis, un seul processus)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'temperatures': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+        'KEY_PREFIX': 'temperatures',
+    } if os.getenv('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'temperatures',
+    },
+}
+
+# Server-Sent Events : broker de diffusion des événements de stabulation
+# InMemoryBroker pour un seul processus, RedisBroker dès qu'il y a plusieurs workers
+SSE_BROKER = {
+    'BACKEND': os.getenv('SSE_BROKER_BACKEND', 'abattoir.sse_broker.InMemoryBroker'),
+    'OPTIONS': {
+        'url': os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+        # Journal rejouable (Last-Event-ID) : événements conservés par abattoir (nombre et durée)
+        'retention_count': int(os.getenv('SSE_EVENT_RETENTION_COUNT', '500')),
+        'retention_seconds': int(os.getenv('SSE_EVENT_RETENTION_SECONDS', '3600')),
+    },
+}
+
+# Numérotation des documents : plage de numéros réservée par processus (1 = une requête par numéro, sans trou)
+DOCUMENT_SEQUENCE_BLOCK_SIZE = int(os.getenv('DOCUMENT_SEQUENCE_BLOCK_SIZE', '1'))
+
+# Notifications : insertion en masse dans la requête (False) ou déléguée à Celery après commit (True)
+NOTIFICATIONS_ASYNC = os.getenv('NOTIFICATIONS_ASYNC', 'False').lower() == 'true'
+
+# Exports CSV/XLSX : lignes lues par blocs depuis un curseur serveur (mémoire constante)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Rapports en arrière-plan : 'celery' (worker), 'thread' (pool local, sans worker) ou 'eager' (tests)
+REPORT_JOBS_EXECUTOR = os.getenv('REPORT_JOBS_EXECUTOR', 'celery')
+REPORT_JOBS_THREADS = int(os.getenv('REPORT_JOBS_THREADS', '2'))
+# Durée de conservation des fichiers générés (MEDIA_ROOT/rapports/)
+REPORT_JOBS_RETENTION_HOURS = int(os.getenv('REPORT_JOBS_RETENTION_HOURS', '24'))
+
+# Températures des chambres froides : taille maximale d'un lot ingéré et lots d'insertion
+TEMPERATURE_BULK_MAX_MESURES = int(os.getenv('TEMPERATURE_BULK_MAX_MESURES', '5000'))
+TEMPERATURE_BULK_BATCH_SIZE = int(os.getenv('TEMPERATURE_BULK_BATCH_SIZE', '1000'))
+
+# Alertes de température : seuils par défaut des chambres froides sans seuil propre,
+# durée de dépassement continue avant alerte et écart de retour à la normale (hystérésis)
+TEMPERATURE_ALERTE_SEUIL_MIN = float(os.getenv('TEMPERATURE_ALERTE_SEUIL_MIN', '-2'))
+TEMPERATURE_ALERTE_SEUIL_MAX = float(os.getenv('TEMPERATURE_ALERTE_SEUIL_MAX', '4'))
+TEMPERATURE_ALERTE_DUREE_SECONDES = int(os.getenv('TEMPERATURE_ALERTE_DUREE_SECONDES', '600'))
+TEMPERATURE_ALERTE_HYSTERESIS = float(os.getenv('TEMPERATURE_ALERTE_HYSTERESIS', '0.5'))
+# Moyenne mobile exponentielle sur environ N mesures
+TEMPERATURE_ALERTE_MOYENNE_MESURES = int(os.getenv('TEMPERATURE_ALERTE_MOYENNE_MESURES', '10'))
+# État glissant par chambre : cache partagé entre les workers gunicorn (alias de CACHES)
+TEMPERATURE_ALERTE_CACHE = os.getenv('TEMPERATURE_ALERTE_CACHE', 'temperatures')
+# Évaluation des seuils après commit : dans la requête (False) ou par une tâche Celery (True)
+# Dans les deux cas, un lot dont une chambre est verrouillée est réessayé par la tâche Celery
+TEMPERATURE_ALERTE_ASYNC = os.getenv('TEMPERATURE_ALERTE_ASYNC', 'False').lower() == 'true'
 
 # Email Configuration
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
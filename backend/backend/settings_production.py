@@ -281,7 +281,27 @@ CACHES = {
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
-    }
+    },
+    # État glissant des alertes de température, partagé entre les workers gunicorn
+    'temperatures': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': get_env_variable('REDIS_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'temperatures',
+    },
+}
+TEMPERATURE_ALERTE_CACHE = 'temperatures'
+# Évaluation des seuils hors des workers gunicorn, par une tâche Celery après commit
+TEMPERATURE_ALERTE_ASYNC = True
+
+# Server-Sent Events : diffusion Redis pub/sub entre les workers gunicorn
+SSE_BROKER = {
+    'BACKEND': 'abattoir.sse_broker.RedisBroker',
+    'OPTIONS': {
+        'url': get_env_variable('REDIS_URL', 'redis://localhost:6379/0'),
+        # Journal rejouable (Last-Event-ID) : événements conservés par abattoir (nombre et durée)
+        'retention_count': int(get_env_variable('SSE_EVENT_RETENTION_COUNT', '500')),
+        'retention_seconds': int(get_env_variable('SSE_EVENT_RETENTION_SECONDS', '3600')),
+    },
 }
 
 # Session configuration
@@ -198,3 +198,116 @@ def process_abattage_completion(abattage_id):
 
 
 
+
+
+@shared_task
+def sync_bete_statuses():
+    """Réalignement périodique des statuts des bêtes sur les stabulations (UPDATE ensemblistes)"""
+    from bete.status_manager import BeteStatusManager
+    
+    try:
+        diff = BeteStatusManager.reconcile_stabulation_statuses()
+        corrected = sum(entry['count'] for entry in diff.values())
+        if corrected:
+            logger.warning(f'{corrected} statut(s) de bêtes réaligné(s): {diff}')
+        return f'{corrected} statut(s) réaligné(s)'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la synchronisation des statuts: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task
+def reconcile_dashboard_counters():
+    """Réconciliation périodique des compteurs du dashboard avec la table des bêtes"""
+    from bete.models import DashboardCounter
+    
+    try:
+        differences = DashboardCounter.reconcile()
+        if differences:
+            logger.warning(f'{len(differences)} compteur(s) du dashboard corrigé(s)')
+        return f'{len(differences)} compteur(s) corrigé(s)'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la réconciliation des compteurs: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task
+def refresh_slaughter_rollup(days=7):
+    """Reconstruire l'agrégat journalier des abattages des derniers jours (poids à froid saisis tardivement)"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from abattoir.models import DailySlaughterRollup
+    
+    try:
+        end_date = timezone.localdate()
+        lignes = DailySlaughterRollup.rebuild(end_date - timedelta(days=days - 1), end_date)
+        return f'{lignes} ligne(s) d\'agrégat reconstruite(s)'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la reconstruction de l\'agrégat des abattages: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task
+def fan_out_notifications(batches):
+    """Insérer en masse les notifications préparées par NotificationService (NOTIFICATIONS_ASYNC)"""
+    from notification.models import Notification
+    
+    try:
+        notifications = Notification.bulk_create_batches(batches)
+        return f'{len(notifications)} notification(s) créée(s)'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la création des notifications: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task(bind=True, max_retries=30)
+def evaluate_temperature_readings(self, lectures, seuils):
+    """
+    Évaluer les seuils d'alerte d'un lot de mesures de température (TEMPERATURE_ALERTE_ASYNC)
+    Réessayé tant qu'une chambre du lot est verrouillée : aucune mesure n'est abandonnée
+    """
+    from abattoir.temperatures import VerrouIndisponible, evaluer_lot
+    
+    try:
+        evaluer_lot(lectures, seuils)
+        return f'{len(lectures)} mesure(s) évaluée(s)'
+        
+    except VerrouIndisponible as e:
+        raise self.retry(exc=e, countdown=1)
+    except Exception as e:
+        logger.error(f'Erreur lors de l\'évaluation des mesures de température: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task
+def generate_report(job_id):
+    """Générer le fichier d'un rapport soumis par l'API rapports/ (REPORT_JOBS_EXECUTOR='celery')"""
+    from abattoir.reports import executer
+    
+    try:
+        job = executer(job_id)
+        if job is None:
+            return f'Rapport {job_id} déjà pris en charge'
+        return f'Rapport {job_id}: {job.statut}'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la génération du rapport {job_id}: {str(e)}')
+        return f'Erreur: {str(e)}'
+
+
+@shared_task
+def cleanup_expired_reports():
+    """Supprimer les rapports expirés et leurs fichiers"""
+    from abattoir.reports import supprimer_rapports_expires
+    
+    try:
+        supprimes = supprimer_rapports_expires()
+        return f'{supprimes} rapport(s) expiré(s) supprimé(s)'
+        
+    except Exception as e:
+        logger.error(f'Erreur lors de la suppression des rapports expirés: {str(e)}')
+        return f'Erreur: {str(e)}'
@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Count, Q
 from django.contrib.admin import SimpleListFilter
-from .models import Espece, Bete
+from .models import Espece, Bete, DashboardCounter
 
 
 class StatutFilter(SimpleListFilter):
@@ -231,3 +231,14 @@ class BeteAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         """Logique de sauvegarde personnalisée"""
         super().save_model(request, obj, form, change)
+
+
+@admin.register(DashboardCounter)
+class DashboardCounterAdmin(admin.ModelAdmin):
+    """Compteurs du dashboard (lecture seule, corrigés par reconcile_dashboard_counters)"""
+    list_display = ['abattoir', 'statut', 'espece', 'nombre', 'updated_at']
+    list_filter = ['statut', 'espece', 'abattoir']
+    readonly_fields = ['abattoir', 'statut', 'espece', 'nombre', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
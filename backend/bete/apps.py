@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BeteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bete'
+    
+    def ready(self):
+        """Enregistrer les signaux quand l'application est prête"""
+        import bete.signals
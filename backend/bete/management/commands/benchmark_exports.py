@@ -0,0 +1,120 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from abattoir.models import Abattoir
+from bete.models import Bete, Espece
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Mesure l\'export des bêtes : pages JSON successives vs CSV/XLSX en flux (annulé en fin de mesure)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--betes',
+            type=int,
+            default=1000000,
+            help='Nombre de bêtes exportées (défaut: 1000000)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Taille des pages JSON de l\'ancien export côté navigateur (défaut: 100)',
+        )
+        parser.add_argument(
+            '--ancien-max',
+            type=int,
+            default=20000,
+            help='Nombre maximal de bêtes exportées par l\'ancien chemin, coût quadratique (défaut: 20000)',
+        )
+        parser.add_argument(
+            '--memoire',
+            action='store_true',
+            help='Mesurer aussi le pic de mémoire Python (tracemalloc, ralentit nettement les mesures)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['betes']
+        # Toutes les données de test sont annulées à la fin
+        with transaction.atomic():
+            self.stdout.write(f'🔧 Génération de {count} bêtes abattues...')
+            self.user = User.objects.create_superuser(
+                username='benchmark_exports', email='benchmark_exports@example.com', password='benchmark'
+            )
+            self.abattoir = Abattoir.objects.create(nom='Abattoir benchmark', wilaya='Alger', commune='Alger')
+            espece, _ = Espece.objects.get_or_create(nom='Bovin')
+            Bete.objects.bulk_create((
+                Bete(
+                    num_boucle=f'BENCH{index:08d}', espece=espece, sexe='M', abattoir=self.abattoir,
+                    statut='ABATTU', poids_vif=450, poids_a_chaud=250, poids_a_froid=240,
+                )
+                for index in range(count)
+            ), batch_size=5000)
+            self.factory = APIRequestFactory()
+
+            ancien = min(count, options['ancien_max'])
+            self.stdout.write('📊 Export des bêtes abattues')
+            for label, function in (
+                (f'Ancien export navigateur (pages JSON de {options["page_size"]}, {ancien} bêtes)',
+                 lambda: self._legacy_export(ancien, options['page_size'])),
+                (f'CSV en flux ({count} bêtes)', lambda: self._export('csv')),
+                (f'XLSX en écriture seule ({count} bêtes)', lambda: self._export('xlsx')),
+            ):
+                elapsed, queries, peak, size = self._measure(function, options['memoire'])
+                memoire = f', pic mémoire {peak / 1024 / 1024:.1f} Mo' if options['memoire'] else ''
+                self.stdout.write(
+                    f'  {label} : {elapsed:.1f} s, {queries} requêtes{memoire}, {size / 1024 / 1024:.1f} Mo produits'
+                )
+            self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+            transaction.set_rollback(True)
+        self.stdout.write('🧹 Données de benchmark annulées')
+
+    def _get(self, view, params):
+        request = self.factory.get('/api/betes/', params)
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def _legacy_export(self, count, page_size):
+        """Reproduit l'export navigateur : toutes les pages de betes_for_livestock gardées en mémoire"""
+        from rest_framework.renderers import JSONRenderer
+        from bete.views import betes_for_livestock
+
+        pages = []
+        for page in range(1, (count + page_size - 1) // page_size + 1):
+            response = self._get(betes_for_livestock, {'statut': 'ABATTU', 'page': page, 'page_size': page_size})
+            pages.append(JSONRenderer().render(response.data))
+        return sum(len(page) for page in pages)
+
+    def _export(self, format_export):
+        from bete.views import export_betes
+
+        response = self._get(export_betes, {'statut': 'ABATTU', 'fichier': format_export})
+        size = 0
+        for fragment in response.streaming_content:
+            size += len(fragment)
+        # Pas de response.close() : il émettrait request_finished et fermerait la connexion
+        return size
+
+    @staticmethod
+    def _measure(function, memoire=False):
+        """Durée, nombre de requêtes SQL, pic de mémoire Python (si demandé) et taille produite d'un appel"""
+        peak = None
+        # Journal des requêtes plein après la génération des données : repartir de zéro
+        reset_queries()
+        if memoire:
+            tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            size = function()
+            elapsed = time.perf_counter() - start
+        if memoire:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return elapsed, len(queries), peak, size
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from bete.models import DashboardCounter
+
+
+class Command(BaseCommand):
+    help = 'Réconcilie les compteurs du dashboard (abattoir × statut × espèce) avec la table des bêtes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les écarts sans corriger les compteurs',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Mode dry-run activé - aucune modification ne sera effectuée'))
+
+        differences = DashboardCounter.reconcile(dry_run=dry_run)
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS('✅ Compteurs du dashboard cohérents'))
+            return
+
+        for (abattoir_id, statut, espece_id), stored, actual in differences:
+            self.stdout.write(
+                f'  ⚠️  Abattoir {abattoir_id} / {statut} / espèce {espece_id} : '
+                f'compteur {stored} -> réel {actual}'
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'🔍 {len(differences)} compteur(s) à corriger'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(differences)} compteur(s) corrigé(s)'))
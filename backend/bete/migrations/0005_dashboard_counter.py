@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-18 00:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_dashboard_counters(apps, schema_editor):
+    """Initialiser les compteurs à partir des bêtes existantes"""
+    Bete = apps.get_model('bete', 'Bete')
+    DashboardCounter = apps.get_model('bete', 'DashboardCounter')
+    rows = Bete.objects.order_by().values('abattoir_id', 'statut', 'espece_id').annotate(nombre=models.Count('id'))
+    DashboardCounter.objects.bulk_create([DashboardCounter(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('abattoir', '0003_historiquestabulation'),
+        ('bete', '0004_make_num_boucle_post_abattage_nullable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('VIVANT', 'Vivant'), ('EN_STABULATION', 'En stabulation'), ('ABATTU', 'Abattu'), ('MORT', 'Mort'), ('VENDU', 'Vendu')], max_length=20, verbose_name='Statut')),
+                ('nombre', models.IntegerField(default=0, verbose_name='Nombre de bêtes')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+                ('abattoir', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to='abattoir.abattoir', verbose_name='Abattoir')),
+                ('espece', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to='bete.espece', verbose_name='Espèce')),
+            ],
+            options={
+                'verbose_name': 'Compteur du dashboard',
+                'verbose_name_plural': 'Compteurs du dashboard',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardcounter',
+            constraint=models.UniqueConstraint(fields=('abattoir', 'statut', 'espece'), name='unique_dashboard_counter'),
+        ),
+        migrations.RunPython(build_dashboard_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bete', '0005_dashboard_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bete',
+            index=models.Index(fields=['abattoir', 'statut', 'created_at', 'id'], name='bete_bete_abattoi_75d799_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-18 02:50
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fusionner_doublons_sans_abattoir(apps, schema_editor):
+    """Regrouper en une ligne les compteurs sans abattoir en double avant de poser la contrainte"""
+    DashboardCounter = apps.get_model('bete', 'DashboardCounter')
+    sans_abattoir = DashboardCounter.objects.filter(abattoir__isnull=True)
+    doublons = (
+        sans_abattoir.order_by().values('statut', 'espece_id')
+        .annotate(lignes=models.Count('id'), total=Sum('nombre'))
+        .filter(lignes__gt=1)
+    )
+    for doublon in doublons:
+        lignes = sans_abattoir.filter(statut=doublon['statut'], espece_id=doublon['espece_id']).order_by('id')
+        conservee = lignes.first()
+        lignes.exclude(pk=conservee.pk).delete()
+        conservee.nombre = doublon['total']
+        conservee.save(update_fields=['nombre'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bete', '0006_bete_livestock_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_doublons_sans_abattoir, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dashboardcounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('abattoir__isnull', True)), fields=('statut', 'espece'), name='unique_dashboard_counter_sans_abattoir'),
+        ),
+    ]
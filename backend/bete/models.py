@@ -1,4 +1,8 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
 from abattoir.models import Abattoir
@@ -24,6 +28,54 @@ class Espece(models.Model):
 
 
 
+# Champs qui déterminent la ligne de compteur d'une bête (abattoir × statut × espèce)
+DASHBOARD_KEY_FIELDS = ('abattoir_id', 'statut', 'espece_id')
+
+
+class BeteQuerySet(models.QuerySet):
+    """QuerySet des bêtes maintenant les compteurs du dashboard lors des UPDATE en masse"""
+
+    def dashboard_groups(self):
+        """Nombre de bêtes par clé de compteur {(abattoir_id, statut, espece_id): nombre}"""
+        rows = self.order_by().values(*DASHBOARD_KEY_FIELDS).annotate(nombre=Count('id'))
+        return {tuple(row[field] for field in DASHBOARD_KEY_FIELDS): row['nombre'] for row in rows}
+
+    def with_active_stabulation(self):
+        """Précharger la stabulation EN_COURS de chaque bête (attribut stabulations_en_cours) en une requête"""
+        from abattoir.models import Stabulation
+        return self.prefetch_related(models.Prefetch(
+            'stabulations',
+            queryset=Stabulation.objects.filter(statut='EN_COURS').select_related('created_by', 'abattoir'),
+            to_attr='stabulations_en_cours'
+        ))
+
+    def update_tracked(self, **fields):
+        """
+        UPDATE en masse qui répercute les changements d'abattoir, de statut ou d'espèce
+        sur DashboardCounter (à utiliser à la place de update() pour ces champs)
+
+        Les lignes sont verrouillées avant le regroupement, puis regroupées et mises à jour
+        par clé primaire : une écriture concurrente ne peut ni modifier leur clé de compteur
+        entre les deux, ni faire entrer dans le filtre une ligne qui n'aurait pas été comptée.
+        """
+        for name in ('abattoir', 'espece'):
+            if name in fields and isinstance(fields[name], models.Model):
+                fields[f'{name}_id'] = fields.pop(name).pk
+        with transaction.atomic():
+            pks = list(self.select_for_update().order_by('pk').values_list('pk', flat=True))
+            locked = self.model._default_manager.filter(pk__in=pks)
+            groups = locked.dashboard_groups()
+            updated = locked.update(**fields)
+            deltas = defaultdict(int)
+            for key, nombre in groups.items():
+                new_key = tuple(fields.get(field, value) for field, value in zip(DASHBOARD_KEY_FIELDS, key))
+                if new_key != key:
+                    deltas[key] -= nombre
+                    deltas[new_key] += nombre
+            DashboardCounter.apply(deltas)
+        return updated
+
+
 class Bete(models.Model):
     """Modèle principal pour les bêtes"""
     
@@ -123,10 +175,16 @@ class Bete(models.Model):
         cascade_delete_history=False,  # Garder l'historique même si la bête est supprimée
     )
     
+    objects = BeteQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('Bête')
         verbose_name_plural = _('Bêtes')
         ordering = ['-created_at']
+        indexes = [
+            # Liste livestock paginée par curseur (-created_at, -id) par abattoir et statut
+            models.Index(fields=['abattoir', 'statut', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.num_boucle} - {self.espece.nom} ({self.get_sexe_display()})"
@@ -135,6 +193,112 @@ class Bete(models.Model):
     def est_vivant(self):
         """Vérifie si la bête est vivante"""
         return self.statut == 'VIVANT'
+    
+    @property
+    def dashboard_key(self):
+        """Clé de compteur du dashboard (abattoir_id, statut, espece_id)"""
+        return tuple(getattr(self, field) for field in DASHBOARD_KEY_FIELDS)
+
+
+class DashboardCounter(models.Model):
+    """
+    Compteur matérialisé des bêtes par abattoir, statut et espèce
+    Maintenu de façon incrémentale (création, changements de statut, transferts)
+    et réconcilié périodiquement par la commande reconcile_dashboard_counters.
+    """
+    
+    abattoir = models.ForeignKey(
+        'abattoir.Abattoir',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='dashboard_counters',
+        verbose_name=_('Abattoir')
+    )
+    statut = models.CharField(max_length=20, choices=Bete.STATUT_CHOICES, verbose_name=_('Statut'))
+    espece = models.ForeignKey(
+        Espece,
+        on_delete=models.CASCADE,
+        related_name='dashboard_counters',
+        verbose_name=_('Espèce')
+    )
+    nombre = models.IntegerField(default=0, verbose_name=_('Nombre de bêtes'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Date de mise à jour'))
+    
+    class Meta:
+        verbose_name = _('Compteur du dashboard')
+        verbose_name_plural = _('Compteurs du dashboard')
+        constraints = [
+            models.UniqueConstraint(fields=['abattoir', 'statut', 'espece'], name='unique_dashboard_counter'),
+            # NULL n'étant jamais égal à NULL, la contrainte ci-dessus ne couvre pas les bêtes sans abattoir
+            models.UniqueConstraint(
+                fields=['statut', 'espece'],
+                condition=Q(abattoir__isnull=True),
+                name='unique_dashboard_counter_sans_abattoir'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.abattoir_id} - {self.statut} - {self.espece_id}: {self.nombre}"
+    
+    @classmethod
+    def apply(cls, deltas):
+        """Appliquer des variations {(abattoir_id, statut, espece_id): delta} par UPDATE atomique"""
+        for (abattoir_id, statut, espece_id), delta in deltas.items():
+            if not delta or espece_id is None:
+                continue
+            counters = cls.objects.filter(abattoir_id=abattoir_id, statut=statut, espece_id=espece_id)
+            if counters.update(nombre=F('nombre') + delta, updated_at=timezone.now()) or delta < 0:
+                # Une variation négative sans ligne sera corrigée par la réconciliation
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(abattoir_id=abattoir_id, statut=statut, espece_id=espece_id, nombre=delta)
+            except IntegrityError:
+                # Ligne créée entre-temps par une autre transaction
+                counters.update(nombre=F('nombre') + delta, updated_at=timezone.now())
+    
+    @classmethod
+    def totals(cls, abattoir=None):
+        """Totaux par statut et par espèce (abattoir=None : tous les abattoirs)"""
+        counters = cls.objects.filter(nombre__gt=0)
+        if abattoir is not None:
+            counters = counters.filter(abattoir=abattoir)
+        par_statut = defaultdict(int)
+        par_espece = defaultdict(int)
+        for statut, espece_nom, nombre in counters.values_list('statut', 'espece__nom', 'nombre'):
+            par_statut[statut] += nombre
+            par_espece[espece_nom] += nombre
+        return {
+            'total': sum(par_statut.values()),
+            'par_statut': dict(par_statut),
+            'par_espece': dict(par_espece),
+        }
+    
+    @classmethod
+    def reconcile(cls, dry_run=False):
+        """
+        Recalculer les compteurs à partir de la table des bêtes (une requête GROUP BY)
+        Retourne la liste des écarts [(clé, compteur, réel)]
+        """
+        actual = Bete.objects.dashboard_groups()
+        stored = defaultdict(int)
+        for abattoir_id, statut, espece_id, nombre in cls.objects.values_list(
+            'abattoir_id', 'statut', 'espece_id', 'nombre'
+        ):
+            stored[(abattoir_id, statut, espece_id)] += nombre
+        differences = [
+            (key, stored.get(key, 0), actual.get(key, 0))
+            for key in sorted(set(actual) | set(stored), key=str)
+            if stored.get(key, 0) != actual.get(key, 0)
+        ]
+        if differences and not dry_run:
+            with transaction.atomic():
+                for (abattoir_id, statut, espece_id), _, nombre in differences:
+                    cls.objects.filter(abattoir_id=abattoir_id, statut=statut, espece_id=espece_id).delete()
+                    if nombre:
+                        cls.objects.create(abattoir_id=abattoir_id, statut=statut, espece_id=espece_id, nombre=nombre)
+        return differences
 
 
 # Temporairement commenté car l'app 'transfert' n'existe pas
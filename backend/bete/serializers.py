@@ -42,10 +42,16 @@ class BeteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_stabulation_info(self, obj):
-        """Récupère les informations de stabulation si la bête est en stabulation"""
+        """
+        Récupère les informations de stabulation si la bête est en stabulation
+        Utiliser Bete.objects.with_active_stabulation() pour les listes (une requête pour la page)
+        """
         if obj.statut == 'EN_STABULATION':
             # Récupérer la stabulation active de cette bête
-            stabulation = obj.stabulations.filter(statut='EN_COURS').first()
+            if hasattr(obj, 'stabulations_en_cours'):
+                stabulation = obj.stabulations_en_cours[0] if obj.stabulations_en_cours else None
+            else:
+                stabulation = obj.stabulations.filter(statut='EN_COURS').select_related('created_by', 'abattoir').first()
             if stabulation:
                 return {
                     'id': stabulation.id,
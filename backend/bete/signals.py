@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import DASHBOARD_KEY_FIELDS, Bete, DashboardCounter
+
+
+@receiver(post_init, sender=Bete)
+def remember_dashboard_key(sender, instance, **kwargs):
+    """Mémorise la clé de compteur chargée depuis la base (sans déclencher de champ différé)"""
+    loaded = instance.pk is not None and all(field in instance.__dict__ for field in DASHBOARD_KEY_FIELDS)
+    instance._dashboard_key = instance.dashboard_key if loaded else None
+
+
+@receiver(pre_save, sender=Bete)
+def load_dashboard_key(sender, instance, raw=False, **kwargs):
+    """Relit la clé d'origine si l'instance a été chargée avec des champs différés"""
+    if raw or instance._state.adding or instance._dashboard_key is not None:
+        return
+    values = Bete.objects.filter(pk=instance.pk).values_list(*DASHBOARD_KEY_FIELDS).first()
+    instance._dashboard_key = tuple(values) if values else None
+
+
+@receiver(post_save, sender=Bete)
+def update_dashboard_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Répercute la création ou le changement d'abattoir/statut/espèce sur les compteurs"""
+    if raw:
+        return
+    old_key = None if created else instance._dashboard_key
+    new_key = instance.dashboard_key
+    if old_key != new_key:
+        deltas = defaultdict(int)
+        if old_key is not None:
+            deltas[old_key] -= 1
+        deltas[new_key] += 1
+        DashboardCounter.apply(deltas)
+    instance._dashboard_key = new_key
+
+
+@receiver(post_delete, sender=Bete)
+def update_dashboard_counters_on_delete(sender, instance, **kwargs):
+    """Décrémente le compteur de la bête supprimée"""
+    DashboardCounter.apply({instance._dashboard_key or instance.dashboard_key: -1})
@@ -81,7 +81,8 @@ class BeteStatusManager:
                 }
             
             # Effectuer le changement
-            updated_count = betes.filter(id__in=[b.id for b in valid_betes]).update(
+            # update_tracked maintient les compteurs du dashboard (DashboardCounter)
+            updated_count = betes.filter(id__in=[b.id for b in valid_betes]).update_tracked(
                 statut=new_status,
                 updated_at=timezone.now()
             )
@@ -103,6 +104,39 @@ class BeteStatusManager:
             logger.error(f"Erreur lors du changement de statut: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @classmethod
+    def bulk_change_status(cls, bete_ids, new_status: str, reason: str = None, user=None) -> dict:
+        """
+        Change le statut de bêtes en un seul UPDATE, sans les charger
+        
+        Seules les bêtes dont le statut actuel autorise la transition sont modifiées :
+        l'appelant compare updated_count au nombre attendu pour détecter les autres.
+        
+        Args:
+            bete_ids: Liste (ou sous-requête) des IDs des bêtes à modifier
+            new_status: Nouveau statut
+        """
+        if new_status not in cls.VALID_STATUSES:
+            return {'success': False, 'error': f'Statut invalide: {new_status}'}
+        
+        sources = [statut for statut, cibles in cls.ALLOWED_TRANSITIONS.items() if new_status in cibles]
+        updated_count = Bete.objects.filter(id__in=bete_ids, statut__in=sources).update_tracked(
+            statut=new_status,
+            updated_at=timezone.now()
+        )
+        
+        logger.info(
+            f"Changement de statut en masse: {updated_count} bêtes -> {new_status} "
+            f"(Raison: {reason}, User: {user})"
+        )
+        
+        return {
+            'success': True,
+            'updated_count': updated_count,
+            'new_status': new_status,
+            'reason': reason
+        }
+    
     @classmethod
     def finalize_stabulation_betes(cls, stabulation_id: int, user=None) -> dict:
         """
@@ -180,3 +214,44 @@ class BeteStatusManager:
             reason='Retrait de stabulation',
             user=user
         )
+    
+    @classmethod
+    def reconcile_stabulation_statuses(cls, dry_run: bool = False, sample_size: int = 10) -> dict:
+        """
+        Réaligne les statuts des bêtes sur les stabulations, en UPDATE ensemblistes
+        
+        - VIVANT dans une stabulation EN_COURS -> EN_STABULATION
+        - EN_STABULATION hors de toute stabulation EN_COURS (annulée, orpheline) -> VIVANT
+        
+        Les bêtes des stabulations TERMINE (ABATTU) ne sont jamais touchées.
+        Chaque règle est un seul UPDATE ... WHERE id IN (sous-requête).
+        
+        Returns:
+            dict: {règle: {'count', 'sample_ids'}} ; rien n'est modifié si dry_run
+        """
+        from abattoir.models import Stabulation
+        
+        betes_en_cours = Stabulation.betes.through.objects.filter(
+            stabulation__statut='EN_COURS'
+        ).values('bete_id')
+        rules = {
+            'VIVANT->EN_STABULATION': (
+                Bete.objects.filter(statut='VIVANT', id__in=betes_en_cours), 'EN_STABULATION'
+            ),
+            'EN_STABULATION->VIVANT': (
+                Bete.objects.filter(statut='EN_STABULATION').exclude(id__in=betes_en_cours), 'VIVANT'
+            ),
+        }
+        
+        diff = {}
+        with transaction.atomic():
+            for rule, (betes, new_status) in rules.items():
+                sample_ids = list(betes.order_by('id').values_list('id', flat=True)[:sample_size])
+                count = betes.count() if len(sample_ids) == sample_size else len(sample_ids)
+                if count and not dry_run:
+                    count = betes.update_tracked(statut=new_status, updated_at=timezone.now())
+                diff[rule] = {'count': count, 'sample_ids': sample_ids}
+        
+        if not dry_run and any(entry['count'] for entry in diff.values()):
+            logger.info(f"Réconciliation des statuts: {diff}")
+        return diff
@@ -1,3 +1,280 @@
+import csv
+import io
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django.utils import timezone
+
+from abattoir.models import Abattoir
+from abattoir.testing import AbattoirFixturesMixin
+
+from .models import Bete, DashboardCounter
+from .status_manager import BeteStatusManager
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+class DashboardCounterTest(AbattoirFixturesMixin, TestCase):
+    """Compteurs matérialisés abattoir × statut × espèce"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self.autre_abattoir = Abattoir.objects.create(nom='Abattoir B', wilaya='Oran', commune='Oran')
+        self.betes = self._betes(3)
+
+    def _count(self, abattoir, statut):
+        return DashboardCounter.totals(abattoir)['par_statut'].get(statut, 0)
+
+    def test_creation_increments_counter(self):
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 3)
+        self.assertEqual(DashboardCounter.totals()['par_espece'], {'Bovin': 3})
+
+    def test_change_status_moves_counts(self):
+        result = BeteStatusManager.change_status([bete.id for bete in self.betes[:2]], 'EN_STABULATION')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 1)
+        self.assertEqual(self._count(self.abattoir, 'EN_STABULATION'), 2)
+
+    def test_save_with_new_abattoir_moves_counts(self):
+        bete = Bete.objects.get(pk=self.betes[0].pk)
+        bete.abattoir = self.autre_abattoir
+        bete.save()
+
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 2)
+        self.assertEqual(self._count(self.autre_abattoir, 'VIVANT'), 1)
+
+    def test_deferred_instance_save_uses_stored_key(self):
+        bete = Bete.objects.only('id', 'num_boucle').get(pk=self.betes[0].pk)
+        bete.statut = 'MORT'
+        bete.save()
+
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 2)
+        self.assertEqual(self._count(self.abattoir, 'MORT'), 1)
+
+    def test_delete_decrements_counter(self):
+        self.betes[0].delete()
+
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 2)
+
+    def test_update_tracked_groups_and_updates_the_locked_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            updated = Bete.objects.filter(statut='VIVANT', pk__in=[b.pk for b in self.betes[:2]]).update_tracked(
+                statut='ABATTU'
+            )
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 1)
+        self.assertEqual(self._count(self.abattoir, 'ABATTU'), 2)
+        # Le filtre d'origine n'est évalué qu'une fois, au verrouillage ; la suite cible les clés primaires
+        bete_queries = [q['sql'] for q in queries if '"bete_bete"' in q['sql']]
+        self.assertEqual(sum('"bete_bete"."statut" = ' in sql for sql in bete_queries), 1)
+        self.assertEqual(DashboardCounter.reconcile(dry_run=True), [])
+
+    def test_counter_without_abattoir_is_unique(self):
+        DashboardCounter.apply({(None, 'VIVANT', self.espece.id): 1})
+        DashboardCounter.apply({(None, 'VIVANT', self.espece.id): 2})
+
+        self.assertEqual(
+            list(DashboardCounter.objects.filter(abattoir__isnull=True).values_list('nombre', flat=True)), [3]
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DashboardCounter.objects.create(abattoir=None, statut='VIVANT', espece=self.espece, nombre=1)
+
+    def test_reconcile_repairs_drift(self):
+        # UPDATE direct qui contourne les compteurs
+        Bete.objects.filter(pk=self.betes[0].pk).update(statut='VENDU')
+
+        self.assertEqual(len(DashboardCounter.reconcile(dry_run=True)), 2)
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 3)
+
+        call_command('reconcile_dashboard_counters', stdout=io.StringIO())
+
+        self.assertEqual(self._count(self.abattoir, 'VIVANT'), 2)
+        self.assertEqual(self._count(self.abattoir, 'VENDU'), 1)
+        self.assertEqual(DashboardCounter.reconcile(dry_run=True), [])
+
+
+class ReconcileStabulationStatusesTest(AbattoirFixturesMixin, TestCase):
+    """Réalignement ensembliste des statuts des bêtes sur les stabulations"""
+
+    def setUp(self):
+        super().setUp()
+        self.betes = {
+            statut: self._betes(1, sexe='F', statut=statut)[0] for statut in ('VIVANT', 'EN_STABULATION', 'ABATTU')
+        }
+        self.en_cours = self._stabulation([self.betes['VIVANT']])
+        self._stabulation([self.betes['EN_STABULATION']], statut='ANNULE')
+        self._stabulation([self.betes['ABATTU']], statut='TERMINE')
+
+    def test_dry_run_reports_without_writing(self):
+        diff = BeteStatusManager.reconcile_stabulation_statuses(dry_run=True)
+
+        self.assertEqual(diff['VIVANT->EN_STABULATION']['sample_ids'], [self.betes['VIVANT'].id])
+        self.assertEqual(diff['EN_STABULATION->VIVANT']['sample_ids'], [self.betes['EN_STABULATION'].id])
+        self.assertEqual(Bete.objects.get(pk=self.betes['VIVANT'].pk).statut, 'VIVANT')
+
+    def test_reconcile_fixes_statuses_and_keeps_slaughtered(self):
+        with CaptureQueriesContext(connection) as queries:
+            BeteStatusManager.reconcile_stabulation_statuses()
+
+        # Un seul UPDATE de la table des bêtes par règle, quel que soit le nombre de stabulations
+        bete_updates = [query for query in queries if query['sql'].startswith('UPDATE "bete_bete"')]
+        self.assertEqual(len(bete_updates), 2)
+
+        statuts = dict(Bete.objects.values_list('id', 'statut'))
+        self.assertEqual(statuts, {
+            self.betes['VIVANT'].id: 'EN_STABULATION',
+            self.betes['EN_STABULATION'].id: 'VIVANT',
+            self.betes['ABATTU'].id: 'ABATTU',
+        })
+        self.assertEqual(DashboardCounter.reconcile(dry_run=True), [])
+
+
+class LivestockCursorPaginationTest(AbattoirFixturesMixin, TestCase):
+    """Pagination par curseur de la page livestock"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self._betes(25, poids_vif=100)
+        # Égalités de created_at : départagées par l'identifiant
+        Bete.objects.filter(id__in=list(Bete.objects.values_list('id', flat=True)[:10])).update(
+            created_at=timezone.now()
+        )
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/betes/livestock/', dict(params, page_size=10))
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_cursor_walks_every_row_once_at_constant_cost(self):
+        first, first_queries = self._get(cursor='')
+        second, deep_queries = self._get(cursor=first['pagination']['next_cursor'])
+        last, _ = self._get(cursor=second['pagination']['next_cursor'])
+
+        ids = [bete['id'] for page in (first, second, last) for bete in page['betes']]
+        self.assertEqual(sorted(ids), sorted(Bete.objects.values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertFalse(last['pagination']['has_next'])
+        # Statistiques uniquement sur la première page
+        self.assertEqual(first['statistics']['total_count'], 25)
+        self.assertNotIn('statistics', second)
+        self.assertLess(deep_queries, first_queries)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/betes/livestock/', {'cursor': 'pas-un-curseur'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagination_parameters_are_validated_and_clamped(self):
+        for params in ({'page_size': 'abc'}, {'page': 'abc'}, {'cursor': '', 'page_size': 'abc'}):
+            response = self.client.get('/api/betes/livestock/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.data['error'], 'page et page_size doivent être des entiers')
+
+        for page_size in ('0', '-5'):
+            response = self.client.get('/api/betes/livestock/', {'cursor': '', 'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['pagination']['page_size'], 1)
+            self.assertEqual(len(response.data['betes']), 1)
+
+        response = self.client.get('/api/betes/livestock/', {'page': '0', 'page_size': '100000'})
+        self.assertEqual(response.data['pagination']['page'], 1)
+        self.assertEqual(response.data['pagination']['page_size'], 500)
+        self.assertEqual(len(response.data['betes']), 25)
+
+    def test_statistics_endpoint(self):
+        response = self.client.get('/api/betes/livestock/statistics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['statistics']['live_count'], 25)
+        self.assertEqual(response.data['statistics']['total_weight'], 2500.0)
+        self.assertIn('max-age=30', response['Cache-Control'])
+
+
+class BeteStabulationInfoTest(AbattoirFixturesMixin, TestCase):
+    """stabulation_info résolu pour toute la page en une requête"""
+
+    def _get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/betes/livestock/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_query_count_is_constant_on_a_100_row_page(self):
+        self._stabulation(self._betes(5, statut='EN_STABULATION'), created_by=self.user)
+        _, queries_few = self._get()
+        for _ in range(5):
+            self._stabulation(self._betes(19, statut='EN_STABULATION'), created_by=self.user)
+        data, queries_page = self._get()
+
+        self.assertEqual(len(data['betes']), 100)
+        self.assertEqual(queries_few, queries_page)
+        info = data['betes'][0]['stabulation_info']
+        self.assertEqual(info['statut'], 'EN_COURS')
+        self.assertEqual(info['abattoir_nom'], 'Abattoir A')
+
+
+class BeteExportTest(AbattoirFixturesMixin, TestCase):
+    """Export CSV/XLSX en flux des bêtes"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        # Export restreint à l'abattoir de l'utilisateur
+        self.client.force_authenticate(self._agent())
+        self._betes(30, statut='ABATTU', poids_a_chaud='180.50')
+        self._betes(5, statut='VIVANT')
+        self._betes(5, abattoir=Abattoir.objects.create(nom='Abattoir B', wilaya='Oran', commune='Oran'), statut='ABATTU')
+
+    def _csv(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/betes/export/', params)
+            content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(io.StringIO(content), delimiter=';')), len(queries)
+
+    def test_csv_applies_livestock_filters_and_scope(self):
+        lignes, _ = self._csv(statut='ABATTU')
+
+        self.assertEqual(lignes[0][:3], ['N° boucle', 'N° boucle post-abattage', 'Espèce'])
+        self.assertEqual(len(lignes), 31)
+        self.assertEqual({ligne[10] for ligne in lignes[1:]}, {'Abattoir A'})
+        self.assertEqual({ligne[7] for ligne in lignes[1:]}, {'Abattu'})
+        self.assertEqual(lignes[1][5], '180.50')
+
+    def test_csv_query_count_is_constant_in_row_count(self):
+        few, queries_few = self._csv(statut='VIVANT')
+        many, queries_many = self._csv(statut='ABATTU')
+
+        self.assertEqual((len(few), len(many)), (6, 31))
+        self.assertEqual(queries_few, queries_many)
+
+    @skipUnless(openpyxl, 'openpyxl non installé')
+    def test_xlsx_workbook(self):
+        response = self.client.get('/api/betes/export/', {'statut': 'ABATTU', 'fichier': 'xlsx'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('betes_', response['Content-Disposition'])
+        classeur = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        lignes = list(classeur['Bêtes'].iter_rows(values_only=True))
+        self.assertEqual(len(lignes), 31)
+        self.assertEqual(lignes[1][10], 'Abattoir A')
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/api/betes/export/', {'fichier': 'pdf'})
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
@@ -15,6 +15,8 @@ urlpatterns = [
     path('<int:pk>/', views.BeteDetailView.as_view(), name='bete-detail'),
     path('<int:pk>/history/', views.bete_history, name='bete-history'),
     path('livestock/', views.betes_for_livestock, name='betes-for-livestock'),
+    path('livestock/statistics/', views.livestock_statistics, name='livestock-statistics'),
+    path('export/', views.export_betes, name='bete-export'),
     path('carcass-statistics/', views.carcass_statistics, name='carcass-statistics'),
 
 ]
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db.models import Q, Count, Avg
 from django.db import transaction
+from backend.exports import export_response, libelle_choix, oui_non
 from .models import Espece, Bete
 from .serializers import (
     EspeceSerializer, BeteCreateSerializer, BeteSerializer, BeteHistorySerializer
@@ -86,10 +87,8 @@ class BeteDetailView(generics.RetrieveUpdateDestroyAPIView):
         return BeteSerializer
 
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def betes_for_livestock(request):
-    """Récupérer les bêtes pour la page livestock selon le type d'utilisateur"""
+def _livestock_queryset(request):
+    """Bêtes visibles par l'utilisateur sur la page livestock, filtres de la requête appliqués"""
     user = request.user
     
     # Base queryset
@@ -123,14 +122,10 @@ def betes_for_livestock(request):
     if espece_id:
         queryset = queryset.filter(espece_id=espece_id)
     
-    # Filtrage par nom d'espèce
+    # Filtrage par nom d'espèce (insensible à la casse avec correspondance exacte)
     espece_nom = request.query_params.get('espece_nom', None)
     if espece_nom:
-        # Debug: afficher le filtre appliqué
-        print(f"Debug - Filtre espece_nom appliqué: '{espece_nom}'")
-        # Filtrage insensible à la casse avec correspondance exacte
         queryset = queryset.filter(espece__nom__iexact=espece_nom)
-        print(f"Debug - Queryset count après filtre espèce: {queryset.count()}")
     
     # Filtrage par état de santé
     etat_sante = request.query_params.get('etat_sante', None)
@@ -153,32 +148,23 @@ def betes_for_livestock(request):
             Q(abattoir__nom__icontains=search)
         )
     
-    # Pagination
-    page_size = int(request.query_params.get('page_size', 20))
-    page = int(request.query_params.get('page', 1))
-    
-    start = (page - 1) * page_size
-    end = start + page_size
-    
-    betes = queryset.order_by('-created_at')[start:end]
-    
-    # Sérialisation
-    serializer = BeteSerializer(betes, many=True)
-    
-    # Statistiques
-    total_count = queryset.count()
-    live_count = queryset.filter(statut__in=['VIVANT', 'EN_STABULATION']).count()
-    carcass_count = queryset.filter(statut='ABATTU').count()
-    
-    # Statistiques de poids
-    from django.db.models import Sum, Avg
-    weight_stats = queryset.aggregate(
+    return queryset
+
+
+def _livestock_statistics(queryset):
+    """Statistiques de la page livestock : un agrégat conditionnel et un GROUP BY espèce"""
+    from django.db.models import Sum, Case, When, Value, CharField
+    
+    queryset = queryset.order_by()
+    stats = queryset.aggregate(
+        total_count=Count('id'),
+        live_count=Count('id', filter=Q(statut__in=['VIVANT', 'EN_STABULATION'])),
+        carcass_count=Count('id', filter=Q(statut='ABATTU')),
         total_weight=Sum('poids_vif'),
         average_weight=Avg('poids_vif')
     )
     
     # Statistiques par espèce (grouper par nom normalisé)
-    from django.db.models import Case, When, Value, CharField
     especes_stats = queryset.annotate(
         espece_nom_normalized=Case(
             When(espece__nom__iexact='ovin', then=Value('OVIN')),
@@ -191,6 +177,94 @@ def betes_for_livestock(request):
         count=Count('id')
     ).order_by('-count')
     
+    return {
+        'total_count': stats['total_count'],
+        'live_count': stats['live_count'],
+        'carcass_count': stats['carcass_count'],
+        'total_weight': float(stats['total_weight'] or 0),
+        'average_weight': float(stats['average_weight'] or 0),
+        'especes_stats': [{'espece__nom': item['espece_nom_normalized'], 'count': item['count']} for item in especes_stats]
+    }
+
+
+def _encode_livestock_cursor(bete):
+    """Curseur opaque sur la clé de tri (-created_at, -id)"""
+    import base64
+    return base64.urlsafe_b64encode(f'{bete.created_at.isoformat()}|{bete.id}'.encode()).decode()
+
+
+def _decode_livestock_cursor(cursor):
+    """(created_at, id) d'un curseur, ou ValueError"""
+    import base64
+    import binascii
+    from datetime import datetime
+    try:
+        created_at, bete_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(bete_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def betes_for_livestock(request):
+    """
+    Récupérer les bêtes pour la page livestock selon le type d'utilisateur
+    
+    Pagination par page (page, page_size) ou, si le paramètre cursor est présent,
+    par curseur sur (-created_at, -id) : le coût d'une page profonde est celui de la première.
+    En mode curseur, les statistiques ne sont calculées que pour la première page
+    (voir aussi livestock/statistics/).
+    """
+    user = request.user
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE, lire_pagination
+    try:
+        page, page_size = lire_pagination(request.query_params)
+    except ValueError:
+        return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = _livestock_queryset(request)
+    
+    if 'cursor' in request.query_params:
+        # Pagination par curseur (keyset)
+        cursor = request.query_params.get('cursor')
+        betes = queryset.with_active_stabulation().order_by('-created_at', '-id')
+        if cursor:
+            try:
+                created_at, bete_id = _decode_livestock_cursor(cursor)
+            except ValueError:
+                return Response({'error': 'Curseur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            betes = betes.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=bete_id))
+        betes = list(betes[:page_size + 1])
+        has_next = len(betes) > page_size
+        betes = betes[:page_size]
+        
+        response_data = {
+            'betes': BeteSerializer(betes, many=True).data,
+            'pagination': {
+                'page_size': page_size,
+                'cursor': cursor or None,
+                'next_cursor': _encode_livestock_cursor(betes[-1]) if has_next else None,
+                'has_next': has_next
+            },
+            'user_type': 'superuser' if user.is_superuser else 'regular',
+            'abattoir_name': user.abattoir.nom if user.abattoir else 'Tous les abattoirs'
+        }
+        if not cursor:
+            response_data['statistics'] = _livestock_statistics(queryset)
+        return Response(response_data)
+    
+    # Pagination par page
+    start = (page - 1) * page_size
+    end = start + page_size
+    
+    betes = queryset.with_active_stabulation().order_by('-created_at', '-id')[start:end]
+    
+    # Sérialisation
+    serializer = BeteSerializer(betes, many=True)
+    
+    # Statistiques
+    statistics = _livestock_statistics(queryset)
+    total_count = statistics['total_count']
     
     return Response({
         'betes': serializer.data,
@@ -202,19 +276,52 @@ def betes_for_livestock(request):
             'has_next': end < total_count,
             'has_previous': page > 1
         },
-        'statistics': {
-            'total_count': total_count,
-            'live_count': live_count,
-            'carcass_count': carcass_count,
-            'total_weight': float(weight_stats['total_weight'] or 0),
-            'average_weight': float(weight_stats['average_weight'] or 0),
-            'especes_stats': [{'espece__nom': item['espece_nom_normalized'], 'count': item['count']} for item in especes_stats]
-        },
+        'statistics': statistics,
         'user_type': 'superuser' if user.is_superuser else 'regular',
         'abattoir_name': user.abattoir.nom if user.abattoir else 'Tous les abattoirs'
     })
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def livestock_statistics(request):
+    """Statistiques de la page livestock (mêmes filtres que betes_for_livestock), cachables côté client"""
+    from django.utils.cache import patch_cache_control
+    
+    response = Response({'statistics': _livestock_statistics(_livestock_queryset(request))})
+    patch_cache_control(response, private=True, max_age=30)
+    return response
+
+
+BETE_EXPORT_COLONNES = [
+    ('N° boucle', 'num_boucle'),
+    ('N° boucle post-abattage', 'num_boucle_post_abattage'),
+    ('Espèce', 'espece__nom'),
+    ('Sexe', 'sexe', libelle_choix(Bete.SEXE_CHOICES)),
+    ('Poids vif (kg)', 'poids_vif'),
+    ('Poids à chaud (kg)', 'poids_a_chaud'),
+    ('Poids à froid (kg)', 'poids_a_froid'),
+    ('Statut', 'statut', libelle_choix(Bete.STATUT_CHOICES)),
+    ('État de santé', 'etat_sante', libelle_choix(Bete.SANTE_CHOICES)),
+    ('Abattage d\'urgence', 'abattage_urgence', oui_non),
+    ('Abattoir', 'abattoir__nom'),
+    ('Client', 'client__nom'),
+    ('Créé par', 'created_by__username'),
+    ('Date de création', 'created_at'),
+]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_betes(request):
+    """
+    Export CSV (par défaut) ou XLSX (?fichier=xlsx) des bêtes, mêmes filtres que betes_for_livestock
+    Les carcasses s'exportent avec statut=ABATTU.
+    """
+    queryset = _livestock_queryset(request).order_by('-created_at', '-id')
+    return export_response(request, queryset, BETE_EXPORT_COLONNES, 'betes', 'Bêtes')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def carcass_statistics(request):
@@ -327,8 +434,11 @@ def bete_history(request, pk):
     history_records = bete.history.all().order_by('-history_date')
     
     # Pagination
-    page = int(request.query_params.get('page', 1))
-    page_size = int(request.query_params.get('page_size', 20))
+    from backend.pagination import MESSAGE_PAGINATION_INVALIDE, lire_pagination
+    try:
+        page, page_size = lire_pagination(request.query_params)
+    except ValueError:
+        return Response({'error': MESSAGE_PAGINATION_INVALIDE}, status=status.HTTP_400_BAD_REQUEST)
     start = (page - 1) * page_size
     end = start + page_size
     
@@ -175,27 +175,9 @@ class BonDeCommande(models.Model):
         return f"{self.numero_bon} - {self.client.nom} ({self.get_statut_display()})"
     
     def generate_numero_bon(self):
-        """Génère un numéro unique pour le bon de commande"""
-        from datetime import datetime
-        
-        # Format: BC-YYYYMMDD-HHMMSS-XXX
-        now = datetime.now()
-        date_str = now.strftime('%Y%m%d')
-        time_str = now.strftime('%H%M%S')
-        
-        # Compter les bons existants aujourd'hui
-        count = BonDeCommande.objects.filter(
-            created_at__date=now.date()
-        ).count() + 1
-        
-        numero = f"BC-{date_str}-{time_str}-{count:03d}"
-        
-        # Vérifier l'unicité
-        while BonDeCommande.objects.filter(numero_bon=numero).exists():
-            count += 1
-            numero = f"BC-{date_str}-{time_str}-{count:03d}"
-        
-        return numero
+        """Génère un numéro unique pour le bon de commande (format BC-AAAAMMJJ-NNNNN)"""
+        from abattoir.sequences import next_document_number
+        return next_document_number('BC')
     
     def save(self, *args, **kwargs):
         # Générer le numéro si c'est une nouvelle instance
@@ -7,6 +7,7 @@ urlpatterns = [
     # CRUD basique
     path('', views.BonDeCommandeListCreateView.as_view(), name='bon-list-create'),
     path('<int:pk>/', views.BonDeCommandeDetailView.as_view(), name='bon-detail'),
+    path('export/', views.export_bons, name='bon-export'),
     
     # Actions spécifiques
     path('<int:pk>/update-status/', views.update_bon_status, name='bon-update-status'),
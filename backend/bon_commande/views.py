@@ -2,6 +2,7 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db.models import Q, Count, Sum
+from backend.exports import export_response, libelle_choix, oui_non
 from .models import BonDeCommande
 from .serializers import (
     BonDeCommandeSerializer,
@@ -10,6 +11,42 @@ from .serializers import (
 )
 
 
+def _bons_queryset(request):
+    """Bons de commande visibles par l'utilisateur, filtres de la requête appliqués (liste et export)"""
+    user = request.user
+    queryset = BonDeCommande.objects.select_related(
+        'abattoir', 'client', 'created_by'
+    )
+    
+    # Si l'utilisateur n'est pas superuser, filtrer par son abattoir
+    if not user.is_superuser and user.abattoir:
+        queryset = queryset.filter(abattoir=user.abattoir)
+    
+    # Filtres optionnels
+    statut = request.GET.get('statut', None)
+    if statut:
+        queryset = queryset.filter(statut=statut)
+    
+    client_id = request.GET.get('client_id', None)
+    if client_id:
+        queryset = queryset.filter(client_id=client_id)
+    
+    abattoir_id = request.GET.get('abattoir_id', None)
+    if abattoir_id:
+        queryset = queryset.filter(abattoir_id=abattoir_id)
+    
+    # Recherche
+    search = request.GET.get('search', None)
+    if search:
+        queryset = queryset.filter(
+            Q(numero_bon__icontains=search) |
+            Q(client__nom__icontains=search) |
+            Q(notes__icontains=search)
+        )
+    
+    return queryset
+
+
 class BonDeCommandeListCreateView(generics.ListCreateAPIView):
     """
     Liste et création des bons de commande
@@ -17,38 +54,7 @@ class BonDeCommandeListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        queryset = BonDeCommande.objects.select_related(
-            'abattoir', 'client', 'created_by'
-        )
-        
-        # Si l'utilisateur n'est pas superuser, filtrer par son abattoir
-        if not user.is_superuser and user.abattoir:
-            queryset = queryset.filter(abattoir=user.abattoir)
-        
-        # Filtres optionnels
-        statut = self.request.GET.get('statut', None)
-        if statut:
-            queryset = queryset.filter(statut=statut)
-        
-        client_id = self.request.GET.get('client_id', None)
-        if client_id:
-            queryset = queryset.filter(client_id=client_id)
-        
-        abattoir_id = self.request.GET.get('abattoir_id', None)
-        if abattoir_id:
-            queryset = queryset.filter(abattoir_id=abattoir_id)
-        
-        # Recherche
-        search = self.request.GET.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(numero_bon__icontains=search) |
-                Q(client__nom__icontains=search) |
-                Q(notes__icontains=search)
-            )
-        
-        return queryset
+        return _bons_queryset(self.request)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -59,6 +65,34 @@ class BonDeCommandeListCreateView(generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 
+BON_EXPORT_COLONNES = [
+    ('N° bon', 'numero_bon'),
+    ('Client', 'client__nom'),
+    ('Abattoir', 'abattoir__nom'),
+    ('Type de bête', 'type_bete', libelle_choix(BonDeCommande.TYPE_BETE_CHOICES)),
+    ('Type de produit', 'type_produit', libelle_choix(BonDeCommande.TYPE_PRODUIT_CHOICES)),
+    ('Type de quantité', 'type_quantite', libelle_choix(BonDeCommande.TYPE_QUANTITE_CHOICES)),
+    ('Quantité', 'quantite'),
+    ('Avec 5ème quartier', 'avec_cinquieme_quartier', oui_non),
+    ('Source', 'source', libelle_choix(BonDeCommande.SOURCE_CHOICES)),
+    ('Statut', 'statut', libelle_choix(BonDeCommande.STATUT_CHOICES)),
+    ('Versement', 'versement'),
+    ('Livraison prévue', 'date_livraison_prevue'),
+    ('Livraison réelle', 'date_livraison_reelle'),
+    ('Créé par', 'created_by__username'),
+    ('Date de création', 'created_at'),
+]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_bons(request):
+    """
+    Export CSV (par défaut) ou XLSX (?fichier=xlsx) des bons de commande, mêmes filtres que la liste
+    """
+    return export_response(request, _bons_queryset(request), BON_EXPORT_COLONNES, 'bons_commande', 'Bons de commande')
+
+
 class BonDeCommandeDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Détail, mise à jour et suppression d'un bon de commande
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from abattoir.models import Abattoir
+from notification.models import Notification
+from notification.services import NotificationService
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Mesure la diffusion d\'une notification à de nombreux destinataires (annulé en fin de mesure)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--destinataires',
+            type=int,
+            default=500,
+            help='Nombre d\'utilisateurs de l\'abattoir notifiés (défaut: 500)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['destinataires']
+        # Toutes les données de test sont annulées à la fin
+        with transaction.atomic():
+            self.stdout.write(f'🔧 Génération de {count} utilisateurs...')
+            self.abattoir = Abattoir.objects.create(nom='Abattoir benchmark', wilaya='Alger', commune='Alger')
+            self.updated_by = User.objects.create_superuser(
+                username='benchmark_notifications', email='benchmark_notifications@example.com', password='benchmark'
+            )
+            User.objects.bulk_create([
+                User(
+                    username=f'benchmark_notification_{index:05d}',
+                    email=f'benchmark_notification_{index:05d}@example.com',
+                    abattoir=self.abattoir,
+                )
+                for index in range(count)
+            ], batch_size=1000)
+
+            self.stdout.write(f'📊 Notification de modification d\'abattoir ({count} destinataires)')
+            for label, function in (
+                ('Ancien chemin (une insertion par utilisateur)', self._legacy_fan_out),
+                ('Lots par variante + bulk_create', self._bulk_fan_out),
+            ):
+                # Chaque mesure repart d'une table de notifications vide
+                with transaction.atomic():
+                    elapsed, queries = self._measure(function)
+                    created = Notification.objects.filter(abattoir=self.abattoir).count()
+                    transaction.set_rollback(True)
+                self.stdout.write(
+                    f'  {label} : {elapsed * 1000:.0f} ms, {queries} requêtes, {created} notification(s)'
+                )
+            self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+            transaction.set_rollback(True)
+        self.stdout.write('🧹 Données de benchmark annulées')
+
+    def _legacy_fan_out(self):
+        """Reproduit l'ancien NotificationService : create_notification() par utilisateur"""
+        users_to_notify = User.objects.filter(Q(abattoir=self.abattoir) | Q(is_superuser=True))
+        for user in users_to_notify:
+            Notification.create_notification(
+                user=user,
+                type_notification='ABATTOIR_UPDATED',
+                title=f"Abattoir modifié - {self.abattoir.nom}",
+                message=f"L'abattoir {self.abattoir.nom} a été modifié par {self.updated_by.username}. Changements: nom.",
+                abattoir=self.abattoir,
+                priority='LOW',
+                data={'abattoir_id': self.abattoir.id, 'changes': ['nom']}
+            )
+
+    def _bulk_fan_out(self):
+        NotificationService.create_abattoir_updated_notification(self.abattoir, self.updated_by, ['nom'])
+
+    @staticmethod
+    def _measure(function):
+        """Durée et nombre de requêtes SQL d'un appel"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries)
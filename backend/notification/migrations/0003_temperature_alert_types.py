@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type_notification',
+            field=models.CharField(choices=[('STABULATION_CREATED', 'Stabulation créée'), ('STABULATION_TERMINATED', 'Stabulation terminée'), ('BON_COMMANDE_CREATED', 'Bon de commande créé'), ('BON_COMMANDE_CONFIRMED', 'Bon de commande confirmé'), ('BON_COMMANDE_STATUS_CHANGED', 'Statut bon de commande modifié'), ('TRANSFERT_CREATED', 'Transfert créé'), ('TRANSFERT_DELIVERED', 'Transfert livré'), ('ABATTOIR_UPDATED', 'Abattoir modifié'), ('TEMPERATURE_ALERT', 'Alerte température'), ('TEMPERATURE_NORMAL', 'Température revenue à la normale')], help_text="Type d'événement qui a déclenché la notification", max_length=50, verbose_name='Type de notification'),
+        ),
+    ]
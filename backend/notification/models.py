@@ -18,6 +18,8 @@ class Notification(models.Model):
         ('TRANSFERT_CREATED', _('Transfert créé')),
         ('TRANSFERT_DELIVERED', _('Transfert livré')),
         ('ABATTOIR_UPDATED', _('Abattoir modifié')),
+        ('TEMPERATURE_ALERT', _('Alerte température')),
+        ('TEMPERATURE_NORMAL', _('Température revenue à la normale')),
     ]
     
     PRIORITY_CHOICES = [
@@ -151,6 +153,19 @@ class Notification(models.Model):
             data=data or {}
         )
     
+    @classmethod
+    def bulk_create_batches(cls, batches):
+        """
+        Crée les notifications de plusieurs lots en un seul bulk_create
+        Chaque lot : {'user_ids': [...], 'type_notification', 'title', 'message', 'abattoir_id', 'priority', 'data'}
+        """
+        notifications = [
+            cls(user_id=user_id, **{champ: valeur for champ, valeur in batch.items() if champ != 'user_ids'})
+            for batch in batches
+            for user_id in batch['user_ids']
+        ]
+        return cls.objects.bulk_create(notifications)
+    
     @classmethod
     def get_unread_count(cls, user):
         """Retourne le nombre de notifications non lues pour un utilisateur"""
@@ -1,4 +1,8 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
 from .models import Notification
 from abattoir.models import Abattoir
@@ -9,8 +13,47 @@ User = get_user_model()
 class NotificationService:
     """
     Service pour gérer les notifications automatiques
+    
+    Les notifications d'un événement sont insérées en un seul bulk_create,
+    ou par la tâche Celery fan_out_notifications si settings.NOTIFICATIONS_ASYNC.
     """
     
+    @staticmethod
+    def _fan_out(users_to_notify, type_notification, contenu, abattoir=None, priority='MEDIUM', data=None):
+        """
+        Prépare une notification par destinataire et les envoie en masse
+        contenu(is_superuser) retourne (title, message)
+        """
+        destinataires = defaultdict(list)
+        for user_id, is_superuser in users_to_notify.values_list('id', 'is_superuser'):
+            destinataires[contenu(is_superuser)].append(user_id)
+        
+        # Un lot par variante de titre/message : charge utile compacte pour Celery
+        batches = [
+            {
+                'user_ids': user_ids,
+                'type_notification': type_notification,
+                'title': title,
+                'message': message,
+                'abattoir_id': abattoir.id if abattoir else None,
+                'priority': priority,
+                'data': data or {},
+            }
+            for (title, message), user_ids in destinataires.items()
+        ]
+        return NotificationService.dispatch(batches)
+    
+    @staticmethod
+    def dispatch(batches):
+        """Insère les lots maintenant, ou après commit via Celery (retourne alors [])"""
+        if not batches:
+            return []
+        if getattr(settings, 'NOTIFICATIONS_ASYNC', False):
+            from backend.tasks import fan_out_notifications
+            transaction.on_commit(lambda: fan_out_notifications.delay(batches))
+            return []
+        return Notification.bulk_create_batches(batches)
+    
     @staticmethod
     def create_stabulation_notification(stabulation):
         """
@@ -24,33 +67,31 @@ class NotificationService:
             Q(abattoir=abattoir) | Q(is_superuser=True)
         ).exclude(id=created_by.id)
         
-        notifications = []
-        for user in users_to_notify:
+        def contenu(is_superuser):
             # Adapter le titre et message selon le type d'utilisateur
-            if user.is_superuser:
-                title = f"Nouvelle stabulation - {abattoir.nom}"
-                message = f"Stabulation de type {stabulation.get_type_bete_display()} créée dans l'abattoir {abattoir.nom} par {created_by.username}."
-            else:
-                title = f"Nouvelle stabulation créée - {abattoir.nom}"
-                message = f"Une nouvelle stabulation de type {stabulation.get_type_bete_display()} a été créée dans l'abattoir {abattoir.nom} par {created_by.username}."
-            
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='STABULATION_CREATED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='MEDIUM',
-                data={
-                    'stabulation_id': stabulation.id,
-                    'numero_stabulation': stabulation.numero_stabulation,
-                    'type_bete': stabulation.type_bete,
-                    'created_by': created_by.username
-                }
+            if is_superuser:
+                return (
+                    f"Nouvelle stabulation - {abattoir.nom}",
+                    f"Stabulation de type {stabulation.get_type_bete_display()} créée dans l'abattoir {abattoir.nom} par {created_by.username}."
+                )
+            return (
+                f"Nouvelle stabulation créée - {abattoir.nom}",
+                f"Une nouvelle stabulation de type {stabulation.get_type_bete_display()} a été créée dans l'abattoir {abattoir.nom} par {created_by.username}."
             )
-            notifications.append(notification)
         
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'STABULATION_CREATED',
+            contenu,
+            abattoir=abattoir,
+            priority='MEDIUM',
+            data={
+                'stabulation_id': stabulation.id,
+                'numero_stabulation': stabulation.numero_stabulation,
+                'type_bete': stabulation.type_bete,
+                'created_by': created_by.username
+            }
+        )
     
     @staticmethod
     def create_stabulation_terminated_notification(stabulation):
@@ -64,33 +105,31 @@ class NotificationService:
             Q(abattoir=abattoir) | Q(is_superuser=True)
         )
         
-        notifications = []
-        for user in users_to_notify:
+        def contenu(is_superuser):
             # Adapter le titre et message selon le type d'utilisateur
-            if user.is_superuser:
-                title = f"Stabulation terminée - {abattoir.nom}"
-                message = f"Stabulation {stabulation.numero_stabulation} de type {stabulation.get_type_bete_display()} terminée dans l'abattoir {abattoir.nom}."
-            else:
-                title = f"Stabulation terminée - {abattoir.nom}"
-                message = f"La stabulation {stabulation.numero_stabulation} de type {stabulation.get_type_bete_display()} a été terminée dans l'abattoir {abattoir.nom}."
-            
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='STABULATION_TERMINATED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='HIGH',
-                data={
-                    'stabulation_id': stabulation.id,
-                    'numero_stabulation': stabulation.numero_stabulation,
-                    'type_bete': stabulation.type_bete,
-                    'date_fin': stabulation.date_fin.isoformat() if stabulation.date_fin else None
-                }
+            if is_superuser:
+                return (
+                    f"Stabulation terminée - {abattoir.nom}",
+                    f"Stabulation {stabulation.numero_stabulation} de type {stabulation.get_type_bete_display()} terminée dans l'abattoir {abattoir.nom}."
+                )
+            return (
+                f"Stabulation terminée - {abattoir.nom}",
+                f"La stabulation {stabulation.numero_stabulation} de type {stabulation.get_type_bete_display()} a été terminée dans l'abattoir {abattoir.nom}."
             )
-            notifications.append(notification)
         
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'STABULATION_TERMINATED',
+            contenu,
+            abattoir=abattoir,
+            priority='HIGH',
+            data={
+                'stabulation_id': stabulation.id,
+                'numero_stabulation': stabulation.numero_stabulation,
+                'type_bete': stabulation.type_bete,
+                'date_fin': stabulation.date_fin.isoformat() if stabulation.date_fin else None
+            }
+        )
     
     @staticmethod
     def create_bon_commande_notification(bon_commande):
@@ -108,27 +147,21 @@ class NotificationService:
         title = f"Nouveau bon de commande - {abattoir.nom}"
         message = f"Un nouveau bon de commande {bon_commande.numero_bon} a été créé pour le client {bon_commande.client.nom} dans l'abattoir {abattoir.nom}."
         
-        notifications = []
-        for user in users_to_notify:
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='BON_COMMANDE_CREATED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='MEDIUM',
-                data={
-                    'bon_commande_id': bon_commande.id,
-                    'numero_bon': bon_commande.numero_bon,
-                    'client_nom': bon_commande.client.nom,
-                    'type_bete': bon_commande.type_bete,
-                    'quantite': float(bon_commande.quantite),
-                    'created_by': created_by.username
-                }
-            )
-            notifications.append(notification)
-        
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'BON_COMMANDE_CREATED',
+            lambda is_superuser: (title, message),
+            abattoir=abattoir,
+            priority='MEDIUM',
+            data={
+                'bon_commande_id': bon_commande.id,
+                'numero_bon': bon_commande.numero_bon,
+                'client_nom': bon_commande.client.nom,
+                'type_bete': bon_commande.type_bete,
+                'quantite': float(bon_commande.quantite),
+                'created_by': created_by.username
+            }
+        )
     
     @staticmethod
     def create_bon_commande_confirmed_notification(bon_commande):
@@ -145,25 +178,19 @@ class NotificationService:
         title = f"Bon de commande confirmé - {abattoir.nom}"
         message = f"Le bon de commande {bon_commande.numero_bon} pour le client {bon_commande.client.nom} a été confirmé."
         
-        notifications = []
-        for user in users_to_notify:
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='BON_COMMANDE_CONFIRMED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='HIGH',
-                data={
-                    'bon_commande_id': bon_commande.id,
-                    'numero_bon': bon_commande.numero_bon,
-                    'client_nom': bon_commande.client.nom,
-                    'statut': bon_commande.statut
-                }
-            )
-            notifications.append(notification)
-        
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'BON_COMMANDE_CONFIRMED',
+            lambda is_superuser: (title, message),
+            abattoir=abattoir,
+            priority='HIGH',
+            data={
+                'bon_commande_id': bon_commande.id,
+                'numero_bon': bon_commande.numero_bon,
+                'client_nom': bon_commande.client.nom,
+                'statut': bon_commande.statut
+            }
+        )
     
     @staticmethod
     def create_bon_commande_status_changed_notification(bon_commande, ancien_statut, nouveau_statut, user):
@@ -202,36 +229,31 @@ class NotificationService:
             'message': f"Le statut du bon de commande {bon_commande.numero_bon} a été modifié de {ancien_statut} vers {nouveau_statut}."
         })
         
-        notifications = []
-        for user_to_notify in users_to_notify:
+        def contenu(is_superuser):
             # Adapter le message selon le type d'utilisateur
-            if user_to_notify.is_superuser:
-                title = f"{message_config['title']} (Superuser)"
-                message = f"{message_config['message']} Abattoir: {abattoir.nom}"
-            else:
-                title = message_config['title']
-                message = message_config['message']
-            
-            notification = Notification.create_notification(
-                user=user_to_notify,
-                type_notification='BON_COMMANDE_STATUS_CHANGED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='HIGH' if nouveau_statut in ['LIVRE', 'ANNULE'] else 'MEDIUM',
-                data={
-                    'bon_commande_id': bon_commande.id,
-                    'numero_bon': bon_commande.numero_bon,
-                    'client_nom': bon_commande.client.nom,
-                    'ancien_statut': ancien_statut,
-                    'nouveau_statut': nouveau_statut,
-                    'changed_by': user.get_full_name(),
-                    'date_livraison_reelle': bon_commande.date_livraison_reelle.isoformat() if bon_commande.date_livraison_reelle else None
-                }
-            )
-            notifications.append(notification)
+            if is_superuser:
+                return (
+                    f"{message_config['title']} (Superuser)",
+                    f"{message_config['message']} Abattoir: {abattoir.nom}"
+                )
+            return message_config['title'], message_config['message']
         
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'BON_COMMANDE_STATUS_CHANGED',
+            contenu,
+            abattoir=abattoir,
+            priority='HIGH' if nouveau_statut in ['LIVRE', 'ANNULE'] else 'MEDIUM',
+            data={
+                'bon_commande_id': bon_commande.id,
+                'numero_bon': bon_commande.numero_bon,
+                'client_nom': bon_commande.client.nom,
+                'ancien_statut': ancien_statut,
+                'nouveau_statut': nouveau_statut,
+                'changed_by': user.get_full_name(),
+                'date_livraison_reelle': bon_commande.date_livraison_reelle.isoformat() if bon_commande.date_livraison_reelle else None
+            }
+        )
     
     @staticmethod
     def create_transfert_notification(transfert):
@@ -247,35 +269,33 @@ class NotificationService:
             Q(abattoir=abattoir_destinataire) | Q(is_superuser=True)
         )
         
-        notifications = []
-        for user in users_to_notify:
+        def contenu(is_superuser):
             # Adapter le titre et message selon le type d'utilisateur
-            if user.is_superuser:
-                title = f"Nouveau transfert - {abattoir_expediteur.nom} → {abattoir_destinataire.nom}"
-                message = f"Transfert de {transfert.nombre_betes} bêtes depuis {abattoir_expediteur.nom} vers {abattoir_destinataire.nom} créé par {created_by.username}."
-            else:
-                title = f"Nouveau transfert reçu - {abattoir_destinataire.nom}"
-                message = f"Un transfert de {transfert.nombre_betes} bêtes a été envoyé depuis {abattoir_expediteur.nom} vers {abattoir_destinataire.nom}."
-            
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='TRANSFERT_CREATED',
-                title=title,
-                message=message,
-                abattoir=abattoir_destinataire,
-                priority='HIGH',
-                data={
-                    'transfert_id': transfert.id,
-                    'numero_transfert': transfert.numero_transfert,
-                    'abattoir_expediteur': abattoir_expediteur.nom,
-                    'abattoir_destinataire': abattoir_destinataire.nom,
-                    'nombre_betes': transfert.nombre_betes,
-                    'created_by': created_by.username
-                }
+            if is_superuser:
+                return (
+                    f"Nouveau transfert - {abattoir_expediteur.nom} → {abattoir_destinataire.nom}",
+                    f"Transfert de {transfert.nombre_betes} bêtes depuis {abattoir_expediteur.nom} vers {abattoir_destinataire.nom} créé par {created_by.username}."
+                )
+            return (
+                f"Nouveau transfert reçu - {abattoir_destinataire.nom}",
+                f"Un transfert de {transfert.nombre_betes} bêtes a été envoyé depuis {abattoir_expediteur.nom} vers {abattoir_destinataire.nom}."
             )
-            notifications.append(notification)
         
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'TRANSFERT_CREATED',
+            contenu,
+            abattoir=abattoir_destinataire,
+            priority='HIGH',
+            data={
+                'transfert_id': transfert.id,
+                'numero_transfert': transfert.numero_transfert,
+                'abattoir_expediteur': abattoir_expediteur.nom,
+                'abattoir_destinataire': abattoir_destinataire.nom,
+                'nombre_betes': transfert.nombre_betes,
+                'created_by': created_by.username
+            }
+        )
     
     @staticmethod
     def create_transfert_delivered_notification(transfert):
@@ -293,26 +313,20 @@ class NotificationService:
         title = f"Transfert livré - {abattoir_expediteur.nom}"
         message = f"Le transfert {transfert.numero_transfert} vers {abattoir_destinataire.nom} a été livré avec succès."
         
-        notifications = []
-        for user in users_to_notify:
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='TRANSFERT_DELIVERED',
-                title=title,
-                message=message,
-                abattoir=abattoir_expediteur,
-                priority='MEDIUM',
-                data={
-                    'transfert_id': transfert.id,
-                    'numero_transfert': transfert.numero_transfert,
-                    'abattoir_expediteur': abattoir_expediteur.nom,
-                    'abattoir_destinataire': abattoir_destinataire.nom,
-                    'date_livraison': transfert.date_livraison.isoformat() if transfert.date_livraison else None
-                }
-            )
-            notifications.append(notification)
-        
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            'TRANSFERT_DELIVERED',
+            lambda is_superuser: (title, message),
+            abattoir=abattoir_expediteur,
+            priority='MEDIUM',
+            data={
+                'transfert_id': transfert.id,
+                'numero_transfert': transfert.numero_transfert,
+                'abattoir_expediteur': abattoir_expediteur.nom,
+                'abattoir_destinataire': abattoir_destinataire.nom,
+                'date_livraison': transfert.date_livraison.isoformat() if transfert.date_livraison else None
+            }
+        )
     
     @staticmethod
     def create_abattoir_updated_notification(abattoir, updated_by, changes):
@@ -327,25 +341,63 @@ class NotificationService:
         title = f"Abattoir modifié - {abattoir.nom}"
         message = f"L'abattoir {abattoir.nom} a été modifié par {updated_by.username}. Changements: {', '.join(changes)}."
         
-        notifications = []
-        for user in users_to_notify:
-            notification = Notification.create_notification(
-                user=user,
-                type_notification='ABATTOIR_UPDATED',
-                title=title,
-                message=message,
-                abattoir=abattoir,
-                priority='LOW',
-                data={
-                    'abattoir_id': abattoir.id,
-                    'abattoir_nom': abattoir.nom,
-                    'updated_by': updated_by.username,
-                    'changes': changes
-                }
+        return NotificationService._fan_out(
+            users_to_notify,
+            'ABATTOIR_UPDATED',
+            lambda is_superuser: (title, message),
+            abattoir=abattoir,
+            priority='LOW',
+            data={
+                'abattoir_id': abattoir.id,
+                'abattoir_nom': abattoir.nom,
+                'updated_by': updated_by.username,
+                'changes': changes
+            }
+        )
+    
+    @staticmethod
+    def create_temperature_alert_notification(chambre_froide, evenement):
+        """
+        Crée une notification d'alerte de température ou de retour à la normale
+        evenement : résultat de abattoir.temperatures.evaluer_mesure
+        """
+        abattoir = chambre_froide.abattoir
+        
+        # Notifier tous les utilisateurs de l'abattoir + tous les superusers
+        users_to_notify = User.objects.filter(
+            Q(abattoir=abattoir) | Q(is_superuser=True)
+        )
+        
+        minutes = evenement['duree_depassement'] // 60
+        if evenement['type'] == 'ALERTE':
+            limite = 'au-dessus du seuil haut' if evenement['sens'] == 'HAUT' else 'en dessous du seuil bas'
+            type_notification, priority = 'TEMPERATURE_ALERT', 'URGENT'
+            title = f"Alerte température - Chambre froide {chambre_froide.numero} ({abattoir.nom})"
+            message = (
+                f"La chambre froide {chambre_froide.numero} de l'abattoir {abattoir.nom} est {limite} "
+                f"({evenement['seuil']}°C) depuis {minutes} min : {evenement['temperature']}°C "
+                f"(moyenne {evenement['moyenne']}°C)."
+            )
+        else:
+            type_notification, priority = 'TEMPERATURE_NORMAL', 'LOW'
+            title = f"Température normale - Chambre froide {chambre_froide.numero} ({abattoir.nom})"
+            message = (
+                f"La chambre froide {chambre_froide.numero} de l'abattoir {abattoir.nom} est revenue à "
+                f"{evenement['temperature']}°C après {minutes} min de dépassement."
             )
-            notifications.append(notification)
         
-        return notifications
+        return NotificationService._fan_out(
+            users_to_notify,
+            type_notification,
+            lambda is_superuser: (title, message),
+            abattoir=abattoir,
+            priority=priority,
+            data={
+                'chambre_froide_id': chambre_froide.id,
+                'numero': chambre_froide.numero,
+                **evenement
+            }
+        )
     
     @staticmethod
     def notify_superusers(notification_type, title, message, data=None):
@@ -354,16 +406,10 @@ class NotificationService:
         """
         superusers = User.objects.filter(is_superuser=True)
         
-        notifications = []
-        for user in superusers:
-            notification = Notification.create_notification(
-                user=user,
-                type_notification=notification_type,
-                title=title,
-                message=message,
-                priority='MEDIUM',
-                data=data or {}
-            )
-            notifications.append(notification)
-        
-        return notifications
+        return NotificationService._fan_out(
+            superusers,
+            notification_type,
+            lambda is_superuser: (title, message),
+            priority='MEDIUM',
+            data=data
+        )
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from abattoir.testing import AbattoirFixturesMixin
+from users.models import User
+
+from .models import Notification
+from .services import NotificationService
+
+
+class NotificationFanOutTest(AbattoirFixturesMixin, TestCase):
+    """Diffusion des notifications en bulk_create, immédiate ou par Celery après commit"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.user
+        self.createur = self._agent('createur')
+        self.agents = [self._agent(f'agent{index}') for index in range(2)]
+        self.stabulation = self._stabulation(created_by=self.createur)
+
+    def _inserts(self, queries):
+        return [query for query in queries if query['sql'].startswith('INSERT INTO "notification_notification"')]
+
+    def test_stabulation_notification_variants_and_creator_exclusion(self):
+        NotificationService.create_stabulation_notification(self.stabulation)
+
+        notifications = {notification.user_id: notification for notification in Notification.objects.all()}
+        self.assertEqual(set(notifications), {self.admin.id} | {agent.id for agent in self.agents})
+        self.assertEqual(notifications[self.admin.id].title, 'Nouvelle stabulation - Abattoir A')
+        self.assertTrue(notifications[self.admin.id].message.startswith('Stabulation de type Bovin créée'))
+        agent = notifications[self.agents[0].id]
+        self.assertEqual(agent.title, 'Nouvelle stabulation créée - Abattoir A')
+        self.assertTrue(agent.message.startswith('Une nouvelle stabulation de type Bovin'))
+        self.assertEqual((agent.priority, agent.abattoir_id), ('MEDIUM', self.abattoir.id))
+        self.assertEqual(agent.data['numero_stabulation'], self.stabulation.numero_stabulation)
+
+    def test_fan_out_inserts_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries_few:
+            NotificationService.create_abattoir_updated_notification(self.abattoir, self.admin, ['nom'])
+        User.objects.bulk_create([
+            User(username=f'agent_bulk{index}', email=f'agent_bulk{index}@example.com', abattoir=self.abattoir)
+            for index in range(30)
+        ])
+        with CaptureQueriesContext(connection) as queries_many:
+            notifications = NotificationService.create_abattoir_updated_notification(self.abattoir, self.admin, ['nom'])
+
+        self.assertEqual(len(notifications), 34)
+        self.assertEqual(len(queries_few), len(queries_many))
+        self.assertEqual(len(self._inserts(queries_many)), 1)
+
+    def test_async_fan_out_waits_for_commit_then_task_creates_rows(self):
+        from backend.tasks import fan_out_notifications
+
+        # Mode eager de Celery : la tâche s'exécute dans le processus, sans broker
+        app = fan_out_notifications.app
+        eager = app.conf.task_always_eager
+        app.conf.update(task_always_eager=True)
+        self.addCleanup(app.conf.update, task_always_eager=eager)
+
+        with self.settings(NOTIFICATIONS_ASYNC=True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                resultat = NotificationService.create_stabulation_terminated_notification(self.stabulation)
+            self.assertEqual(resultat, [])
+            self.assertFalse(Notification.objects.exists())
+
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(Notification.objects.filter(type_notification='STABULATION_TERMINATED').count(), 4)
+        self.assertEqual(
+            set(Notification.objects.values_list('priority', flat=True)), {'HIGH'}
+        )
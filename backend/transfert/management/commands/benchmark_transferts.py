@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from abattoir.models import Abattoir
+from bete.models import Bete, Espece
+from transfert.models import Transfert, TransfertBete
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Mesure la création et la livraison d\'un transfert volumineux (annulé en fin de mesure)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--betes',
+            type=int,
+            default=500,
+            help='Nombre de bêtes du transfert (défaut: 500)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['betes']
+        # Toutes les données de test sont annulées à la fin
+        with transaction.atomic():
+            self.stdout.write(f'🔧 Génération de {count} bêtes...')
+            self.user = User.objects.create_superuser(
+                username='benchmark_transferts', email='benchmark_transferts@example.com', password='benchmark'
+            )
+            self.expediteur = Abattoir.objects.create(nom='Expéditeur benchmark', wilaya='Alger', commune='Alger')
+            self.destinataire = Abattoir.objects.create(nom='Destinataire benchmark', wilaya='Blida', commune='Blida')
+            espece, _ = Espece.objects.get_or_create(nom='Bovin')
+            self.betes_ids = [bete.id for bete in Bete.objects.bulk_create([
+                Bete(num_boucle=f'BENCH{index:08d}', espece=espece, sexe='M', abattoir=self.expediteur)
+                for index in range(count)
+            ], batch_size=1000)]
+
+            self.stdout.write(f'📊 Transfert de {count} bêtes')
+            for label, ajouter, livrer in (
+                ('Ancien chemin (bête par bête)', self._legacy_add, self._legacy_deliver),
+                ('in_bulk + bulk_create / UPDATE + historique en masse', self._bulk_add, self._bulk_deliver),
+            ):
+                # Chaque mesure repart des bêtes dans l'abattoir expéditeur
+                with transaction.atomic():
+                    transfert = Transfert.objects.create(
+                        abattoir_expediteur=self.expediteur, abattoir_destinataire=self.destinataire,
+                        nombre_betes=count, cree_par=self.user
+                    )
+                    add_time, add_queries = self._measure(ajouter, transfert)
+                    Transfert.objects.filter(pk=transfert.pk).update(statut='EN_LIVRAISON')
+                    transfert.statut = 'EN_LIVRAISON'
+                    deliver_time, deliver_queries = self._measure(livrer, transfert)
+                    transaction.set_rollback(True)
+                self.stdout.write(
+                    f'  {label} : ajout {add_time * 1000:.0f} ms, {add_queries} requêtes ; '
+                    f'livraison {deliver_time * 1000:.0f} ms, {deliver_queries} requêtes'
+                )
+            self.stdout.write(self.style.SUCCESS('✅ Mesure terminée'))
+
+            transaction.set_rollback(True)
+        self.stdout.write('🧹 Données de benchmark annulées')
+
+    def _legacy_add(self, transfert):
+        """Reproduit l'ancien TransfertSerializer.create : get() puis ajouter_bete() par bête"""
+        for bete_id in self.betes_ids:
+            bete = Bete.objects.get(id=bete_id)
+            if bete.abattoir == transfert.abattoir_expediteur and bete.statut == 'VIVANT':
+                TransfertBete.objects.create(transfert=transfert, bete=bete, ajoute_par=transfert.cree_par)
+
+    def _bulk_add(self, transfert):
+        transfert.ajouter_betes(self.betes_ids, ajoute_par=transfert.cree_par)
+
+    def _legacy_deliver(self, transfert):
+        """Reproduit l'ancien Transfert.livrer : save() (UPDATE + historique) par bête"""
+        transfert.statut = 'LIVRE'
+        transfert.date_livraison = timezone.now()
+        transfert.valide_par = self.user
+        transfert.save()
+        for bete in transfert.betes.all():
+            bete.abattoir = self.destinataire
+            bete.save()
+
+    def _bulk_deliver(self, transfert):
+        transfert.livrer(self.user)
+
+    @staticmethod
+    def _measure(function, *args):
+        """Durée et nombre de requêtes SQL d'un appel"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function(*args)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries)
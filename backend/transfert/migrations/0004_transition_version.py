@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transfert', '0003_alter_historicalreception_statut_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalreception',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='historicaltransfert',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='reception',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='transfert',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Version'),
+        ),
+    ]
@@ -1,15 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from simple_history.models import HistoricalRecords
-from abattoir.models import Abattoir
+from abattoir.models import Abattoir, ConditionalTransitionMixin
 from bete.models import Bete
 from users.models import User
 import uuid
 
 
-class Transfert(models.Model):
+class Transfert(ConditionalTransitionMixin, models.Model):
     """Modèle pour les transferts de bêtes entre abattoirs"""
     
     STATUT_CHOICES = [
@@ -135,6 +135,9 @@ class Transfert(models.Model):
         help_text=_('Notes et observations sur le transfert')
     )
     
+    # Incrémentée à chaque écriture, transitions de statut comprises (verrouillage optimiste)
+    version = models.PositiveIntegerField(default=0, verbose_name=_('Version'))
+    
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de création'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Date de modification'))
@@ -161,23 +164,9 @@ class Transfert(models.Model):
         return f"Transfert {self.numero_transfert} - {self.abattoir_expediteur.nom} → {self.abattoir_destinataire.nom}"
     
     def generate_numero_transfert(self):
-        """Génère un numéro de transfert unique"""
-        from datetime import datetime
-        
-        # Format: TRF-YYYYMMDD-HHMMSS-XXX
-        now = timezone.now()
-        date_str = now.strftime('%Y%m%d')
-        time_str = now.strftime('%H%M%S')
-        
-        # Chercher le prochain numéro séquentiel pour cette date
-        base_numero = f"TRF-{date_str}-{time_str}"
-        counter = 1
-        
-        while True:
-            numero = f"{base_numero}-{counter:03d}"
-            if not Transfert.objects.filter(numero_transfert=numero).exists():
-                return numero
-            counter += 1
+        """Génère un numéro de transfert unique (format TRF-AAAAMMJJ-NNNNN)"""
+        from abattoir.sequences import next_document_number
+        return next_document_number('TRF')
     
     def save(self, *args, **kwargs):
         """Override save pour générer automatiquement le numéro de transfert"""
@@ -212,21 +201,49 @@ class Transfert(models.Model):
     
     def ajouter_bete(self, bete):
         """Ajoute une bête au transfert"""
-        if self.statut != 'EN_COURS':
+        _, ignorees = self.ajouter_betes([bete.id], ajoute_par=self.cree_par)
+        if ignorees:
+            raise ValueError(ignorees[0]['raison'])
+    
+    @transaction.atomic
+    def ajouter_betes(self, betes_ids, ajoute_par=None):
+        """
+        Ajoute des bêtes au transfert en une lecture (verrouillée) et un bulk_create
+        Retourne (ids ajoutés, ignorées [{'id', 'num_boucle', 'raison'}])
+        """
+        # Verrouiller le transfert puis les bêtes : deux ajouts concurrents ne se croisent pas
+        statut = Transfert.objects.select_for_update().values_list('statut', flat=True).get(pk=self.pk)
+        if statut != 'EN_COURS':
             raise ValueError("Impossible d'ajouter une bête à un transfert non en cours")
         
-        if bete.abattoir != self.abattoir_expediteur:
-            raise ValueError("La bête doit appartenir à l'abattoir expéditeur")
+        betes = Bete.objects.select_for_update().in_bulk(set(betes_ids))
+        deja_presentes = set(
+            TransfertBete.objects.filter(transfert=self, bete_id__in=betes).values_list('bete_id', flat=True)
+        )
         
-        if bete.statut != 'VIVANT':
-            raise ValueError("Seules les bêtes vivantes peuvent être transférées")
+        ajoutees, ignorees = [], []
+        for bete_id in betes_ids:
+            bete = betes.get(bete_id)
+            if bete is None:
+                ignorees.append({'id': bete_id, 'num_boucle': 'N/A', 'raison': 'Bête introuvable'})
+                continue
+            if bete_id in deja_presentes:
+                raison = "Cette bête est déjà dans ce transfert"
+            elif bete.abattoir_id != self.abattoir_expediteur_id:
+                raison = "La bête doit appartenir à l'abattoir expéditeur"
+            elif bete.statut != 'VIVANT':
+                raison = "Seules les bêtes vivantes peuvent être transférées"
+            else:
+                ajoutees.append(bete_id)
+                deja_presentes.add(bete_id)
+                continue
+            ignorees.append({'id': bete_id, 'num_boucle': bete.num_boucle, 'raison': raison})
         
-        # Créer la relation via le modèle intermédiaire
-        TransfertBete.objects.create(
-            transfert=self,
-            bete=bete,
-            ajoute_par=self.cree_par
+        TransfertBete.objects.bulk_create(
+            [TransfertBete(transfert=self, bete_id=bete_id, ajoute_par=ajoute_par) for bete_id in ajoutees],
+            batch_size=500
         )
+        return ajoutees, ignorees
     
     def retirer_bete(self, bete):
         """Retire une bête du transfert"""
@@ -239,57 +256,64 @@ class Transfert(models.Model):
         except TransfertBete.DoesNotExist:
             raise ValueError("Cette bête n'est pas dans ce transfert")
     
-    def mettre_en_livraison(self):
+    @transaction.atomic
+    def mettre_en_livraison(self, user=None):
         """Met le transfert en livraison"""
         if not self.peut_etre_en_livraison:
             raise ValueError("Le transfert ne peut pas être mis en livraison")
         
-        self.statut = 'EN_LIVRAISON'
-        self.save()
+        self._transition(['EN_COURS'], user=user, statut='EN_LIVRAISON')
         
         # Mettre la réception en route
         if hasattr(self, 'reception'):
-            self.reception.statut = 'EN_ROUTE'
-            self.reception.save()
+            self.reception._transition(['EN_ATTENTE', 'EN_COURS', 'EN_ROUTE'], user=user, statut='EN_ROUTE')
     
+    @transaction.atomic
     def livrer(self, valide_par_user):
         """Marque le transfert comme livré"""
         if self.statut != 'EN_LIVRAISON':
             raise ValueError("Le transfert doit être en livraison pour être livré")
         
-        self.statut = 'LIVRE'
-        self.date_livraison = timezone.now()
-        self.valide_par = valide_par_user
-        self.save()
+        # Transition d'abord : une double livraison concurrente échoue ici, avant de toucher aux bêtes
+        maintenant = timezone.now()
+        self._transition(
+            ['EN_LIVRAISON'], user=valide_par_user,
+            statut='LIVRE', date_livraison=maintenant, valide_par=valide_par_user
+        )
+        
+        # Mettre à jour l'abattoir des bêtes en un seul UPDATE (compteurs du dashboard inclus)
+        betes = Bete.objects.filter(id__in=list(
+            Bete.objects.filter(transfert=self).select_for_update(of=('self',)).values_list('id', flat=True)
+        ))
+        betes.update_tracked(abattoir_id=self.abattoir_destinataire_id, updated_at=maintenant)
         
-        # Mettre à jour l'abattoir des bêtes
-        for bete in self.betes.all():
-            bete.abattoir = self.abattoir_destinataire
-            bete.save()
+        # Historique : une ligne par bête, insérée en masse
+        Bete.history.bulk_history_create(
+            list(betes), update=True, default_user=valide_par_user, default_date=maintenant,
+            default_change_reason=f"Livraison du transfert {self.numero_transfert}"
+        )
     
+    @transaction.atomic
     def annuler(self, annule_par_user, motif_annulation=None):
         """Annule le transfert"""
         if not self.peut_etre_annule:
             raise ValueError("Le transfert ne peut pas être annulé")
         
-        self.statut = 'ANNULE'
-        self.date_annulation = timezone.now()
-        self.annule_par = annule_par_user
+        champs = {'statut': 'ANNULE', 'date_annulation': timezone.now(), 'annule_par': annule_par_user}
         if motif_annulation:
-            self.notes = f"{self.notes or ''}\nAnnulation: {motif_annulation}".strip()
-        self.save()
+            champs['notes'] = f"{self.notes or ''}\nAnnulation: {motif_annulation}".strip()
+        self._transition(['EN_COURS'], user=annule_par_user, **champs)
     
+    @transaction.atomic
     def annuler_par_reception(self, annule_par_user, motif_annulation=None):
         """Annule le transfert depuis la réception (même si en livraison)"""
         if self.statut not in ['EN_COURS', 'EN_LIVRAISON']:
             raise ValueError("Le transfert ne peut pas être annulé depuis la réception")
         
-        self.statut = 'ANNULE'
-        self.date_annulation = timezone.now()
-        self.annule_par = annule_par_user
+        champs = {'statut': 'ANNULE', 'date_annulation': timezone.now(), 'annule_par': annule_par_user}
         if motif_annulation:
-            self.notes = f"{self.notes or ''}\nAnnulation par réception: {motif_annulation}".strip()
-        self.save()
+            champs['notes'] = f"{self.notes or ''}\nAnnulation par réception: {motif_annulation}".strip()
+        self._transition(['EN_COURS', 'EN_LIVRAISON'], user=annule_par_user, **champs)
 
 
 class TransfertBete(models.Model):
@@ -331,7 +355,7 @@ class TransfertBete(models.Model):
         return f"{self.bete.num_boucle} dans {self.transfert.numero_transfert}"
 
 
-class Reception(models.Model):
+class Reception(ConditionalTransitionMixin, models.Model):
     """Modèle pour les réceptions de bêtes transférées"""
     
     STATUT_CHOICES = [
@@ -455,6 +479,9 @@ class Reception(models.Model):
         help_text=_('Notes et observations sur la réception')
     )
     
+    # Incrémentée à chaque écriture, transitions de statut comprises (verrouillage optimiste)
+    version = models.PositiveIntegerField(default=0, verbose_name=_('Version'))
+    
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de création'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Date de modification'))
@@ -479,23 +506,9 @@ class Reception(models.Model):
         return f"Réception {self.numero_reception} - {self.transfert.abattoir_expediteur.nom} → {self.transfert.abattoir_destinataire.nom}"
     
     def generate_numero_reception(self):
-        """Génère un numéro de réception unique"""
-        from datetime import datetime
-        
-        # Format: REC-YYYYMMDD-HHMMSS-XXX
-        now = timezone.now()
-        date_str = now.strftime('%Y%m%d')
-        time_str = now.strftime('%H%M%S')
-        
-        # Chercher le prochain numéro séquentiel pour cette date
-        base_numero = f"REC-{date_str}-{time_str}"
-        counter = 1
-        
-        while True:
-            numero = f"{base_numero}-{counter:03d}"
-            if not Reception.objects.filter(numero_reception=numero).exists():
-                return numero
-            counter += 1
+        """Génère un numéro de réception unique (format REC-AAAAMMJJ-NNNNN)"""
+        from abattoir.sequences import next_document_number
+        return next_document_number('REC')
     
     def save(self, *args, **kwargs):
         """Override save pour générer automatiquement le numéro de réception"""
@@ -545,52 +558,50 @@ class Reception(models.Model):
         """Vérifie si la réception peut être annulée"""
         return self.statut in ['EN_ATTENTE', 'EN_COURS', 'EN_ROUTE']
     
+    @transaction.atomic
     def confirmer_reception(self, nombre_betes_recues, betes_manquantes=None, valide_par_user=None, note=None):
         """Confirme la réception avec le nombre de bêtes reçues"""
         if not self.peut_etre_confirmee:
             raise ValueError("La réception ne peut pas être confirmée")
         
-        self.nombre_betes_recues = nombre_betes_recues
-        self.nombre_betes_manquantes = max(0, self.nombre_betes_attendues - nombre_betes_recues)
-        
+        champs = {
+            'nombre_betes_recues': nombre_betes_recues,
+            'nombre_betes_manquantes': max(0, self.nombre_betes_attendues - nombre_betes_recues),
+            'date_reception': timezone.now(),
+        }
         if betes_manquantes is not None:
-            self.betes_manquantes = betes_manquantes
-        
+            champs['betes_manquantes'] = betes_manquantes
         if note:
-            self.note = note
-        
+            champs['note'] = note
         if valide_par_user:
-            self.valide_par = valide_par_user
+            champs['valide_par'] = valide_par_user
         
         # Déterminer le statut final
+        self.nombre_betes_recues = nombre_betes_recues
         if self.est_complete:
-            self.statut = 'RECU'
+            champs['statut'] = 'RECU'
         elif self.est_partielle:
-            self.statut = 'PARTIEL'
+            champs['statut'] = 'PARTIEL'
         else:
-            self.statut = 'RECU'  # Même si vide, on considère comme reçu
+            champs['statut'] = 'RECU'  # Même si vide, on considère comme reçu
         
-        self.date_reception = timezone.now()
-        self.save()
+        self._transition(['EN_ATTENTE', 'EN_COURS', 'EN_ROUTE'], user=valide_par_user, **champs)
         
         # Mettre à jour le statut du transfert associé
         if self.transfert.statut in ['EN_COURS', 'EN_LIVRAISON']:
             self.transfert.livrer(valide_par_user)
     
+    @transaction.atomic
     def annuler(self, annule_par_user, motif_annulation=None):
         """Annule la réception"""
         if not self.peut_etre_annulee:
             raise ValueError("La réception ne peut pas être annulée")
         
-        self.statut = 'ANNULE'
-        self.date_annulation = timezone.now()
-        self.annule_par = annule_par_user
-        
+        champs = {'statut': 'ANNULE', 'date_annulation': timezone.now(), 'annule_par': annule_par_user}
         if motif_annulation:
-            self.note = f"{self.note or ''}\nAnnulation: {motif_annulation}".strip()
-        
-        self.save()
+            champs['note'] = f"{self.note or ''}\nAnnulation: {motif_annulation}".strip()
+        self._transition(['EN_ATTENTE', 'EN_COURS', 'EN_ROUTE'], user=annule_par_user, **champs)
         
         # Annuler aussi le transfert associé
         if self.transfert.statut in ['EN_COURS', 'EN_LIVRAISON']:
-            self.transfert.annuler_par_reception(annule_par_user, motif_annulation)
\ No newline at end of file
+            self.transfert.annuler_par_reception(annule_par_user, motif_annulation)
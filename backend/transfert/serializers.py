@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from abattoir.models import Abattoir
 from bete.models import Bete
 from .models import Transfert, TransfertBete, Reception
@@ -143,52 +144,23 @@ class TransfertSerializer(serializers.ModelSerializer):
         betes_ids = validated_data.pop('betes_ids', [])
         
         try:
-            # Créer le transfert
-            transfert = Transfert.objects.create(**validated_data)
-            
-            # Ajouter les bêtes si fournies
-            betes_ajoutees = 0
-            betes_ignorees = []
-            
-            if betes_ids:
-                for bete_id in betes_ids:
-                    try:
-                        bete = Bete.objects.get(id=bete_id)
-                        # Vérifier si la bête peut être ajoutée
-                        if (bete.abattoir == transfert.abattoir_expediteur and 
-                            bete.statut == 'VIVANT'):
-                            transfert.ajouter_bete(bete)
-                            betes_ajoutees += 1
-                        else:
-                            betes_ignorees.append({
-                                'id': bete.id,
-                                'num_boucle': bete.num_boucle,
-                                'raison': 'Bête n\'appartient pas à l\'abattoir expéditeur ou n\'est pas vivante'
-                            })
-                    except Bete.DoesNotExist:
-                        betes_ignorees.append({
-                            'id': bete_id,
-                            'num_boucle': 'N/A',
-                            'raison': 'Bête introuvable'
-                        })
-                    except Exception as e:
-                        betes_ignorees.append({
-                            'id': bete_id,
-                            'num_boucle': 'N/A',
-                            'raison': f'Erreur lors de l\'ajout: {str(e)}'
-                        })
-            
-            # Stocker les informations sur les bêtes ignorées dans le transfert
-            if betes_ignorees:
-                transfert.notes = f"{transfert.notes or ''}\nBêtes ignorées lors de la création: {len(betes_ignorees)} bêtes ignorées.".strip()
-                transfert.save()
+            with transaction.atomic():
+                # Créer le transfert
+                transfert = Transfert.objects.create(**validated_data)
+                
+                # Ajouter les bêtes si fournies (une lecture, un bulk_create)
+                betes_ignorees = []
+                if betes_ids:
+                    _, betes_ignorees = transfert.ajouter_betes(betes_ids, ajoute_par=transfert.cree_par)
+                
+                # Stocker les informations sur les bêtes ignorées dans le transfert
+                if betes_ignorees:
+                    transfert.notes = f"{transfert.notes or ''}\nBêtes ignorées lors de la création: {len(betes_ignorees)} bêtes ignorées.".strip()
+                    transfert.save(update_fields=['notes', 'updated_at'])
             
             return transfert
             
         except Exception as e:
-            # En cas d'erreur, supprimer le transfert créé s'il existe
-            if 'transfert' in locals():
-                transfert.delete()
             raise serializers.ValidationError(f"Erreur lors de la création du transfert: {str(e)}")
 
 
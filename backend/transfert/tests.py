@@ -1,3 +1,172 @@
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from abattoir.models import Abattoir, TransitionConflict
+from abattoir.testing import AbattoirFixturesMixin
+from bete.models import Bete, DashboardCounter
+
+from .models import Reception, Transfert, TransfertBete
+
+
+class TransfertBulkTest(AbattoirFixturesMixin, TestCase):
+    """Ajout des bêtes et livraison d'un transfert en opérations ensemblistes"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self.expediteur = self.abattoir
+        self.destinataire = Abattoir.objects.create(nom='Abattoir B', wilaya='Blida', commune='Blida')
+
+    def _transfert(self, betes, statut='EN_COURS'):
+        transfert = Transfert.objects.create(
+            abattoir_expediteur=self.expediteur, abattoir_destinataire=self.destinataire,
+            nombre_betes=len(betes), cree_par=self.user
+        )
+        transfert.ajouter_betes([bete.id for bete in betes], ajoute_par=self.user)
+        Transfert.objects.filter(pk=transfert.pk).update(statut=statut)
+        transfert.statut = statut
+        return transfert
+
+    def test_create_adds_betes_in_constant_queries(self):
+        def post(betes):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/transferts/transferts/', {
+                    'abattoir_expediteur_id': self.expediteur.id,
+                    'abattoir_destinataire_id': self.destinataire.id,
+                    'nombre_betes': len(betes),
+                    'betes_ids': [bete.id for bete in betes],
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+            return Transfert.objects.get(pk=response.data['id']), len(queries)
+
+        post(self._betes(1))
+        few, queries_few = post(self._betes(5))
+        many, queries_many = post(self._betes(40))
+
+        self.assertEqual(queries_few, queries_many)
+        self.assertEqual(many.betes.count(), 40)
+        self.assertEqual(set(TransfertBete.objects.filter(transfert=many).values_list('ajoute_par', flat=True)), {self.user.id})
+
+    def test_ajouter_betes_reports_ignored(self):
+        valide = self._betes(1)[0]
+        ailleurs = self._betes(1, abattoir=self.destinataire)[0]
+        abattue = self._betes(1, statut='ABATTU')[0]
+        transfert = self._transfert([])
+
+        ajoutees, ignorees = transfert.ajouter_betes([valide.id, ailleurs.id, abattue.id, valide.id, 999999])
+
+        self.assertEqual(ajoutees, [valide.id])
+        self.assertEqual(
+            [(bete['id'], bete['raison']) for bete in ignorees],
+            [
+                (ailleurs.id, "La bête doit appartenir à l'abattoir expéditeur"),
+                (abattue.id, "Seules les bêtes vivantes peuvent être transférées"),
+                (valide.id, "Cette bête est déjà dans ce transfert"),
+                (999999, 'Bête introuvable'),
+            ]
+        )
+        with self.assertRaisesMessage(ValueError, "Cette bête est déjà dans ce transfert"):
+            transfert.ajouter_bete(valide)
+
+    def test_livrer_moves_betes_in_constant_queries(self):
+        self._transfert(self._betes(1), statut='EN_LIVRAISON').livrer(self.user)
+        few = self._transfert(self._betes(5), statut='EN_LIVRAISON')
+        many = self._transfert(self._betes(40), statut='EN_LIVRAISON')
+
+        with CaptureQueriesContext(connection) as queries_few:
+            few.livrer(self.user)
+        with CaptureQueriesContext(connection) as queries_many:
+            many.livrer(self.user)
+
+        self.assertEqual(len(queries_few), len(queries_many))
+        self.assertEqual(Bete.objects.filter(abattoir=self.destinataire).count(), 46)
+        self.assertEqual(DashboardCounter.totals(self.destinataire)['par_statut'], {'VIVANT': 46})
+        self.assertEqual(DashboardCounter.totals(self.expediteur)['par_statut'], {})
+        bete = many.betes.first()
+        derniere = bete.history.first()
+        self.assertEqual(derniere.history_type, '~')
+        self.assertEqual(derniere.abattoir_id, self.destinataire.id)
+        self.assertEqual(derniere.history_user_id, self.user.id)
+
+    def test_export_uses_list_filters(self):
+        self._transfert(self._betes(2), statut='LIVRE')
+        self._transfert(self._betes(3))
+
+        response = self.client.get('/api/transferts/transferts/export/', {'statut': 'LIVRE'})
+        lignes = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(lignes), 2)
+        self.assertIn('Abattoir A;Abattoir B;2;Livré', lignes[1])
+
+    def test_livrer_twice_fails(self):
+        transfert = self._transfert(self._betes(2), statut='EN_LIVRAISON')
+        stale = Transfert.objects.get(pk=transfert.pk)
+        transfert.livrer(self.user)
+
+        with self.assertRaises(TransitionConflict):
+            stale.livrer(self.user)
+        self.assertEqual(Bete.history.filter(history_type='~').count(), 2)
+
+
+class TransfertTransitionTest(AbattoirFixturesMixin, TestCase):
+    """Transitions conditionnelles du transfert et de sa réception"""
+
+    espece_nom = 'Bovin'
+
+    def setUp(self):
+        super().setUp()
+        self.destinataire = Abattoir.objects.create(nom='Abattoir B', wilaya='Blida', commune='Blida')
+        self.transfert = Transfert.objects.create(
+            abattoir_expediteur=self.abattoir, abattoir_destinataire=self.destinataire, nombre_betes=3, cree_par=self.user
+        )
+        self.transfert.ajouter_betes([bete.id for bete in self._betes(3)])
+        self.reception = Reception.objects.create(transfert=self.transfert, nombre_betes_attendues=3, cree_par=self.user)
+
+    def test_mise_en_livraison_bumps_versions_and_history(self):
+        self.transfert.mettre_en_livraison(self.user)
+
+        transfert = Transfert.objects.get(pk=self.transfert.pk)
+        reception = Reception.objects.get(pk=self.reception.pk)
+        self.assertEqual((transfert.statut, transfert.version), ('EN_LIVRAISON', 1))
+        self.assertEqual((reception.statut, reception.version), ('EN_ROUTE', 1))
+        self.assertEqual(transfert.history.first().statut, 'EN_LIVRAISON')
+        self.assertEqual(transfert.history.first().history_user_id, self.user.id)
+
+    def test_transition_history_reflects_stored_row(self):
+        Transfert.objects.filter(pk=self.transfert.pk).update(notes='Enregistrée')
+        self.transfert.notes = 'Non enregistrée'
+
+        self.transfert.mettre_en_livraison(self.user)
+
+        self.assertEqual(self.transfert.history.first().notes, 'Enregistrée')
+        Transfert.objects.filter(pk=self.transfert.pk).update(version=0)
+        with self.assertRaises(TransitionConflict), transaction.atomic():
+            self.transfert.save()
+
+    def test_concurrent_confirmations_deliver_once(self):
+        self.transfert.mettre_en_livraison(self.user)
+        premiere = Reception.objects.get(pk=self.reception.pk)
+        seconde = Reception.objects.get(pk=self.reception.pk)
+
+        premiere.confirmer_reception(3, valide_par_user=self.user)
+        with self.assertRaises(TransitionConflict):
+            seconde.confirmer_reception(2, valide_par_user=self.user)
+
+        reception = Reception.objects.get(pk=self.reception.pk)
+        self.assertEqual((reception.statut, reception.nombre_betes_recues), ('RECU', 3))
+        self.assertEqual(Transfert.objects.get(pk=self.transfert.pk).statut, 'LIVRE')
+        self.assertEqual(Bete.history.filter(history_type='~').count(), 3)
+        self.assertEqual(Bete.objects.filter(abattoir=self.destinataire).count(), 3)
+
+    def test_stale_cancel_after_delivery_start_conflicts(self):
+        stale = Transfert.objects.get(pk=self.transfert.pk)
+        self.transfert.mettre_en_livraison(self.user)
+
+        response = self.client.post(f'/api/transferts/transferts/{self.transfert.pk}/annuler/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(TransitionConflict):
+            stale.annuler(self.user, 'Trop tard')
+        self.assertEqual(Transfert.objects.get(pk=self.transfert.pk).statut, 'EN_LIVRAISON')
@@ -7,6 +7,8 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db.models import Q, Count, Sum, Avg, Prefetch
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from abattoir.models import TransitionConflict
+from backend.exports import export_response, libelle_choix
 
 from .models import Transfert, Reception, TransfertBete
 from .serializers import (
@@ -19,6 +21,21 @@ from .filters import TransfertFilter, ReceptionFilter
 
 User = get_user_model()
 
+TRANSFERT_EXPORT_COLONNES = [
+    ('N° transfert', 'numero_transfert'),
+    ('Abattoir expéditeur', 'abattoir_expediteur__nom'),
+    ('Abattoir destinataire', 'abattoir_destinataire__nom'),
+    ('Nombre de bêtes', 'nombre_betes'),
+    ('Statut', 'statut', libelle_choix(Transfert.STATUT_CHOICES)),
+    ('Date de création', 'date_creation'),
+    ('Date de livraison', 'date_livraison'),
+    ('Date d\'annulation', 'date_annulation'),
+    ('Créé par', 'cree_par__username'),
+    ('Validé par', 'valide_par__username'),
+    ('Motif', 'motif'),
+    ('Notes', 'notes'),
+]
+
 
 class TransfertViewSet(ModelViewSet):
     """ViewSet pour la gestion des transferts"""
@@ -107,11 +124,17 @@ class TransfertViewSet(ModelViewSet):
             )
         
         try:
-            transfert.mettre_en_livraison()
+            transfert.mettre_en_livraison(request.user)
             return Response(
                 {'message': 'Transfert mis en livraison avec succès'},
                 status=status.HTTP_200_OK
             )
+        except TransitionConflict as e:
+            # Un autre opérateur a effectué une transition entre-temps
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -135,6 +158,12 @@ class TransfertViewSet(ModelViewSet):
                 {'message': 'Transfert livré avec succès'},
                 status=status.HTTP_200_OK
             )
+        except TransitionConflict as e:
+            # Un autre opérateur a effectué une transition entre-temps
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -160,6 +189,12 @@ class TransfertViewSet(ModelViewSet):
                 {'message': 'Transfert annulé avec succès'},
                 status=status.HTTP_200_OK
             )
+        except TransitionConflict as e:
+            # Un autre opérateur a effectué une transition entre-temps
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -254,6 +289,12 @@ class TransfertViewSet(ModelViewSet):
         
         serializer = TransfertStatsSerializer(stats)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV (par défaut) ou XLSX (?fichier=xlsx) des transferts, mêmes filtres que la liste"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(request, queryset, TRANSFERT_EXPORT_COLONNES, 'transferts', 'Transferts')
 
 
 class ReceptionViewSet(ModelViewSet):
@@ -330,6 +371,12 @@ class ReceptionViewSet(ModelViewSet):
                 response_serializer = ReceptionSerializer(reception)
                 return Response(response_serializer.data)
                 
+            except TransitionConflict as e:
+                # Un autre opérateur a effectué une transition entre-temps
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
             except Exception as e:
                 return Response(
                     {'error': str(e)},
@@ -363,6 +410,12 @@ class ReceptionViewSet(ModelViewSet):
                     status=status.HTTP_200_OK
                 )
                 
+            except TransitionConflict as e:
+                # Un autre opérateur a effectué une transition entre-temps
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_409_CONFLICT
+                )
             except Exception as e:
                 return Response(
                     {'error': str(e)},